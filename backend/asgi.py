@@ -0,0 +1,155 @@
+import os
+import re
+import time
+import uuid
+import asyncio
+import contextlib
+import traceback
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route, Router
+
+from main import CORS_ORIGINS, _sse, app as flask_app
+from rag import Rag
+from warmup import warm_up
+from collection_registry import start_sweeper
+import metrics
+
+# Chat routes are served natively on the event loop so one process can hold many in-flight
+# chats; every other route is the Flask app running in a thread pool behind the same server.
+
+async def _open_rag(data: dict, session_id: str) -> Rag:
+    # Constructing a Rag touches the vector store and the session store, both synchronous.
+    return await asyncio.to_thread(
+        Rag,
+        collection_name=data.get('collection_name'),
+        provider_name=data.get('provider_name', 'google'),
+        api_key=data.get('api_key') or os.getenv("GOOGLE_API_KEY"),
+        session_id=session_id
+    )
+
+async def chat(request: Request):
+    try:
+        data = await request.json()
+        collection_name = data.get('collection_name')
+        query = data.get('query')
+
+        if not collection_name or not query:
+            return JSONResponse({"error": "Missing collection_name or query"}, status_code=400)
+
+        session_id = data.get('session_id') or uuid.uuid4().hex
+
+        print(f"Chat query for: {collection_name}")
+
+        rag_system = await _open_rag(data, session_id)
+        answer = await rag_system.aanswer_query(query, section=data.get('section'))
+        memory_info = rag_system.get_memory_summary()
+
+        print(f"Query answered")
+        return JSONResponse({"answer": answer, "memory": memory_info, "session_id": session_id, "cache": rag_system.last_answer_meta})
+
+    except Exception as e:
+        print(f"Chat error: {type(e).__name__}: {e}")
+        traceback.print_exc()
+        return JSONResponse({
+            "error": str(e),
+            "error_type": type(e).__name__
+        }, status_code=500)
+
+async def chat_stream(request: Request):
+    try:
+        data = await request.json()
+        collection_name = data.get('collection_name')
+        query = data.get('query')
+        session_id = data.get('session_id') or uuid.uuid4().hex
+
+        if not collection_name or not query:
+            return JSONResponse({"error": "Missing collection_name or query"}, status_code=400)
+
+        print(f"Streaming chat query for: {collection_name}")
+
+        rag_system = await _open_rag(data, session_id)
+    except Exception as e:
+        print(f"Chat stream error: {type(e).__name__}: {e}")
+        traceback.print_exc()
+        return JSONResponse({
+            "error": str(e),
+            "error_type": type(e).__name__
+        }, status_code=500)
+
+    async def generate():
+        try:
+            async for piece in rag_system.aanswer_query_stream(query, section=data.get('section')):
+                yield _sse("token", {"text": piece})
+            yield _sse("done", {"memory": rag_system.get_memory_summary(), "session_id": session_id, "cache": rag_system.last_answer_meta})
+        except Exception as e:
+            print(f"Chat stream error: {type(e).__name__}: {e}")
+            traceback.print_exc()
+            yield _sse("error", {"error": str(e), "error_type": type(e).__name__})
+
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Flask-CORS only covers the mounted Flask routes, so the native ones get the same policy here.
+_chat_routes = CORSMiddleware(
+    Router(routes=[
+        Route('/api/chat', chat, methods=['POST']),
+        Route('/api/chat/stream', chat_stream, methods=['POST'])
+    ]),
+    allow_origins=[origin for origin in CORS_ORIGINS if "*" not in origin],
+    allow_origin_regex="|".join(re.escape(origin).replace(r"\*", r"[^/]+") for origin in CORS_ORIGINS if "*" in origin) or None,
+    allow_methods=["POST"],
+    allow_headers=["*"]
+)
+
+class _Instrumented:
+    """The ASGI counterpart of the Flask request hooks: latency histogram plus optional Server-Timing."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        trace = metrics.start_trace()
+        headers = dict(scope.get("headers") or [])
+        wants_trace = metrics.trace_requested(headers.get(metrics.TRACE_HEADER.lower().encode(), b"").decode())
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                elapsed = time.perf_counter() - started
+                metrics.HTTP_SECONDS.observe(elapsed, route=scope["path"], method=scope["method"], status=message["status"])
+                if wants_trace:
+                    message["headers"] = list(message.get("headers") or []) + [(b"server-timing", metrics.server_timing(trace, elapsed).encode())]
+            await send(message)
+
+        await self.app(scope, receive, send_with_timing)
+
+_chat_routes = _Instrumented(_chat_routes)
+
+@contextlib.asynccontextmanager
+async def _lifespan(app):
+    warm_up()
+    start_sweeper()
+    yield
+
+app = Starlette(routes=[
+    Route('/api/chat', _chat_routes),
+    Route('/api/chat/stream', _chat_routes),
+    Mount('/', WSGIMiddleware(flask_app, workers=int(os.getenv("WSGI_THREADS", "8"))))
+], lifespan=_lifespan)
+
+if __name__ == '__main__':
+    import uvicorn
+
+    port = int(os.environ.get('PORT', 8080))
+    print(f"🚀 Starting ASGI app on port {port}")
+    uvicorn.run(app, host='0.0.0.0', port=port)
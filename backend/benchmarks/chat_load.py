@@ -0,0 +1,82 @@
+"""Compares /api/chat throughput of the threaded Flask app and the ASGI app against a stub provider.
+
+    python benchmarks/chat_load.py --requests 400 --concurrency 200 --threads 8
+
+The sync run drives the Flask app from a pool of `--threads` threads (what one gunicorn worker
+with that many threads can hold in flight); the async run keeps `--concurrency` requests open
+against the ASGI app on one event loop. Every query is distinct, so neither the response cache
+nor the embedding cache short-circuits the provider calls.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+import stubs
+from stubs import StubProvider, install_stub_provider, sample_chunks
+
+import httpx
+
+from rag import Rag
+
+COLLECTION = "bench-chat"
+
+def _payload(i: int) -> dict:
+    return {"collection_name": COLLECTION, "query": f"question {i} about scaling distributed systems work", "provider_name": "stub"}
+
+def _summary(label: str, latencies: List[float], elapsed: float) -> str:
+    latencies = sorted(latencies)
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    return (f"{label:>6}: {len(latencies)} requests in {elapsed:.2f}s = {len(latencies) / elapsed:.1f} req/s, "
+            f"p50 {statistics.median(latencies) * 1000:.0f}ms, p95 {p95 * 1000:.0f}ms")
+
+def run_sync(n_requests: int, threads: int, offset: int) -> str:
+    from main import app
+
+    def one(i: int) -> float:
+        started = time.perf_counter()
+        response = app.test_client().post("/api/chat", json=_payload(offset + i))
+        assert response.status_code == 200, response.get_data(as_text=True)
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        latencies = list(executor.map(one, range(n_requests)))
+    return _summary("sync", latencies, time.perf_counter() - started)
+
+async def run_async(n_requests: int, concurrency: int, offset: int) -> str:
+    from asgi import app
+
+    limit = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=None) as client:
+        async def one(i: int) -> float:
+            async with limit:
+                started = time.perf_counter()
+                response = await client.post("/api/chat", json=_payload(offset + i))
+                assert response.status_code == 200, response.text
+                return time.perf_counter() - started
+
+        started = time.perf_counter()
+        latencies = await asyncio.gather(*(one(i) for i in range(n_requests)))
+    return _summary("async", list(latencies), time.perf_counter() - started)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=200, help="in-flight requests for the async run")
+    parser.add_argument("--threads", type=int, default=8, help="request threads for the sync run")
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    parser.add_argument("--generate-latency", type=float, default=0.3)
+    args = parser.parse_args()
+
+    install_stub_provider(StubProvider(embed_latency=args.embed_latency, generate_latency=args.generate_latency))
+    Rag(COLLECTION, "stub", "bench").set_doc_pipeline(sample_chunks())
+
+    print(f"Stub latencies: embed {args.embed_latency * 1000:.0f}ms, generate {args.generate_latency * 1000:.0f}ms (scratch dir {stubs.WORK_DIR})")
+    print(run_sync(args.requests, args.threads, offset=0))
+    print(asyncio.run(run_async(args.requests, args.concurrency, offset=args.requests)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Embedding compression benchmark: storage, query latency and recall of each setting against float32.
+
+Chunks from synthetic resumes are embedded once at full size, then stored in a local collection
+per setting. Recall@k is the overlap of each setting's top k with the uncompressed top k for the
+same questions, so 1.0 means retrieval is unchanged.
+
+    python benchmarks/compression.py                                     # local embedder, default settings
+    python benchmarks/compression.py --resumes 400 --settings 768:none,768:int8,256:binary
+    GOOGLE_API_KEY=... python benchmarks/compression.py --provider google  # the real Matryoshka model
+
+Truncation only keeps recall with Matryoshka-trained models (gemini-embedding-001, text-embedding-3-*).
+The offline hashing embedder is not one and its vectors are sparse, which also hurts the binary
+pre-filter; run against a real model before choosing settings.
+"""
+import os
+import sys
+import argparse
+from typing import Dict, List, Tuple
+
+import stubs
+from stubs import WORK_DIR
+from synthetic import SKILLS, THINGS, synthetic_resume
+from harness import format_table, measure
+
+import numpy as np
+
+from embedding_codec import EmbeddingCompression, normalize, storage_bytes, truncate
+from llm_provider import get_provider
+from preprocessor import chunkify_resume
+from vector_store import LocalVectorClient
+
+def _questions(count: int) -> List[str]:
+    return [f"Who has worked on {THINGS[i % len(THINGS)]} with {SKILLS[i % len(SKILLS)]} and {SKILLS[(i * 7 + 3) % len(SKILLS)]}?"
+            for i in range(count)]
+
+def _settings(spec: str) -> List[Tuple[str, EmbeddingCompression]]:
+    settings = []
+    for item in spec.split(","):
+        dimensions, _, quantization = item.strip().partition(":")
+        compression = EmbeddingCompression(int(dimensions) if dimensions not in ("", "full") else None, quantization or "none")
+        settings.append((f"{dimensions or 'full'}:{compression.quantization}", compression))
+    return settings
+
+def _disk_bytes(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(path, entry)) for entry in os.listdir(path) if entry.startswith(("vectors-", "scales-", "bits-")))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0], formatter_class=argparse.RawDescriptionHelpFormatter, epilog=__doc__)
+    parser.add_argument("--provider", default="local", help="embedding provider (needs its API key unless local)")
+    parser.add_argument("--resumes", type=int, default=150, help="synthetic resumes in the collection")
+    parser.add_argument("--questions", type=int, default=100)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--settings", default="full:none,full:int8,full:binary,256:none,256:int8",
+                        help="comma-separated dimensions:quantization pairs")
+    args = parser.parse_args()
+
+    os.environ.setdefault("LOCAL_EMBEDDING_BACKEND", "hashing")
+    provider = get_provider(args.provider, os.getenv(f"{args.provider.upper()}_API_KEY", "bench"))
+    chunks: List[str] = []
+    for seed in range(args.resumes):
+        chunks.extend(chunkify_resume(synthetic_resume(16, seed=seed), {})[0])
+    chunks = list(dict.fromkeys(chunks))
+    questions = _questions(args.questions)
+    print(f"Embedding {len(chunks)} chunks and {len(questions)} questions with {args.provider}...", file=sys.stderr)
+    documents = normalize(provider.embed_content(chunks, "retrieval_document"))
+    queries = normalize(provider.embed_content(questions, "retrieval_query"))
+    ids = [f"c{i}" for i in range(len(chunks))]
+
+    # Exact top k on the uncompressed vectors.
+    baseline = [[ids[i] for i in np.argsort(-(documents @ q))[:args.k]] for q in queries]
+
+    client = LocalVectorClient(os.path.join(WORK_DIR, "compression"))
+    rows: List[Dict] = []
+    results = []
+    for label, compression in _settings(args.settings):
+        collection = client.get_or_create_collection(f"bench-{label.replace(':', '-')}", metadata=compression.metadata())
+        collection.upsert(ids=ids, embeddings=truncate(documents, compression.dimensions), documents=chunks)
+        query_matrix = truncate(queries, compression.dimensions)
+
+        top = [collection.query(query_embeddings=[q], n_results=args.k, include=[])["ids"][0] for q in query_matrix]
+        recall = float(np.mean([len(set(a) & set(b)) / args.k for a, b in zip(top, baseline)]))
+        dim = query_matrix.shape[1]
+        rows.append({"setting": label, "dim": dim, "bytes_per_vector": storage_bytes(dim, compression.quantization),
+                     "disk_kb": _disk_bytes(collection.path) / 1024, "recall": recall})
+        results.append(measure(f"query[{label}]", lambda q, c=collection: c.query(query_embeddings=[q], n_results=args.k),
+                               list(query_matrix), warmup=min(5, len(query_matrix) // 5)))
+
+    print(f"{'setting':<14} {'dim':>6} {'bytes/vec':>10} {'disk KB':>10} {f'recall@{args.k}':>10}")
+    for row in rows:
+        print(f"{row['setting']:<14} {row['dim']:>6} {row['bytes_per_vector']:>10} {row['disk_kb']:>10.0f} {row['recall']:>10.3f}")
+    print()
+    print(format_table(results))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Timing, percentile summaries and baseline comparison for the benchmark suite."""
+import gc
+import json
+import math
+import time
+import platform
+import subprocess
+from typing import Callable, Dict, List, Optional, Sequence
+
+def percentile(sorted_values: Sequence[float], q: float) -> float:
+    """Nearest-rank percentile of already sorted values."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+def measure(name: str, fn: Callable, inputs: List, warmup: int = 2) -> Dict:
+    """Calls fn on each input (the first `warmup` untimed) and summarises the per-call latencies."""
+    for item in inputs[:warmup]:
+        fn(item)
+    timed_inputs = inputs[warmup:]
+
+    gc.collect()
+    latencies: List[float] = []
+    started = time.perf_counter()
+    for item in timed_inputs:
+        call_started = time.perf_counter()
+        fn(item)
+        latencies.append(time.perf_counter() - call_started)
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "name": name,
+        "iterations": len(latencies),
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "mean_ms": sum(latencies) / len(latencies) * 1000 if latencies else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+def environment(**settings) -> Dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=10).stdout.strip()
+    except Exception:
+        commit = ""
+    return {"commit": commit, "python": platform.python_version(), "machine": platform.machine(), "timestamp": time.time(), **settings}
+
+def save(path: str, results: List[Dict], env: Dict):
+    with open(path, "w") as f:
+        json.dump({"environment": env, "results": results}, f, indent=2)
+
+def load(path: str) -> Dict:
+    with open(path) as f:
+        return json.load(f)
+
+def compare(results: List[Dict], baseline: Dict, metric: str = "p50_ms", threshold: float = 0.2,
+            min_delta_ms: float = 0.5) -> List[Dict]:
+    """Returns the benchmarks whose `metric` grew by more than `threshold` (relative) and `min_delta_ms` (absolute)."""
+    previous = {result["name"]: result for result in baseline["results"]}
+    regressions = []
+    for result in results:
+        before = previous.get(result["name"])
+        if before is None:
+            continue
+        delta = result[metric] - before[metric]
+        if delta > min_delta_ms and before[metric] > 0 and delta / before[metric] > threshold:
+            regressions.append({"name": result["name"], "before": before[metric], "after": result[metric], "change": delta / before[metric]})
+    return regressions
+
+def format_table(results: List[Dict], baseline: Optional[Dict] = None, metric: str = "p50_ms") -> str:
+    previous = {result["name"]: result for result in (baseline or {}).get("results", [])}
+    header = f"{'benchmark':<34}{'iters':>7}{'ops/s':>11}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    if baseline:
+        header += f"{'vs base':>10}"
+    lines = [header, "-" * len(header)]
+    for result in results:
+        line = (f"{result['name']:<34}{result['iterations']:>7}{result['throughput']:>11.1f}"
+                f"{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}{result['p99_ms']:>10.2f}")
+        before = previous.get(result["name"])
+        if baseline:
+            line += f"{(result[metric] / before[metric] - 1) * 100:>+9.1f}%" if before and before[metric] else f"{'new':>10}"
+        lines.append(line)
+    return "\n".join(lines)
@@ -0,0 +1,153 @@
+"""Benchmark suite: micro-benchmarks for PDF extraction, chunking and retrieval, plus parse/build/add/chat end to end.
+
+Everything runs offline: providers are local fakes with the latency profile of the real one
+(scaled by --latency-scale, with seeded jitter), the vector store is the local backend and the
+Gemini parse call is replaced by a fake model.
+
+    python benchmarks/run.py                               # full suite
+    python benchmarks/run.py --only chunk --iterations 100
+    python benchmarks/run.py --latency-scale 0 --output base.json    # on the base commit
+    python benchmarks/run.py --latency-scale 0 --compare base.json   # on the candidate; exits 1 on regressions
+
+Use --latency-scale 0 for regression runs so timings measure this codebase rather than fake sleeps.
+"""
+import sys
+import json
+import argparse
+from typing import Callable, Dict, Iterator, List, Tuple
+
+import stubs
+from stubs import PROFILES, fake_provider, install_fake_parser, install_fake_providers
+from synthetic import SKILLS, resume_pdf, resume_text, synthetic_resume
+from harness import compare, environment, format_table, load, measure, save
+
+import rag
+from rag import Rag
+from lexical_index import BM25Index
+from preprocessor import chunkify_resume, chunkify_text, load_parse_pdf
+
+SIZES = {"small": 8, "medium": 32, "large": 128}
+
+Benchmark = Tuple[str, Callable, List]
+
+def _query(i: int) -> str:
+    return f"{SKILLS[i % len(SKILLS)]} {SKILLS[(i * 7) % len(SKILLS)]} services at scale {i}"
+
+def micro_benchmarks(iterations: int, warmup: int) -> Iterator[Benchmark]:
+    n = iterations + warmup
+    for size, entries in SIZES.items():
+        resume = synthetic_resume(entries)
+        text = resume_text(resume)
+        pdf = resume_pdf(resume)
+        yield f"pdf.extract[{size}]", load_parse_pdf, [pdf] * n
+        yield f"chunk.text[{size}]", chunkify_text, [text] * n
+        yield f"chunk.resume[{size}]", lambda r: chunkify_resume(r, {}), [resume] * n
+
+        chunks, metadatas = chunkify_resume(resume, {})
+        index = BM25Index()
+        index.add([str(i) for i in range(len(chunks))], chunks, metadatas)
+        yield f"bm25.search[{size}]", lambda q: index.search(q, k=12), [_query(i) for i in range(n)]
+
+        # Zero-latency provider: only embedding bookkeeping, the vector store and fusion are timed.
+        bot = Rag(f"bench-retrieve-{size}", "instant", "bench")
+        bot.set_doc_pipeline(chunks, metadatas)
+        for mode in ("hybrid", "vector"):
+            def retrieve(q, mode=mode, bot=bot):
+                rag.RETRIEVAL_MODE = mode
+                bot._retrieve(q, None, None, None)
+            yield f"retrieve.{mode}[{size}]", retrieve, [f"{_query(i)} {mode}" for i in range(n)]
+    rag.RETRIEVAL_MODE = "hybrid"
+
+def e2e_benchmarks(iterations: int, warmup: int, size: str, provider: str) -> Iterator[Benchmark]:
+    from main import app
+    client = app.test_client()
+    n = iterations + warmup
+    entries = SIZES[size]
+
+    def post(path: str, **kwargs) -> Dict:
+        response = client.post(path, **kwargs)
+        if response.status_code != 200:
+            raise RuntimeError(f"{path} returned {response.status_code}: {response.get_data(as_text=True)[:300]}")
+        return response.get_json()
+
+    # Distinct inputs per iteration so the parse, embedding and response caches all miss.
+    pdfs = [resume_pdf(synthetic_resume(entries, seed=1000 + i)) for i in range(n)]
+    yield f"e2e.parse[{size}]", lambda pdf: post("/api/parse-resume", data={"resume": (_BytesFile(pdf), "resume.pdf")}), pdfs
+
+    forms = [{"provider_name": provider, "api_key": "bench", "enrichments": "{}",
+              "parsedData": json.dumps(synthetic_resume(entries, seed=2000 + i))} for i in range(n)]
+    built: List[str] = []
+    yield f"e2e.build[{size}]", lambda form: built.append(post("/api/build-bot", data=form)["collection_name"]), forms
+
+    collection = built[-1] if built else post("/api/build-bot", data=forms[-1])["collection_name"]
+    texts = [resume_text(synthetic_resume(4, seed=3000 + i)) for i in range(n)]
+    yield f"e2e.add[{size}]", lambda text: post("/api/add-to-bot", json={
+        "collection_name": collection, "text": text, "provider_name": provider, "api_key": "bench"}), texts
+
+    payloads = [{"collection_name": collection, "query": _query(i), "provider_name": provider, "api_key": "bench"} for i in range(n)]
+    yield f"e2e.chat[{size}]", lambda payload: post("/api/chat", json=payload), payloads
+
+class _BytesFile:
+    """Minimal file object for the Flask test client's multipart encoder."""
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.offset = 0
+
+    def read(self, size: int = -1) -> bytes:
+        end = len(self.data) if size is None or size < 0 else self.offset + size
+        chunk = self.data[self.offset:end]
+        self.offset += len(chunk)
+        return chunk
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0], formatter_class=argparse.RawDescriptionHelpFormatter, epilog=__doc__)
+    parser.add_argument("--iterations", type=int, default=50, help="timed iterations per micro-benchmark")
+    parser.add_argument("--e2e-iterations", type=int, default=10, help="timed iterations per end-to-end benchmark")
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--e2e-size", choices=list(SIZES), default="medium")
+    parser.add_argument("--provider", choices=list(PROFILES), default="google", help="latency profile for the end-to-end fakes")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="multiplier on the fake provider latencies")
+    parser.add_argument("--jitter", type=float, default=0.2, help="relative standard deviation of fake latencies")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", help="run benchmarks whose name contains this substring")
+    parser.add_argument("--output", help="write results as JSON (use as a baseline later)")
+    parser.add_argument("--compare", help="baseline JSON to compare against; exits 1 on regressions")
+    parser.add_argument("--metric", choices=["p50_ms", "p95_ms", "p99_ms", "mean_ms"], default="p50_ms")
+    parser.add_argument("--threshold", type=float, default=0.2, help="relative slowdown that counts as a regression")
+    parser.add_argument("--min-delta-ms", type=float, default=0.5, help="ignore slowdowns smaller than this")
+    args = parser.parse_args()
+
+    fake = fake_provider(args.provider, latency_scale=args.latency_scale, jitter=args.jitter, seed=args.seed)
+    install_fake_providers({args.provider: fake, "instant": fake_provider(args.provider, latency_scale=0)})
+    install_fake_parser(synthetic_resume(SIZES[args.e2e_size]), latency=PROFILES["google"]["parse_latency"] * args.latency_scale)
+
+    baseline = load(args.compare) if args.compare else None
+    settings = {"latency_scale": args.latency_scale, "jitter": args.jitter, "provider": args.provider, "e2e_size": args.e2e_size}
+    if baseline and any(baseline["environment"].get(k) != v for k, v in settings.items()):
+        print(f"Warning: baseline settings differ: {({k: baseline['environment'].get(k) for k in settings})}")
+
+    results = []
+    # Generators are consumed lazily: later end-to-end benchmarks reuse collections built by earlier ones.
+    suites = (micro_benchmarks(args.iterations, args.warmup),
+              e2e_benchmarks(args.e2e_iterations, args.warmup, args.e2e_size, args.provider))
+    for suite in suites:
+        for name, fn, inputs in suite:
+            if args.only and args.only not in name:
+                continue
+            results.append(measure(name, fn, inputs, warmup=args.warmup))
+            print(f"  {name}: p50 {results[-1]['p50_ms']:.2f}ms", file=sys.stderr)
+
+    print(format_table(results, baseline, args.metric))
+    if args.output:
+        save(args.output, results, environment(**settings))
+    if baseline:
+        regressions = compare(results, baseline, args.metric, args.threshold, args.min_delta_ms)
+        for regression in regressions:
+            print(f"REGRESSION {regression['name']}: {args.metric} {regression['before']:.2f} -> {regression['after']:.2f} ({regression['change']:+.0%})")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.threshold:.0%} on {args.metric}.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Cold-start profile: import-time breakdown of the app module and time to the first healthy response.
+
+    python benchmarks/startup.py                        # import report + gunicorn cold start
+    python benchmarks/startup.py --top 30 --runs 5
+    python benchmarks/startup.py --budget-ms 1500       # exits 1 if the median cold start exceeds the budget
+    python benchmarks/startup.py --server none --output startup.json
+
+The import report comes from `python -X importtime`; "cumulative" includes a module's own imports.
+The cold start is measured from spawning the server to the first 200 from /health, which is what
+Cloud Run's startup probe waits for.
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import statistics
+import subprocess
+import urllib.request
+from typing import Dict, List
+
+from harness import environment
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def import_report(module: str, top: int) -> Dict:
+    """Runs `import <module>` in a fresh interpreter with -X importtime and returns the slowest modules."""
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND, capture_output=True, text=True, env=_env(),
+    )
+    wall = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+
+    rows: List[Dict] = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append({"module": name.strip(), "depth": (len(name) - len(name.lstrip())) // 2,
+                     "self_ms": int(self_us) / 1000, "cumulative_ms": int(cumulative_us) / 1000})
+    total = next((row["cumulative_ms"] for row in rows if row["module"] == module), 0.0)
+    rows.sort(key=lambda row: row["cumulative_ms"], reverse=True)
+    return {"module": module, "import_ms": total, "process_ms": round(wall * 1000, 1), "slowest": rows[:top]}
+
+def _env() -> Dict[str, str]:
+    env = dict(os.environ)
+    env.setdefault("GOOGLE_API_KEY", "bench")
+    return env
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def _server_command(server: str, port: int) -> List[str]:
+    if server == "gunicorn":
+        return [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--bind", f"127.0.0.1:{port}", "main:app"]
+    if server == "uvicorn":
+        return [sys.executable, "-m", "uvicorn", "asgi:app", "--host", "127.0.0.1", "--port", str(port)]
+    raise ValueError(f"Unknown server: {server}")
+
+def time_to_healthy(server: str, timeout: float) -> float:
+    """Seconds from spawning the server to its first 200 on /health."""
+    port = _free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen(_server_command(server, port), cwd=BACKEND, env=_env(),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - started < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"{server} exited with code {process.returncode} before becoming healthy")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.01)
+        raise TimeoutError(f"{server} was not healthy after {timeout}s")
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0], formatter_class=argparse.RawDescriptionHelpFormatter, epilog=__doc__)
+    parser.add_argument("--module", default="main", help="module whose import time is reported")
+    parser.add_argument("--top", type=int, default=20, help="slowest modules to list")
+    parser.add_argument("--server", choices=["gunicorn", "uvicorn", "none"], default="gunicorn")
+    parser.add_argument("--runs", type=int, default=3, help="cold starts to measure")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--budget-ms", type=float, help="fail when the median cold start (or import time with --server none) exceeds this")
+    parser.add_argument("--output", help="write the results as JSON")
+    args = parser.parse_args()
+
+    report = import_report(args.module, args.top)
+    print(f"import {report['module']}: {report['import_ms']:.0f} ms ({report['process_ms']:.0f} ms including interpreter start)")
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for row in report["slowest"]:
+        print(f"{row['cumulative_ms']:>14.1f} {row['self_ms']:>9.1f}  {'  ' * row['depth']}{row['module']}")
+
+    results = {"environment": environment(), "imports": report, "cold_start_ms": []}
+    if args.server != "none":
+        for _ in range(args.runs):
+            results["cold_start_ms"].append(round(time_to_healthy(args.server, args.timeout) * 1000, 1))
+        median = statistics.median(results["cold_start_ms"])
+        print(f"\n{args.server} time to first healthy response: median {median:.0f} ms over {args.runs} runs {results['cold_start_ms']}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Wrote {args.output}")
+
+    if args.budget_ms is not None:
+        measured = statistics.median(results["cold_start_ms"]) if results["cold_start_ms"] else report["import_ms"]
+        if measured > args.budget_ms:
+            print(f"Cold start {measured:.0f} ms exceeds the budget of {args.budget_ms:.0f} ms")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
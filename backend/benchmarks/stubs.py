@@ -0,0 +1,158 @@
+"""Local stand-ins for the LLM provider so benchmarks exercise the serving path without network calls.
+
+Import this module before any backend module: it points every store at a scratch directory
+and lifts the embedding rate limits, both of which are read when those modules load.
+"""
+import os
+import sys
+import json
+import time
+import atexit
+import random
+import shutil
+import asyncio
+import hashlib
+import tempfile
+from typing import Dict, List, Optional
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+WORK_DIR = tempfile.mkdtemp(prefix="pa_bench_")
+atexit.register(shutil.rmtree, WORK_DIR, ignore_errors=True)
+for key, value in {
+    "VECTOR_BACKEND": "local",
+    "LOCAL_VECTOR_DIR": os.path.join(WORK_DIR, "vectors"),
+    "EMBEDDING_CACHE_PATH": os.path.join(WORK_DIR, "embeddings.db"),
+    "JSON_CACHE_PATH": os.path.join(WORK_DIR, "cache.db"),
+    "JOB_DB_PATH": os.path.join(WORK_DIR, "jobs.db"),
+    "SESSION_STORE": "memory",
+    "EMBED_CONCURRENCY": "1000",
+    "EMBED_RATE_PER_SEC": "100000",
+    "GOOGLE_API_KEY": "bench",
+}.items():
+    os.environ.setdefault(key, value)
+
+import numpy as np
+
+from llm_provider import LLMProvider
+
+# Rough per-call latencies (seconds) and embedding sizes of the real providers.
+PROFILES: Dict[str, Dict] = {
+    "google": {"embed_latency": 0.15, "generate_latency": 0.8, "dim": 768, "parse_latency": 3.0},
+    "openai": {"embed_latency": 0.1, "generate_latency": 1.2, "dim": 1536},
+    "groq": {"embed_latency": 0.1, "generate_latency": 0.3, "dim": 1536},
+}
+
+class StubProvider(LLMProvider):
+    """Answers after a delay; sync methods sleep, async ones await, like a real SDK client.
+
+    `jitter` is the relative standard deviation of each delay, drawn from a seeded RNG so runs repeat.
+    Embeddings are a deterministic function of the text.
+    """
+
+    def __init__(self, api_key: str = "bench", embed_latency: float = 0.05, generate_latency: float = 0.3, dim: int = 64,
+                 jitter: float = 0.0, seed: int = 0, name: str = "stub"):
+        super().__init__(api_key)
+        self.embed_latency = embed_latency
+        self.generate_latency = generate_latency
+        self.dim = dim
+        self.jitter = jitter
+        self._rng = random.Random(seed)
+        self.embedding_model = f"{name}-embedding-{dim}"
+
+    def _delay(self, base: float) -> float:
+        if not base:
+            return 0.0
+        return max(0.0, base * (1 + self.jitter * self._rng.gauss(0, 1)))
+
+    def _vectors(self, chunks: List[str]) -> np.ndarray:
+        matrix = np.empty((len(chunks), self.dim), dtype=np.float32)
+        for i, text in enumerate(chunks):
+            seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:4], "little")
+            matrix[i] = np.random.default_rng(seed).standard_normal(self.dim)
+        return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+    def _answer(self, prompt: str) -> str:
+        return f"Stub answer for a {len(prompt)}-character prompt."
+
+    def generate_content(self, prompt: str, system_prompt: Optional[str] = None) -> str:
+        time.sleep(self._delay(self.generate_latency))
+        return self._answer(prompt)
+
+    def embed_content(self, chunks: List[str], task_type: str, dimensions: Optional[int] = None) -> np.ndarray:
+        time.sleep(self._delay(self.embed_latency))
+        return self._vectors(chunks)
+
+    async def agenerate_content(self, prompt: str, system_prompt: Optional[str] = None) -> str:
+        await asyncio.sleep(self._delay(self.generate_latency))
+        return self._answer(prompt)
+
+    async def aembed_content(self, chunks: List[str], task_type: str, dimensions: Optional[int] = None) -> np.ndarray:
+        await asyncio.sleep(self._delay(self.embed_latency))
+        return self._vectors(chunks)
+
+def fake_provider(name: str, latency_scale: float = 1.0, jitter: float = 0.2, seed: int = 0) -> StubProvider:
+    """A stand-in for the named provider with its profile's latencies multiplied by `latency_scale`."""
+    profile = PROFILES[name]
+    return StubProvider(
+        embed_latency=profile["embed_latency"] * latency_scale,
+        generate_latency=profile["generate_latency"] * latency_scale,
+        dim=profile["dim"], jitter=jitter, seed=seed, name=f"fake-{name}"
+    )
+
+def install_stub_provider(provider: LLMProvider):
+    """Makes every provider lookup in the backend return `provider`."""
+    install_fake_providers({}, default=provider)
+
+def install_fake_providers(providers: Dict[str, LLMProvider], default: Optional[LLMProvider] = None):
+    """Routes provider lookups by name to `providers`, falling back to `default`."""
+    import pool
+
+    def lookup(provider_name: str, api_key: str) -> LLMProvider:
+        provider = providers.get(provider_name.lower(), default)
+        if provider is None:
+            raise ValueError(f"No fake registered for provider: {provider_name}")
+        return provider
+
+    pool.get_provider = lookup
+    pool._providers.clear()
+
+class FakeParser(StubProvider):
+    """Answers structured parse calls from `resume`: each call gets the keys its schema asks for
+    whose content appears in the prompt, as a model would.
+
+    A call takes `latency` scaled by its answer's share of the whole resume (plus a fixed tenth),
+    since a model's time to answer is dominated by the tokens it writes.
+    """
+
+    def __init__(self, resume: Dict, latency: float = 0.0):
+        super().__init__(generate_latency=latency, name="fake-parser")
+        self.resume = resume
+
+    def generate_json(self, prompt: str, schema: Dict, system_prompt: Optional[str] = None) -> Dict:
+        fields = {**self.resume, "name": self.resume.get("personal_details", {}).get("name")}
+        answer = {key: fields[key] for key in schema["properties"] if fields.get(key) and self._mentioned(fields[key], prompt)}
+        share = len(json.dumps(answer)) / max(1, len(json.dumps(self.resume)))
+        time.sleep(self._delay(self.generate_latency * (0.1 + 0.9 * share)))
+        return answer
+
+    @staticmethod
+    def _mentioned(value, prompt: str) -> bool:
+        if isinstance(value, list):
+            return any(isinstance(item, dict) and str(item.get("title")) in prompt for item in value)
+        return str(value)[:40] in prompt
+
+def install_fake_parser(resume: Dict, latency: float = 0.0):
+    """Makes pipeline parse resumes with a FakeParser instead of the configured provider."""
+    import pipeline
+    parser = FakeParser(resume, latency)
+    pipeline.get_parse_provider = lambda: parser
+
+def sample_chunks(count: int = 60) -> List[str]:
+    topics = ["Python", "Kubernetes", "PostgreSQL", "React", "distributed tracing", "Rust", "GraphQL", "Terraform"]
+    return [
+        f"=== PROJECTS ===\nTitle: Project {i}\nDescription: Built a {topics[i % len(topics)]} service "
+        f"handling {1000 * (i + 1)} requests per second, cutting latency by {5 + i % 40}%."
+        for i in range(count)
+    ]
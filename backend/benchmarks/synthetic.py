@@ -0,0 +1,72 @@
+"""Deterministic synthetic resumes (parsed JSON, text and PDF) of a given size."""
+import random
+from typing import Dict, List
+
+import fitz
+
+SKILLS = ["Python", "Go", "Rust", "TypeScript", "React", "Kubernetes", "Terraform", "PostgreSQL", "Redis",
+          "Kafka", "GraphQL", "PyTorch", "Spark", "Airflow", "AWS", "GCP", "Docker", "gRPC", "FastAPI", "Flask"]
+VERBS = ["Built", "Designed", "Led", "Migrated", "Optimised", "Automated", "Scaled", "Shipped", "Refactored"]
+THINGS = ["a billing service", "the search pipeline", "an internal CLI", "a feature store", "the ingestion API",
+          "a recommendation model", "the mobile backend", "an observability stack", "a data warehouse"]
+ORGS = ["Acme Corp", "Globex", "Initech", "Umbrella Labs", "Hooli", "Stark Industries", "Wayne Enterprises"]
+
+def _bullets(rng: random.Random, count: int) -> str:
+    return "\n".join(
+        f"{rng.choice(VERBS)} {rng.choice(THINGS)} with {rng.choice(SKILLS)} and {rng.choice(SKILLS)}, "
+        f"improving throughput by {rng.randint(5, 90)}% for {rng.randint(2, 500)}k users."
+        for _ in range(count)
+    )
+
+def synthetic_resume(entries: int, seed: int = 0) -> Dict:
+    """A parsed resume with roughly `entries` section entries; different seeds give different text."""
+    rng = random.Random(seed)
+    per_section = max(1, entries // 4)
+    resume: Dict = {
+        "personal_details": {
+            "name": f"Candidate {seed}",
+            "email": f"candidate{seed}@example.com",
+            "phone": f"+1 555 {seed:04d}",
+            "links": [{"type": "github", "url": f"https://github.com/candidate{seed}"}],
+        },
+        "summary": f"Engineer #{seed} focused on {', '.join(rng.sample(SKILLS, 4))}. " + _bullets(rng, 2),
+        "EXPERIENCE": [
+            {"title": f"Senior Engineer {i}", "subtitle": rng.choice(ORGS), "date": f"{2010 + i % 14}-{2011 + i % 14}",
+             "description": _bullets(rng, rng.randint(3, 8))}
+            for i in range(per_section)
+        ],
+        "PROJECTS": [
+            {"title": f"Project {seed}-{i}", "subtitle": None, "date": None, "description": _bullets(rng, rng.randint(1, 4))}
+            for i in range(per_section)
+        ],
+        "EDUCATION": [
+            {"title": "BSc Computer Science", "subtitle": f"University {i}", "date": "2008-2012", "description": None}
+            for i in range(max(1, per_section // 4))
+        ],
+        "SKILLS": [{"title": skill, "description": None} for skill in rng.sample(SKILLS, min(len(SKILLS), per_section))],
+    }
+    return resume
+
+def resume_text(resume: Dict) -> str:
+    lines: List[str] = [resume["personal_details"]["name"], resume["personal_details"]["email"], "", resume["summary"], ""]
+    for section, items in resume.items():
+        if not isinstance(items, list):
+            continue
+        lines.append(section)
+        for item in items:
+            lines.extend(part for part in (item.get("title"), item.get("subtitle"), item.get("date"), item.get("description")) if part)
+        lines.append("")
+    return "\n".join(lines)
+
+def resume_pdf(resume: Dict, lines_per_page: int = 55) -> bytes:
+    lines = [wrapped for line in resume_text(resume).splitlines() for wrapped in (_wrap(line) or [""])]
+    doc = fitz.open()
+    for start in range(0, len(lines), lines_per_page):
+        page = doc.new_page()
+        page.insert_text((40, 50), "\n".join(lines[start:start + lines_per_page]), fontsize=9)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+def _wrap(line: str, width: int = 110) -> List[str]:
+    return [line[i:i + width] for i in range(0, len(line), width)]
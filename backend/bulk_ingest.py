@@ -0,0 +1,280 @@
+import os
+import time
+import shutil
+import hashlib
+import zipfile
+import tempfile
+import threading
+import traceback
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import IO, Dict, List, Optional, Tuple
+
+from embedding_cache import embed_with_cache
+from collection_registry import mark_ready, new_temp_collection_name, owner_of, register
+from embedding_codec import default_compression
+from embedding_scheduler import EMBED_BATCH_SIZE
+from jobs import report_progress
+from metrics import counter, timed
+from pipeline import parse_resume_content
+from pool import get_pooled_provider
+from preprocessor import MAX_PDF_BYTES, chunkify_resume
+from rag import Rag
+
+BULK_MAX_ITEMS = int(os.getenv("BULK_MAX_ITEMS", "500"))
+BULK_PARSE_CONCURRENCY = int(os.getenv("BULK_PARSE_CONCURRENCY", "4"))
+BULK_EMBED_CONCURRENCY = int(os.getenv("BULK_EMBED_CONCURRENCY", "2"))
+# Uploads are written here as they are read, so a queued batch holds file paths rather than bytes.
+BULK_SPOOL_DIR = os.getenv("BULK_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "pa_bulk"))
+# Left behind only by batches whose job never ran (deduplicated, cancelled while queued, worker exit).
+BULK_SPOOL_TTL = float(os.getenv("BULK_SPOOL_TTL", str(24 * 3600)))
+# Total bytes one batch may write to the spool, counting extracted archive members.
+BULK_MAX_TOTAL_BYTES = int(os.getenv("BULK_MAX_TOTAL_BYTES", str(1024 * 1024 * 1024)))
+_COPY_BLOCK = 1024 * 1024
+
+BULK_ITEMS = counter("pa_bulk_items_total", "Resumes processed by bulk ingestion, by outcome.")
+
+def new_spool() -> str:
+    """Creates a spool directory for one batch, clearing out abandoned ones first."""
+    os.makedirs(BULK_SPOOL_DIR, exist_ok=True)
+    cutoff = time.time() - BULK_SPOOL_TTL
+    for entry in os.listdir(BULK_SPOOL_DIR):
+        path = os.path.join(BULK_SPOOL_DIR, entry)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+        except OSError:
+            pass
+    return tempfile.mkdtemp(prefix="batch-", dir=BULK_SPOOL_DIR)
+
+def remove_spool(spool: str):
+    shutil.rmtree(spool, ignore_errors=True)
+
+def _item(index: int, filename: str, path: Optional[str] = None, digest: Optional[str] = None, error: Optional[str] = None) -> Dict:
+    return {"index": index, "filename": filename, "path": path, "digest": digest, "error": error}
+
+def collect_items(files: List[Tuple[str, IO[bytes]]], spool: str) -> List[Dict]:
+    """Turns uploaded file streams into ingestion items, expanding zip archives into their PDF members.
+
+    Each PDF is copied into `spool` a block at a time; oversized files become failed items and
+    the batch is rejected once it exceeds BULK_MAX_TOTAL_BYTES.
+    """
+    items: List[Dict] = []
+    total = 0
+
+    def add(filename: str, stream: Optional[IO[bytes]] = None, error: Optional[str] = None):
+        nonlocal total
+        if len(items) >= BULK_MAX_ITEMS:
+            raise ValueError(f"Too many resumes in one batch; the limit is {BULK_MAX_ITEMS}")
+        index = len(items)
+        if stream is None:
+            items.append(_item(index, filename, error=error))
+            return
+        path = os.path.join(spool, f"{index:05d}.pdf")
+        digest = hashlib.sha256()
+        size = 0
+        with open(path, "wb") as out:
+            # Sizes in zip headers can lie, so the limits are checked against the bytes actually read.
+            while size <= MAX_PDF_BYTES:
+                block = stream.read(_COPY_BLOCK)
+                if not block:
+                    break
+                size += len(block)
+                total += len(block)
+                if total > BULK_MAX_TOTAL_BYTES:
+                    raise ValueError(f"Upload expands to more than {BULK_MAX_TOTAL_BYTES} bytes; that is the limit per batch")
+                digest.update(block)
+                out.write(block)
+        if size and size <= MAX_PDF_BYTES:
+            items.append(_item(index, filename, path, digest.hexdigest()))
+            return
+        os.remove(path)
+        items.append(_item(index, filename, error=f"PDF is larger than the {MAX_PDF_BYTES}-byte limit" if size else "Empty file"))
+
+    for filename, stream in files:
+        is_zip = zipfile.is_zipfile(stream)
+        stream.seek(0)
+        if not is_zip:
+            add(filename, stream)
+            continue
+        with zipfile.ZipFile(stream) as archive:
+            for info in archive.infolist():
+                name = info.filename
+                if info.is_dir() or not name.lower().endswith(".pdf") or name.startswith("__MACOSX/") or os.path.basename(name).startswith("."):
+                    continue
+                if info.file_size > MAX_PDF_BYTES:
+                    add(name, error=f"PDF is {info.file_size} bytes; the limit is {MAX_PDF_BYTES}")
+                else:
+                    with archive.open(info) as member:
+                        add(name, member)
+
+    if not items:
+        raise ValueError("No PDF files found in the upload")
+    return items
+
+def batch_key(items: List[Dict], provider_name: str, api_key: str) -> str:
+    # Keyed by caller too, so another client's identical upload never gets this batch's collections.
+    digest = hashlib.sha256(f"{owner_of(api_key)}:{provider_name}".encode("utf-8"))
+    for item in items:
+        digest.update(bytes.fromhex(item["digest"]) if item["digest"] else hashlib.sha256(item["error"].encode("utf-8")).digest())
+    return digest.hexdigest()
+
+def _parse_and_chunk(path: str) -> Tuple[Dict, List[str], List[Dict]]:
+    # Read only when a parse slot is free, so at most BULK_PARSE_CONCURRENCY files are in memory.
+    with open(path, "rb") as f:
+        data = f.read()
+    parsed = parse_resume_content(data)
+    chunks, metadatas = chunkify_resume(parsed, {})
+    return parsed, chunks, metadatas
+
+def _failure(stage: str, error: Exception) -> Dict:
+    return {"status": "failed", "stage": stage, "error": str(error), "error_type": type(error).__name__}
+
+def _embed_and_store(pack: List[Tuple[int, List[str], List[Dict]]], provider_name: str, api_key: str,
+                     stop: threading.Event) -> List[Tuple[int, Dict]]:
+    """Embeds the chunks of several resumes in one request stream, then writes one collection per resume.
+
+    Once `stop` is set (the job was cancelled) no further collections are created; nobody would
+    receive their names.
+    """
+    provider = get_pooled_provider(provider_name, api_key)
+    all_chunks = [chunk for _, chunks, _ in pack for chunk in chunks]
+    try:
+        with timed("bulk.embed"):
+            # New collections take the default compression, so embed at its dimensionality.
+            embeddings = embed_with_cache(provider, all_chunks, task_type="retrieval_document",
+                                          dimensions=default_compression().dimensions)
+    except Exception as e:
+        traceback.print_exc()
+        return [(index, _failure("embed", e)) for index, _, _ in pack]
+
+    outcomes: List[Tuple[int, Dict]] = []
+    offset = 0
+    for index, chunks, metadatas in pack:
+        if stop.is_set():
+            outcomes.append((index, {"status": "cancelled"}))
+            continue
+        resume_embeddings = embeddings[offset:offset + len(chunks)]
+        offset += len(chunks)
+        try:
+            collection_name = new_temp_collection_name()
+            with timed("bulk.store"):
+                rag_system = Rag(collection_name=collection_name, provider_name=provider_name, api_key=api_key)
+                register(rag_system.collection, owner_of(api_key))
+                rag_system.set_doc_pipeline(chunks, metadatas, embeddings=resume_embeddings)
+                mark_ready(rag_system.collection)
+            outcomes.append((index, {"status": "succeeded", "collection_name": collection_name}))
+        except Exception as e:
+            traceback.print_exc()
+            outcomes.append((index, _failure("store", e)))
+    return outcomes
+
+def bulk_ingest(items: List[Dict], provider_name: str, api_key: str) -> Dict:
+    """Parses, chunks, embeds and stores many resumes, one temporary bot per resume.
+
+    Parsing runs BULK_PARSE_CONCURRENCY at a time. Chunks from consecutive parsed resumes are
+    packed until they fill an embedding batch, and up to BULK_EMBED_CONCURRENCY packs are
+    embedded and stored while parsing continues. A failing resume is reported in its own result
+    and never aborts the batch.
+    """
+    results = [{"index": item["index"], "filename": item["filename"], "status": "pending"} for item in items]
+    first_by_digest: Dict[str, int] = {}
+    duplicates: List[Tuple[int, int]] = []
+
+    def finish(index: int, outcome: Dict):
+        results[index].update(outcome)
+        BULK_ITEMS.inc(status=outcome["status"])
+
+    def progress() -> bool:
+        done = sum(1 for result in results if result["status"] not in ("pending", "parsed"))
+        return report_progress(
+            total=len(results),
+            parsed=sum(1 for result in results if result["status"] != "pending"),
+            done=done,
+            failed=sum(1 for result in results if result["status"] == "failed"),
+        )
+
+    with ThreadPoolExecutor(BULK_PARSE_CONCURRENCY, thread_name_prefix="bulk-parse") as parse_pool, \
+         ThreadPoolExecutor(BULK_EMBED_CONCURRENCY, thread_name_prefix="bulk-embed") as embed_pool:
+        parse_futures: Dict[Future, int] = {}
+        for item in items:
+            if item["error"]:
+                finish(item["index"], {"status": "failed", "stage": "upload", "error": item["error"], "error_type": "ValueError"})
+                continue
+            digest = item["digest"]
+            if digest in first_by_digest:
+                duplicates.append((item["index"], first_by_digest[digest]))
+                continue
+            first_by_digest[digest] = item["index"]
+            parse_futures[parse_pool.submit(_parse_and_chunk, item["path"])] = item["index"]
+
+        pending = set(parse_futures)
+        parsing = len(parse_futures)
+        pack: List[Tuple[int, List[str], List[Dict]]] = []
+        pack_size = 0
+        cancelled = False
+        stop = threading.Event()
+
+        def flush():
+            nonlocal pack, pack_size
+            if pack:
+                pending.add(embed_pool.submit(_embed_and_store, pack, provider_name, api_key, stop))
+                pack, pack_size = [], 0
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.discard(future)
+                if future.cancelled():
+                    continue
+                if future not in parse_futures:
+                    for index, outcome in future.result():
+                        finish(index, outcome)
+                    continue
+
+                parsing -= 1
+                index = parse_futures[future]
+                try:
+                    parsed, chunks, metadatas = future.result()
+                except Exception as e:
+                    print(f"Bulk ingest: {results[index]['filename']} failed to parse: {type(e).__name__}: {e}")
+                    finish(index, _failure("parse", e))
+                    continue
+                if not chunks:
+                    finish(index, _failure("chunk", ValueError("No content could be extracted from the resume")))
+                    continue
+
+                if cancelled:
+                    # Parsed after the cancel arrived: nothing more is spent on it.
+                    continue
+                details = parsed.get("personal_details")
+                results[index].update(status="parsed", chunks=len(chunks), name=details.get("name") if isinstance(details, dict) else None)
+                pack.append((index, chunks, metadatas))
+                pack_size += len(chunks)
+                if pack_size >= EMBED_BATCH_SIZE:
+                    flush()
+
+            if not parsing:
+                flush()
+            if not progress() and not cancelled:
+                cancelled = True
+                stop.set()
+                for future in list(pending):
+                    if future.cancel():
+                        pending.discard(future)
+                        if future in parse_futures:
+                            parsing -= 1
+                # Parsed resumes still waiting for a pack are dropped rather than embedded and stored.
+                pack, pack_size = [], 0
+
+    for index, original in duplicates:
+        outcome = {key: value for key, value in results[original].items() if key not in ("index", "filename")}
+        results[index].update(outcome, duplicate_of=original)
+    for result in results:
+        if result["status"] in ("pending", "parsed"):
+            result["status"] = "cancelled"
+    progress()
+
+    succeeded = sum(1 for result in results if result["status"] == "succeeded")
+    failed = sum(1 for result in results if result["status"] == "failed")
+    print(f"Bulk ingest finished: {succeeded} succeeded, {failed} failed, {len(results)} total")
+    return {"total": len(results), "succeeded": succeeded, "failed": failed, "items": results}
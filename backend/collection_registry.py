@@ -0,0 +1,236 @@
+import os
+import json
+import time
+import uuid
+import random
+import hashlib
+import threading
+import traceback
+from typing import Dict, List, Optional, Tuple
+
+import metrics
+from pool import ALIAS_KEY, get_vector_client, forget_collection
+
+# Every /api/build-bot creates a temp-* collection and only finalizing deletes one, so abandoned
+# previews would pile up in the tenant. The registry records lifecycle fields in each collection's
+# own metadata (shared by every instance, unlike local state on Cloud Run):
+#
+#   created_at, last_accessed  epoch seconds; last_accessed is refreshed at most every TOUCH_INTERVAL
+#   owner                      fingerprint of the API key that built it
+#   content_hash, build_state  what was embedded and whether it finished, for reuse by build-bot
+#   finalized_as               set by Rag.rename_collection when the temp collection backs a permanent bot
+#
+# The sweeper deletes temp collections idle for longer than TEMP_COLLECTION_TTL, never ones that
+# are finalized or that an alias points at.
+
+TEMP_PREFIX = "temp-"
+TEMP_COLLECTION_TTL = float(os.getenv("TEMP_COLLECTION_TTL", str(24 * 3600)))
+TOUCH_INTERVAL = float(os.getenv("COLLECTION_TOUCH_INTERVAL", "3600"))
+SWEEP_ENABLED = os.getenv("COLLECTION_SWEEP", "true").lower() == "true"
+SWEEP_INTERVAL = float(os.getenv("COLLECTION_SWEEP_INTERVAL", "3600"))
+SWEEP_BATCH_SIZE = int(os.getenv("COLLECTION_SWEEP_BATCH", "20"))
+SWEEP_BATCH_PAUSE = float(os.getenv("COLLECTION_SWEEP_PAUSE", "1.0"))
+
+SWEPT = metrics.counter("pa_collections_swept_total", "Stale temporary collections deleted by the sweeper.")
+
+_thread: Optional[threading.Thread] = None
+_lock = threading.Lock()
+_sweep_lock = threading.Lock()
+_last_report: Dict = {}
+
+# Once set, these are never dropped by a metadata write: losing either would let the sweeper
+# delete a collection that backs a permanent bot.
+STICKY_KEYS = ("finalized_as", ALIAS_KEY)
+
+def update_metadata(collection, **updates):
+    """Merges `updates` into the collection's stored metadata.
+
+    modify() replaces the metadata as a whole and pooled handles can be minutes old, so the merge
+    starts from a fresh read rather than from `collection.metadata`.
+    """
+    fresh = _find(collection.name)
+    current = (fresh if fresh is not None else collection).metadata or {}
+    # Chroma rejects hnsw:* keys on modify.
+    metadata = {k: v for k, v in current.items() if not k.startswith("hnsw:")}
+    metadata.update(updates)
+    for key in STICKY_KEYS:
+        if current.get(key) and not metadata.get(key):
+            metadata[key] = current[key]
+    collection.modify(metadata=metadata)
+
+def owner_of(api_key: str) -> str:
+    return hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:16]
+
+def new_record(owner: str) -> Dict:
+    now = time.time()
+    return {"created_at": now, "last_accessed": now, "owner": owner}
+
+def content_hash(owner: str, provider_name: str, parsed_data: Dict, enrichments: Dict, compression) -> str:
+    content = json.dumps([owner, provider_name.lower(), parsed_data, enrichments, repr(compression)], sort_keys=True)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+def new_temp_collection_name() -> str:
+    return f"{TEMP_PREFIX}{uuid.uuid4()}"
+
+def _find(name: str):
+    try:
+        return get_vector_client().get_collection(name=name)
+    except Exception:
+        return None
+
+def _is_reusable(metadata: Dict, digest: str) -> bool:
+    return (metadata.get("content_hash") == digest and metadata.get("build_state") == "ready"
+            and not metadata.get("finalized_as") and not metadata.get(ALIAS_KEY))
+
+def claim_temp_collection(digest: str) -> Tuple[str, bool]:
+    """Name for a temp collection holding content `digest`, and whether it is already built.
+
+    The name is derived from the digest so a rebuild of the same content (from any instance) finds
+    the earlier collection. Once that name is finalized or modified, a fresh random name is used.
+    """
+    name = f"{TEMP_PREFIX}{digest[:32]}"
+    collection = _find(name)
+    if collection is None:
+        return name, False
+    if _is_reusable(collection.metadata or {}, digest):
+        touch(collection, force=True)
+        return name, True
+    return new_temp_collection_name(), False
+
+def register(collection, owner: str, digest: Optional[str] = None):
+    update_metadata(collection, **new_record(owner), content_hash=digest or "", build_state="building")
+
+def mark_ready(collection):
+    update_metadata(collection, build_state="ready")
+
+def mark_modified(collection):
+    """Content no longer matches its hash (documents were added), so build-bot must not reuse it."""
+    if (collection.metadata or {}).get("content_hash"):
+        update_metadata(collection, content_hash="")
+
+def touch(collection, force: bool = False):
+    """Refreshes last_accessed of a registered temp collection, writing only if it is older than TOUCH_INTERVAL."""
+    metadata = collection.metadata or {}
+    if not collection.name.startswith(TEMP_PREFIX) or "created_at" not in metadata:
+        return
+    if force or time.time() - (metadata.get("last_accessed") or 0) > TOUCH_INTERVAL:
+        try:
+            update_metadata(collection, last_accessed=time.time())
+        except Exception as e:
+            print(f"Could not touch collection {collection.name}: {type(e).__name__}: {e}")
+
+def _stale_candidates(collections: List, now: float, ttl: float, dry_run: bool, report: Dict) -> List[Dict]:
+    aliased = _aliased_names(collections)
+    stale: List[Dict] = []
+    for collection in collections:
+        if not collection.name.startswith(TEMP_PREFIX):
+            continue
+        report["temp"] += 1
+        metadata = collection.metadata or {}
+        if metadata.get("finalized_as"):
+            report["kept"]["finalized"] += 1
+            continue
+        if collection.name in aliased:
+            report["kept"]["aliased"] += 1
+            continue
+        last = metadata.get("last_accessed") or metadata.get("created_at")
+        if not last:
+            # Built before the registry existed: start its clock now rather than guess its age.
+            report["kept"]["untracked"] += 1
+            if not dry_run:
+                try:
+                    update_metadata(collection, created_at=now, last_accessed=now)
+                except Exception as e:
+                    report["errors"].append({"name": collection.name, "error": f"{type(e).__name__}: {e}"})
+            continue
+        idle = now - last
+        if idle < ttl:
+            report["kept"]["fresh"] += 1
+            continue
+        stale.append({"name": collection.name, "owner": metadata.get("owner"), "idle_hours": round(idle / 3600, 1)})
+    return stale
+
+def _aliased_names(collections: List) -> set:
+    return {(c.metadata or {}).get(ALIAS_KEY) for c in collections}
+
+def _still_stale(name: str, now: float, ttl: float, aliased: set) -> bool:
+    # Re-read right before deleting: the collection may have been used, finalized or aliased since the listing.
+    collection = _find(name)
+    if collection is None or name in aliased:
+        return False
+    metadata = collection.metadata or {}
+    last = metadata.get("last_accessed") or metadata.get("created_at") or now
+    return not metadata.get("finalized_as") and now - last >= ttl
+
+def sweep(dry_run: bool = False, ttl: Optional[float] = None, batch_size: Optional[int] = None) -> Dict:
+    """Deletes temp collections idle for longer than `ttl` seconds, `batch_size` at a time with a
+    pause in between. With `dry_run`, only reports what would be deleted."""
+    global _last_report
+    ttl = TEMP_COLLECTION_TTL if ttl is None else ttl
+    batch_size = batch_size or SWEEP_BATCH_SIZE
+    started = time.time()
+    report = {
+        "dry_run": dry_run, "ttl_seconds": ttl, "scanned": 0, "temp": 0,
+        "kept": {"finalized": 0, "aliased": 0, "fresh": 0, "untracked": 0},
+        "stale": [], "deleted": [], "errors": [],
+    }
+    with _sweep_lock:
+        collections = get_vector_client().list_collections()
+        report["scanned"] = len(collections)
+        report["stale"] = _stale_candidates(collections, started, ttl, dry_run, report)
+        if not dry_run:
+            names = [entry["name"] for entry in report["stale"]]
+            for offset in range(0, len(names), batch_size):
+                if offset:
+                    time.sleep(SWEEP_BATCH_PAUSE)
+                # Aliases created since the first listing (or the last batch) protect their targets too.
+                aliased = _aliased_names(collections if not offset else get_vector_client().list_collections())
+                for name in names[offset:offset + batch_size]:
+                    try:
+                        if not _still_stale(name, time.time(), ttl, aliased):
+                            continue
+                        get_vector_client().delete_collection(name=name)
+                        forget_collection(name)
+                        report["deleted"].append(name)
+                        SWEPT.inc()
+                    except Exception as e:
+                        report["errors"].append({"name": name, "error": f"{type(e).__name__}: {e}"})
+        report["seconds"] = round(time.time() - started, 3)
+        if not dry_run:
+            _last_report = {key: value for key, value in report.items() if key not in ("stale", "deleted", "errors")}
+            _last_report.update(finished_at=time.time(), stale=len(report["stale"]), deleted=len(report["deleted"]),
+                                errors=len(report["errors"]))
+    print(f"Collection sweep{' (dry run)' if dry_run else ''}: {len(report['stale'])} stale of {report['temp']} temp, "
+          f"{len(report['deleted'])} deleted, {len(report['errors'])} errors")
+    return report
+
+def _sweep_forever():
+    # Spread workers and instances out so they don't all list the tenant at once.
+    time.sleep(random.uniform(0.1, 1.0) * SWEEP_INTERVAL)
+    while True:
+        try:
+            sweep()
+        except Exception:
+            traceback.print_exc()
+        time.sleep(SWEEP_INTERVAL)
+
+def start_sweeper() -> bool:
+    """Starts the background sweeper once per process; returns False if it was disabled or already started."""
+    global _thread
+    if not SWEEP_ENABLED:
+        return False
+    with _lock:
+        if _thread is not None:
+            return False
+        _thread = threading.Thread(target=_sweep_forever, name="collection-sweeper", daemon=True)
+        _thread.start()
+    return True
+
+def sweeper_status() -> Dict:
+    return {
+        "enabled": SWEEP_ENABLED,
+        "running": _thread is not None and _thread.is_alive(),
+        "ttl_seconds": TEMP_COLLECTION_TTL,
+        "interval_seconds": SWEEP_INTERVAL,
+        "last_sweep": dict(_last_report),
+    }
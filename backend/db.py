@@ -0,0 +1,23 @@
+import os
+import sqlite3
+import threading
+from typing import Dict
+
+_local = threading.local()
+
+def get_connection(path: str) -> sqlite3.Connection:
+    """Returns a per-thread autocommit connection to a WAL-mode SQLite file."""
+    conns: Dict[str, sqlite3.Connection] = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(path)
+    if conn is None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=30000")
+        conns[path] = conn
+    return conn
@@ -0,0 +1,186 @@
+import os
+import asyncio
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from db import get_connection
+from embedding_codec import truncate
+from llm_provider import LLMProvider
+from embedding_scheduler import aembed_batches, embed_batches
+from metrics import counter
+
+EMBEDDED_TEXTS = counter("pa_embedded_texts_total", "Texts sent to an embedding model (cache misses).")
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def embedding_model_name(provider: LLMProvider, dimensions: Optional[int] = None) -> str:
+    model = getattr(provider, "embedding_model", type(provider).__name__)
+    # Shortened embeddings are cached apart from full-size ones of the same model.
+    return f"{model}@{dimensions}" if dimensions else model
+
+class EmbeddingCache:
+    """Two-tier (memory LRU, then SQLite) cache of float32 embedding rows keyed by (model, task_type, sha256(text))."""
+
+    def __init__(self, path: Optional[str], max_memory_entries: int, max_disk_entries: int):
+        self.path = path
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self._memory: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_prune = 0.0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if self.path:
+            get_connection(self.path).execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "model TEXT NOT NULL, task_type TEXT NOT NULL, text_hash TEXT NOT NULL, "
+                "vector BLOB NOT NULL, last_used REAL NOT NULL, PRIMARY KEY (model, task_type, text_hash))"
+            )
+            get_connection(self.path).execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)")
+
+    def _remember(self, key: tuple, vector: np.ndarray):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def get_many(self, model: str, task_type: str, hashes: List[str]) -> Dict[str, np.ndarray]:
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            for h in hashes:
+                vector = self._memory.get((model, task_type, h))
+                if vector is not None:
+                    self._memory.move_to_end((model, task_type, h))
+                    found[h] = vector
+            self.memory_hits += len(found)
+
+        remaining = [h for h in dict.fromkeys(hashes) if h not in found]
+        if self.path and remaining:
+            conn = get_connection(self.path)
+            from_disk: Dict[str, np.ndarray] = {}
+            for i in range(0, len(remaining), 500):
+                part = remaining[i:i+500]
+                rows = conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND task_type = ? "
+                    f"AND text_hash IN ({','.join('?' * len(part))})",
+                    [model, task_type, *part],
+                ).fetchall()
+                for h, blob in rows:
+                    from_disk[h] = np.frombuffer(blob, dtype=np.float32)
+            if from_disk:
+                conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND task_type = ? AND text_hash = ?",
+                    [(time.time(), model, task_type, h) for h in from_disk],
+                )
+                with self._lock:
+                    for h, vector in from_disk.items():
+                        self._remember((model, task_type, h), vector)
+                    self.disk_hits += len(from_disk)
+                found.update(from_disk)
+
+        with self._lock:
+            self.misses += len([h for h in dict.fromkeys(hashes) if h not in found])
+        return found
+
+    def put_many(self, model: str, task_type: str, vectors: Dict[str, np.ndarray]):
+        with self._lock:
+            for h, vector in vectors.items():
+                self._remember((model, task_type, h), vector)
+        if not self.path or not vectors:
+            return
+        now = time.time()
+        conn = get_connection(self.path)
+        conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (model, task_type, text_hash, vector, last_used) VALUES (?, ?, ?, ?, ?)",
+            [(model, task_type, h, np.asarray(vector, dtype=np.float32).tobytes(), now) for h, vector in vectors.items()],
+        )
+        if now - self._last_prune > 60:
+            self._last_prune = now
+            self._prune()
+
+    def _prune(self):
+        conn = get_connection(self.path)
+        (count,) = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        if count > self.max_disk_entries:
+            conn.execute(
+                "DELETE FROM embeddings WHERE rowid IN (SELECT rowid FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                (count - self.max_disk_entries,),
+            )
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_entries": len(self._memory),
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+_cache: Optional[EmbeddingCache] = None
+_cache_lock = threading.Lock()
+
+def get_embedding_cache() -> EmbeddingCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = EmbeddingCache(
+                    path=os.getenv("EMBEDDING_CACHE_PATH", "/tmp/pa_embeddings.db") or None,
+                    max_memory_entries=int(os.getenv("EMBEDDING_CACHE_MEMORY_ENTRIES", "5000")),
+                    max_disk_entries=int(os.getenv("EMBEDDING_CACHE_DISK_ENTRIES", "200000")),
+                )
+    return _cache
+
+def _lookup(provider: LLMProvider, chunks: List[str], task_type: str, dimensions: Optional[int]):
+    model = embedding_model_name(provider, dimensions)
+    hashes = [text_hash(chunk) for chunk in chunks]
+    vectors = get_embedding_cache().get_many(model, task_type, hashes)
+
+    missing: Dict[str, str] = {}
+    for h, chunk in zip(hashes, chunks):
+        if h not in vectors:
+            missing.setdefault(h, chunk)
+    return model, hashes, vectors, missing
+
+def _store(model: str, task_type: str, miss_hashes: List[str], embs: np.ndarray, dimensions: Optional[int],
+           vectors: Dict[str, np.ndarray]):
+    EMBEDDED_TEXTS.inc(len(miss_hashes), model=model, task_type=task_type)
+    new_vectors: Dict[str, np.ndarray] = dict(zip(miss_hashes, truncate(embs, dimensions)))
+    get_embedding_cache().put_many(model, task_type, new_vectors)
+    vectors.update(new_vectors)
+
+def _stack(hashes: List[str], vectors: Dict[str, np.ndarray]) -> np.ndarray:
+    if not hashes:
+        return np.zeros((0, 0), dtype=np.float32)
+    return np.vstack([vectors[h] for h in hashes])
+
+def embed_with_cache(provider: LLMProvider, chunks: List[str], task_type: str, desc: Optional[str] = None,
+                     dimensions: Optional[int] = None) -> np.ndarray:
+    """Embeddings of `chunks` as a float32 matrix, truncated to `dimensions` when given."""
+    model, hashes, vectors, missing = _lookup(provider, chunks, task_type, dimensions)
+    if missing:
+        miss_hashes = list(missing)
+        embs = embed_batches(provider, [missing[h] for h in miss_hashes], task_type=task_type, desc=desc, dimensions=dimensions)
+        _store(model, task_type, miss_hashes, embs, dimensions, vectors)
+
+    return _stack(hashes, vectors)
+
+async def aembed_with_cache(provider: LLMProvider, chunks: List[str], task_type: str, dimensions: Optional[int] = None) -> np.ndarray:
+    # The SQLite tier can wait up to busy_timeout on another worker's write lock, so cache reads
+    # and writes run in a worker thread rather than stalling the event loop.
+    model, hashes, vectors, missing = await asyncio.to_thread(_lookup, provider, chunks, task_type, dimensions)
+    if missing:
+        miss_hashes = list(missing)
+        embs = await aembed_batches(provider, [missing[h] for h in miss_hashes], task_type=task_type, dimensions=dimensions)
+        await asyncio.to_thread(_store, model, task_type, miss_hashes, embs, dimensions, vectors)
+
+    return _stack(hashes, vectors)
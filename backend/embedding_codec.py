@@ -0,0 +1,127 @@
+import os
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+# Per-collection embedding compression, recorded in the collection's metadata so every later
+# write and query uses the same settings as the vectors already stored.
+#
+# dimensions:   Matryoshka truncation. gemini-embedding-001 and text-embedding-3-* are trained so
+#               that a prefix of the vector is itself a usable embedding; providers are asked for
+#               the shorter vector directly and the result is re-normalized.
+# quantization: none   - float32
+#               int8   - one signed byte per dimension plus a float32 scale per vector
+#               binary - sign bits that pre-select candidates, re-ranked with the int8 vectors
+# Quantization is applied by the local vector store; Chroma Cloud stores float32 regardless and
+# only benefits from truncation.
+
+QUANTIZATIONS = ("none", "int8", "binary")
+DIMENSIONS_KEY = "embedding_dimensions"
+QUANTIZATION_KEY = "embedding_quantization"
+MODEL_KEY = "embedding_model"
+
+BINARY_RERANK_FACTOR = int(os.getenv("BINARY_RERANK_FACTOR", "10"))
+
+class EmbeddingCompression:
+    def __init__(self, dimensions: Optional[int] = None, quantization: str = "none"):
+        if dimensions is not None and int(dimensions) < 8:
+            raise ValueError(f"Embedding dimensions must be at least 8, got {dimensions}")
+        quantization = (quantization or "none").lower()
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unsupported embedding quantization: {quantization} (expected one of {', '.join(QUANTIZATIONS)})")
+        self.dimensions = int(dimensions) if dimensions else None
+        self.quantization = quantization
+
+    def metadata(self) -> Dict:
+        # Chroma metadata values must be scalars; 0 means "full dimensionality".
+        return {DIMENSIONS_KEY: self.dimensions or 0, QUANTIZATION_KEY: self.quantization}
+
+    @classmethod
+    def from_metadata(cls, metadata: Optional[Dict]) -> Optional["EmbeddingCompression"]:
+        """The compression recorded on a collection, or None if it predates compression settings."""
+        metadata = metadata or {}
+        if QUANTIZATION_KEY not in metadata:
+            return None
+        return cls(metadata.get(DIMENSIONS_KEY) or None, metadata[QUANTIZATION_KEY])
+
+    @classmethod
+    def parse(cls, dimensions: Optional[str], quantization: Optional[str]) -> Optional["EmbeddingCompression"]:
+        """Builds settings from request fields; None when neither was given."""
+        if not dimensions and not quantization:
+            return None
+        return cls(int(dimensions) if dimensions else None, quantization or "none")
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, EmbeddingCompression) and (self.dimensions, self.quantization) == (other.dimensions, other.quantization)
+
+    def __repr__(self) -> str:
+        return f"EmbeddingCompression(dimensions={self.dimensions}, quantization={self.quantization!r})"
+
+def default_compression() -> EmbeddingCompression:
+    """Settings for new collections, from EMBEDDING_DIMENSIONS and EMBEDDING_QUANTIZATION."""
+    dimensions = os.getenv("EMBEDDING_DIMENSIONS")
+    return EmbeddingCompression(int(dimensions) if dimensions else None, os.getenv("EMBEDDING_QUANTIZATION", "none"))
+
+def compression_metadata(metadata: Optional[Dict]) -> Dict:
+    """The embedding_* keys of a collection's metadata, for carrying them over to a copy."""
+    return {key: value for key, value in (metadata or {}).items() if key.startswith("embedding_")}
+
+def as_matrix(vectors) -> np.ndarray:
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1) if matrix.size else matrix.reshape(0, 0)
+    return matrix
+
+def normalize(vectors) -> np.ndarray:
+    matrix = as_matrix(vectors)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+def truncate(vectors, dimensions: Optional[int]) -> np.ndarray:
+    """Keeps the leading `dimensions` of each vector and re-normalizes (a no-op for shorter vectors)."""
+    matrix = as_matrix(vectors)
+    if not dimensions or matrix.shape[1] <= dimensions:
+        return matrix
+    return normalize(matrix[:, :dimensions])
+
+def quantize_int8(matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-vector scalar quantization: returns (int8 codes, float32 scales)."""
+    matrix = as_matrix(matrix)
+    scales = np.abs(matrix).max(axis=1) / 127.0 if matrix.size else np.zeros(len(matrix), dtype=np.float32)
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+def dequantize_int8(codes: np.ndarray, scales: np.ndarray) -> np.ndarray:
+    return codes.astype(np.float32) * scales[:, None]
+
+def int8_scores(codes: np.ndarray, scales: np.ndarray, query: np.ndarray) -> np.ndarray:
+    """Dot products of a float query with int8-coded vectors (asymmetric, the query is not quantized)."""
+    return (codes.astype(np.float32) @ query) * scales
+
+def pack_binary(matrix: np.ndarray) -> np.ndarray:
+    return np.packbits(as_matrix(matrix) > 0, axis=1)
+
+# Row v holds the 8 bits of byte value v, most significant first (np.packbits order).
+_BYTE_BITS = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).astype(np.float32)
+
+def binary_scores(bits: np.ndarray, query: np.ndarray) -> np.ndarray:
+    """Scores packed sign bits against a float query: the sum of the query over each vector's set bits.
+
+    Keeping the query in float (asymmetric) ranks far better than Hamming distance between sign
+    codes, and a per-byte lookup table makes it one gather per 8 dimensions.
+    """
+    n_bytes = bits.shape[1]
+    weights = np.zeros(n_bytes * 8, dtype=np.float32)
+    weights[:len(query)] = query
+    tables = _BYTE_BITS @ weights.reshape(n_bytes, 8).T
+    return tables[bits, np.arange(n_bytes)].sum(axis=1)
+
+def storage_bytes(dimensions: int, quantization: str) -> int:
+    """Bytes stored per vector."""
+    if quantization == "int8":
+        return dimensions + 4
+    if quantization == "binary":
+        return dimensions + 4 + -(-dimensions // 8)
+    return dimensions * 4
@@ -0,0 +1,221 @@
+import os
+import time
+import random
+import asyncio
+import weakref
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from jobs import checkpoint
+from llm_provider import LLMProvider
+
+EMBED_BATCH_SIZE = 100
+MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "5"))
+
+# (max concurrent requests, sustained requests per second) per embedding model.
+MODEL_LIMITS: Dict[str, Tuple[int, float]] = {
+    "gemini-embedding-001": (4, 5.0),
+    "text-embedding-3-small": (8, 50.0),
+}
+DEFAULT_LIMITS = (int(os.getenv("EMBED_CONCURRENCY", "4")), float(os.getenv("EMBED_RATE_PER_SEC", "10")))
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _take(self) -> float:
+        """Takes a token and returns 0, or returns how long to wait before trying again."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        while True:
+            wait = self._take()
+            if not wait:
+                return
+            time.sleep(wait)
+
+    async def aacquire(self):
+        while True:
+            wait = self._take()
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+class ModelLimiter:
+    """Rate bucket and concurrency cap of one embedding model, shared by the threaded and async paths.
+
+    Both paths hold slots of the same semaphore: threads block on it, coroutines take a slot without
+    blocking and otherwise wait for a wake-up on their own event loop, sent by every release.
+    """
+
+    def __init__(self, concurrency: int, rate: float):
+        self.concurrency = concurrency
+        self.semaphore = threading.BoundedSemaphore(concurrency)
+        self.bucket = TokenBucket(rate=rate, capacity=max(1.0, float(concurrency)))
+        self._loop_events: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Event]" = weakref.WeakKeyDictionary()
+        self._events_lock = threading.Lock()
+
+    def release(self):
+        self.semaphore.release()
+        with self._events_lock:
+            waiting = list(self._loop_events.items())
+        for loop, event in waiting:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # The loop has closed; nothing on it is waiting any more.
+                pass
+
+    async def aacquire(self):
+        loop = asyncio.get_running_loop()
+        with self._events_lock:
+            event = self._loop_events.get(loop)
+            if event is None:
+                event = self._loop_events[loop] = asyncio.Event()
+        while not self.semaphore.acquire(blocking=False):
+            event.clear()
+            # Re-check after clearing: a release in between has already scheduled the next set().
+            if self.semaphore.acquire(blocking=False):
+                return
+            await event.wait()
+
+    def __enter__(self):
+        self.semaphore.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    async def __aenter__(self):
+        await self.aacquire()
+        return self
+
+    async def __aexit__(self, *exc):
+        self.release()
+
+_limiters: Dict[str, ModelLimiter] = {}
+_limiters_lock = threading.Lock()
+_executor: Optional[ThreadPoolExecutor] = None
+
+def _get_limiter(model: str) -> ModelLimiter:
+    with _limiters_lock:
+        if model not in _limiters:
+            concurrency, rate = MODEL_LIMITS.get(model, DEFAULT_LIMITS)
+            _limiters[model] = ModelLimiter(concurrency, rate)
+        return _limiters[model]
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _limiters_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=int(os.getenv("EMBED_MAX_WORKERS", "16")), thread_name_prefix="embed"
+            )
+        return _executor
+
+def _status_code(exc: Exception) -> Optional[int]:
+    for candidate in (exc, getattr(exc, "response", None)):
+        for attr in ("status_code", "code"):
+            value = getattr(candidate, attr, None)
+            if isinstance(value, int):
+                return value
+    return None
+
+def is_retryable(exc: Exception) -> bool:
+    status = _status_code(exc)
+    if status is not None:
+        return status == 429 or status >= 500
+    text = str(exc).lower()
+    return "rate limit" in text or "resource exhausted" in text or "timeout" in text
+
+def _embed_one(provider: LLMProvider, limiter: ModelLimiter, batch: List[str], task_type: str,
+               dimensions: Optional[int]) -> np.ndarray:
+    for attempt in range(MAX_RETRIES + 1):
+        limiter.bucket.acquire()
+        with limiter:
+            try:
+                return np.asarray(provider.embed_content(batch, task_type, dimensions), dtype=np.float32)
+            except Exception as e:
+                if attempt == MAX_RETRIES or not is_retryable(e):
+                    raise
+                delay = min(30.0, 0.5 * 2 ** attempt) * (0.5 + random.random() / 2)
+                print(f"Embedding batch failed ({type(e).__name__}: {e}); retrying in {delay:.1f}s")
+        time.sleep(delay)
+
+def embed_batches(provider: LLMProvider, chunks: List[str], task_type: str, desc: Optional[str] = None,
+                  batch_size: int = EMBED_BATCH_SIZE, dimensions: Optional[int] = None) -> np.ndarray:
+    """Embeds chunks in batches with bounded concurrency and rate limiting, preserving input order."""
+    if not chunks:
+        return np.zeros((0, 0), dtype=np.float32)
+    if provider.embeds_locally:
+        return np.asarray(provider.embed_content(chunks, task_type, dimensions), dtype=np.float32)
+    limiter = _get_limiter(getattr(provider, "embedding_model", type(provider).__name__))
+    batches = [chunks[i:i+batch_size] for i in range(0, len(chunks), batch_size)]
+    if len(batches) == 1:
+        return _embed_one(provider, limiter, batches[0], task_type, dimensions)
+
+    results: List[Optional[np.ndarray]] = [None] * len(batches)
+    futures = {
+        _get_executor().submit(_embed_one, provider, limiter, batch, task_type, dimensions): i
+        for i, batch in enumerate(batches)
+    }
+    progress = None
+    if desc:
+        from tqdm import tqdm
+        progress = tqdm(total=len(batches), desc=desc)
+    try:
+        for done, future in enumerate(as_completed(futures), 1):
+            results[futures[future]] = future.result()
+            if progress:
+                progress.update(1)
+            # Stops a cancelled job here; batches not yet started are cancelled below.
+            checkpoint(stage="embed", embedded_batches=done, batches=len(batches))
+    except Exception:
+        for future in futures:
+            future.cancel()
+        raise
+    finally:
+        if progress:
+            progress.close()
+
+    return np.vstack(results)
+
+async def _aembed_one(provider: LLMProvider, limiter: ModelLimiter, batch: List[str], task_type: str,
+                      dimensions: Optional[int]) -> np.ndarray:
+    for attempt in range(MAX_RETRIES + 1):
+        await limiter.bucket.aacquire()
+        async with limiter:
+            try:
+                return np.asarray(await provider.aembed_content(batch, task_type, dimensions), dtype=np.float32)
+            except Exception as e:
+                if attempt == MAX_RETRIES or not is_retryable(e):
+                    raise
+                delay = min(30.0, 0.5 * 2 ** attempt) * (0.5 + random.random() / 2)
+                print(f"Embedding batch failed ({type(e).__name__}: {e}); retrying in {delay:.1f}s")
+        await asyncio.sleep(delay)
+
+async def aembed_batches(provider: LLMProvider, chunks: List[str], task_type: str,
+                         batch_size: int = EMBED_BATCH_SIZE, dimensions: Optional[int] = None) -> np.ndarray:
+    """Async embed_batches: same batching, limits and retries, without tying up threads."""
+    if not chunks:
+        return np.zeros((0, 0), dtype=np.float32)
+    if provider.embeds_locally:
+        return np.asarray(await provider.aembed_content(chunks, task_type, dimensions), dtype=np.float32)
+    limiter = _get_limiter(getattr(provider, "embedding_model", type(provider).__name__))
+    batches = [chunks[i:i+batch_size] for i in range(0, len(chunks), batch_size)]
+    results = await asyncio.gather(*(_aembed_one(provider, limiter, batch, task_type, dimensions) for batch in batches))
+    return np.vstack(results)
@@ -0,0 +1,432 @@
+import os
+import time
+import asyncio
+import hashlib
+import contextvars
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from llm_provider import LLMProvider, get_provider
+from metrics import counter
+
+FAILOVER_PROVIDERS = os.getenv("FAILOVER_PROVIDERS", "google,openai,groq")
+PROVIDER_TIMEOUT = float(os.getenv("PROVIDER_TIMEOUT", "30"))
+HEDGE_REQUESTS = os.getenv("HEDGE_REQUESTS", "true").lower() == "true"
+# Until a provider has HEDGE_MIN_SAMPLES latencies its p95 is unknown and HEDGE_DEFAULT_DELAY is used.
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+HEDGE_DEFAULT_DELAY = float(os.getenv("HEDGE_DEFAULT_DELAY", "5"))
+CIRCUIT_FAILURES = int(os.getenv("CIRCUIT_FAILURES", "5"))
+CIRCUIT_COOLDOWN = float(os.getenv("CIRCUIT_COOLDOWN", "30"))
+
+_KEY_ENV = {"google": "GOOGLE_API_KEY", "openai": "OPENAI_API_KEY", "groq": "GROQ_API_KEY"}
+
+FAILOVERS = counter("pa_provider_failovers_total", "Generations retried on another provider after a failure or open circuit.")
+HEDGES = counter("pa_provider_hedges_total", "Second providers asked because the first missed its p95 latency.")
+HEDGE_WINNERS = counter("pa_provider_hedge_winners_total", "Hedged generations, by the provider that answered first.")
+
+class ProvidersUnavailableError(RuntimeError):
+    pass
+
+class CircuitBreaker:
+    """Opens after `failures` consecutive failures; after `cooldown` seconds lets one trial call through (half-open)."""
+
+    CLOSED, HALF_OPEN, OPEN = 0, 1, 2
+
+    def __init__(self, failures: int = CIRCUIT_FAILURES, cooldown: float = CIRCUIT_COOLDOWN):
+        self.failures = failures
+        self.cooldown = cooldown
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_running = False
+        self.opens = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> int:
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self.trial_running:
+                self.trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.trial_running or self.consecutive_failures >= self.failures:
+                if self.opened_at is None or self.trial_running:
+                    self.opens += 1
+                self.opened_at = time.monotonic()
+            self.trial_running = False
+
+    def release(self):
+        """Ends a half-open trial that was abandoned (e.g. a cancelled hedge) without a verdict."""
+        with self._lock:
+            self.trial_running = False
+
+class LatencyTracker:
+    """Latencies of the last `window` successful generations."""
+
+    def __init__(self, window: int = 200):
+        self._samples: deque = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            if not self._samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+class _Member:
+    def __init__(self, name: str, provider: LLMProvider, breaker: CircuitBreaker, latency: LatencyTracker):
+        self.name = name
+        self.provider = provider
+        self.breaker = breaker
+        self.latency = latency
+
+    def hedge_delay(self) -> float:
+        if len(self.latency) < HEDGE_MIN_SAMPLES:
+            return HEDGE_DEFAULT_DELAY
+        return self.latency.percentile(0.95)
+
+# Health is shared by every FailoverProvider using the same provider and key, so one pooled
+# instance expiring does not reset what the process has learnt about a provider.
+_health: Dict[Tuple[str, str], Tuple[CircuitBreaker, LatencyTracker]] = {}
+_health_lock = threading.Lock()
+
+def _get_health(name: str, api_key: str) -> Tuple[CircuitBreaker, LatencyTracker]:
+    key = (name, hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:8])
+    with _health_lock:
+        if key not in _health:
+            _health[key] = (CircuitBreaker(), LatencyTracker())
+        return _health[key]
+
+def provider_health() -> Dict:
+    """Breaker state (0 closed, 1 half-open, 2 open) and latency percentiles per provider and key."""
+    with _health_lock:
+        entries = list(_health.items())
+    health = {}
+    for (name, fingerprint), (breaker, latency) in entries:
+        health[f"{name.replace(':', '_')}_{fingerprint}"] = {
+            "circuit_state": breaker.state,
+            "circuit_opens": breaker.opens,
+            "consecutive_failures": breaker.consecutive_failures,
+            "p50_seconds": latency.percentile(0.5) or 0.0,
+            "p95_seconds": latency.percentile(0.95) or 0.0,
+            "samples": len(latency),
+        }
+    return health
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=int(os.getenv("FAILOVER_THREADS", "32")), thread_name_prefix="failover")
+    return _executor
+
+class FailoverProvider(LLMProvider):
+    """Generates with the first healthy provider of a list, hedging slow calls and failing over on errors.
+
+    A generation goes to the first member whose circuit is closed. If it has not answered within
+    that member's p95 latency, the next member is asked as well and the first answer wins; if it
+    fails or times out, the next member takes over. Streams fail over only before their first piece.
+
+    Embeddings use the first member (whatever the state of its circuit). Collections that already
+    record an embedding model are queried through embedding_providers(), so the member order a
+    client asks for cannot change which model embeds for them.
+    """
+
+    def __init__(self, api_key: str, provider_names: List[str]):
+        super().__init__(api_key)
+        self.members: List[_Member] = []
+        for i, name in enumerate(provider_names):
+            # The request's key belongs to the primary; fallbacks use the server's own keys.
+            key = api_key if i == 0 else os.getenv(_KEY_ENV.get(name.rpartition(":")[2], ""), "")
+            if not key:
+                # A fallback must never quietly become the embedder in place of the requested primary.
+                if i == 0:
+                    raise ValueError(f"No API key for the primary failover provider {name}")
+                print(f"Failover: skipping {name}, no API key configured")
+                continue
+            try:
+                provider = get_provider(name, key)
+            except (ImportError, ValueError) as e:
+                if i == 0:
+                    raise
+                print(f"Failover: skipping {name}: {e}")
+                continue
+            self.members.append(_Member(name, provider, *_get_health(name, key)))
+        if not self.members:
+            raise ValueError("No usable providers for failover")
+        self.primary = self.members[0].provider
+
+    @property
+    def embedding_model(self) -> str:
+        return getattr(self.primary, "embedding_model", type(self.primary).__name__)
+
+    @property
+    def embeds_locally(self) -> bool:
+        return self.primary.embeds_locally
+
+    def embed_content(self, chunks: List[str], task_type: str, dimensions: Optional[int] = None) -> np.ndarray:
+        return self.primary.embed_content(chunks, task_type, dimensions)
+
+    async def aembed_content(self, chunks: List[str], task_type: str, dimensions: Optional[int] = None) -> np.ndarray:
+        return await self.primary.aembed_content(chunks, task_type, dimensions)
+
+    def count_tokens(self, text: str) -> int:
+        return self.primary.count_tokens(text)
+
+    @property
+    def generation_model(self) -> str:
+        return ",".join(member.provider.generation_model for member in self.members)
+
+    def embedding_providers(self) -> List[LLMProvider]:
+        return [member.provider for member in self.members]
+
+    def _next(self, remaining: List[_Member], hedge: bool = False) -> Optional[_Member]:
+        """Pops the next member whose circuit lets a call through."""
+        while remaining:
+            member = remaining.pop(0)
+            if member.breaker.allow():
+                if hedge:
+                    HEDGES.inc(provider=member.name)
+                elif member is not self.members[0]:
+                    FAILOVERS.inc(provider=member.name)
+                return member
+        return None
+
+    def _unavailable(self) -> ProvidersUnavailableError:
+        return ProvidersUnavailableError(f"No provider available (circuits open): {', '.join(m.name for m in self.members)}")
+
+    def _finish(self, member: _Member, started: float, error: Optional[BaseException], track_latency: bool = True):
+        elapsed = time.perf_counter() - started
+        if error is None and elapsed <= PROVIDER_TIMEOUT:
+            member.breaker.record_success()
+            if track_latency:
+                member.latency.observe(elapsed)
+            return
+        member.breaker.record_failure()
+        if error is None:
+            print(f"Failover: {member.name} answered after {elapsed:.2f}s, past the {PROVIDER_TIMEOUT:.0f}s timeout")
+        else:
+            print(f"Failover: {member.name} failed after {elapsed:.2f}s: {type(error).__name__}: {error}")
+
+    def _attempt(self, member: _Member, call: Callable[[LLMProvider], Any], track_latency: bool) -> Any:
+        started = time.perf_counter()
+        try:
+            result = call(member.provider)
+        except Exception as e:
+            self._finish(member, started, e)
+            raise
+        # A call that outlived PROVIDER_TIMEOUT was already abandoned and counts as a failure.
+        self._finish(member, started, None, track_latency)
+        return result
+
+    def generate_content(self, prompt: str, system_prompt: Optional[str] = None) -> str:
+        return self._call(lambda provider: provider.generate_content(prompt, system_prompt=system_prompt))
+
+    def generate_json(self, prompt: str, schema: Dict, system_prompt: Optional[str] = None) -> Dict:
+        # Structured parses run much longer than chat answers, so they fail over but are neither
+        # hedged on nor counted in the chat latency percentiles.
+        return self._call(lambda provider: provider.generate_json(prompt, schema, system_prompt=system_prompt), latency_sensitive=False)
+
+    def _call(self, call: Callable[[LLMProvider], Any], latency_sensitive: bool = True) -> Any:
+        hedging = latency_sensitive and HEDGE_REQUESTS
+        remaining = list(self.members)
+        pending: Dict[Future, Tuple[_Member, float]] = {}
+        hedged = False
+        last_error: Optional[BaseException] = None
+
+        def launch(hedge: bool = False) -> bool:
+            member = self._next(remaining, hedge)
+            if member is None:
+                return False
+            # copy_context keeps the member's provider timings in this request's trace.
+            future = _get_executor().submit(contextvars.copy_context().run, self._attempt, member, call, latency_sensitive)
+            pending[future] = (member, time.monotonic())
+            return True
+
+        if not launch():
+            raise self._unavailable()
+        while pending:
+            wake = min(launched for _, launched in pending.values()) + PROVIDER_TIMEOUT
+            if hedging and not hedged and remaining and len(pending) == 1:
+                member, launched = next(iter(pending.values()))
+                wake = min(wake, launched + member.hedge_delay())
+            done, _ = wait(pending, timeout=max(0.0, wake - time.monotonic()), return_when=FIRST_COMPLETED)
+
+            for future in done:
+                member, _ = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    last_error = e
+                    continue
+                if hedged:
+                    HEDGE_WINNERS.inc(provider=member.name)
+                return result
+
+            now = time.monotonic()
+            for future, (member, launched) in list(pending.items()):
+                if now - launched >= PROVIDER_TIMEOUT:
+                    del pending[future]
+                    last_error = TimeoutError(f"{member.name} did not answer within {PROVIDER_TIMEOUT:.0f}s")
+            if not pending:
+                launch()
+            elif not done and hedging and not hedged and remaining:
+                hedged = launch(hedge=True)
+        raise last_error or self._unavailable()
+
+    async def _aattempt(self, member: _Member, prompt: str, system_prompt: Optional[str]) -> str:
+        started = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(member.provider.agenerate_content(prompt, system_prompt=system_prompt), PROVIDER_TIMEOUT)
+        except asyncio.CancelledError:
+            # The other side of a hedge answered first; this call says nothing about the provider.
+            member.breaker.release()
+            raise
+        except Exception as e:
+            self._finish(member, started, e)
+            raise
+        self._finish(member, started, None)
+        return result
+
+    async def agenerate_content(self, prompt: str, system_prompt: Optional[str] = None) -> str:
+        remaining = list(self.members)
+        pending: Dict[asyncio.Task, Tuple[_Member, float]] = {}
+        hedged = False
+        last_error: Optional[BaseException] = None
+
+        def launch(hedge: bool = False) -> bool:
+            member = self._next(remaining, hedge)
+            if member is None:
+                return False
+            pending[asyncio.ensure_future(self._aattempt(member, prompt, system_prompt))] = (member, time.monotonic())
+            return True
+
+        if not launch():
+            raise self._unavailable()
+        try:
+            while pending:
+                timeout = None
+                if HEDGE_REQUESTS and not hedged and remaining and len(pending) == 1:
+                    member, launched = next(iter(pending.values()))
+                    timeout = max(0.0, launched + member.hedge_delay() - time.monotonic())
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                for task in done:
+                    member, _ = pending.pop(task)
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        last_error = e
+                        continue
+                    if hedged:
+                        HEDGE_WINNERS.inc(provider=member.name)
+                    return result
+
+                if not pending:
+                    launch()
+                elif not done:
+                    hedged = launch(hedge=True)
+        finally:
+            for task in pending:
+                task.cancel()
+        raise last_error or self._unavailable()
+
+    def stream_content(self, prompt: str, system_prompt: Optional[str] = None) -> Iterator[str]:
+        remaining = list(self.members)
+        last_error: Optional[BaseException] = None
+        while True:
+            member = self._next(remaining)
+            if member is None:
+                raise last_error or self._unavailable()
+            started = time.perf_counter()
+            pieces = member.provider.stream_content(prompt, system_prompt=system_prompt)
+            try:
+                first = next(pieces, None)
+            except Exception as e:
+                self._finish(member, started, e, track_latency=False)
+                last_error = e
+                continue
+            self._finish(member, started, None, track_latency=False)
+            break
+
+        # Once text has reached the client the answer cannot move to another provider.
+        try:
+            if first is not None:
+                yield first
+            yield from pieces
+        except Exception:
+            member.breaker.record_failure()
+            raise
+
+    async def astream_content(self, prompt: str, system_prompt: Optional[str] = None) -> AsyncIterator[str]:
+        remaining = list(self.members)
+        last_error: Optional[BaseException] = None
+        while True:
+            member = self._next(remaining)
+            if member is None:
+                raise last_error or self._unavailable()
+            started = time.perf_counter()
+            pieces = member.provider.astream_content(prompt, system_prompt=system_prompt)
+            try:
+                first = await asyncio.wait_for(pieces.__anext__(), PROVIDER_TIMEOUT)
+            except StopAsyncIteration:
+                first = None
+            except asyncio.CancelledError:
+                member.breaker.release()
+                raise
+            except Exception as e:
+                await pieces.aclose()
+                self._finish(member, started, e, track_latency=False)
+                last_error = e
+                continue
+            self._finish(member, started, None, track_latency=False)
+            break
+
+        try:
+            if first is not None:
+                yield first
+            async for piece in pieces:
+                yield piece
+        except Exception:
+            member.breaker.record_failure()
+            raise
+
+def failover_provider_names(provider_name: str) -> List[str]:
+    """"failover" uses FAILOVER_PROVIDERS; "failover:google,openai" lists the order explicitly."""
+    names = provider_name.partition(":")[2] or FAILOVER_PROVIDERS
+    return [name.strip().lower() for name in names.split(",") if name.strip()]
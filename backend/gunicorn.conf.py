@@ -0,0 +1,19 @@
+import os
+
+# Cloud Run passes the port in PORT and starts an instance per cold start, so keep start-up cheap:
+# the app module imports only what the first request needs and warm_up() loads the rest in the
+# background once the worker is serving.
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8080')}"
+workers = int(os.getenv("GUNICORN_WORKERS", "1"))
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+# Importing the app in the master is only worth it with several workers (they share the imported pages).
+preload_app = os.getenv("GUNICORN_PRELOAD", "false").lower() == "true"
+
+def post_worker_init(worker):
+    from collection_registry import start_sweeper
+    from warmup import warm_up
+
+    warm_up()
+    start_sweeper()
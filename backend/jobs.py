@@ -0,0 +1,174 @@
+import os
+import json
+import time
+import uuid
+import threading
+import traceback
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from db import get_connection
+
+ACTIVE_STATUSES = ("queued", "running")
+
+_current = threading.local()
+
+def report_progress(**progress) -> bool:
+    """Records progress for the job running on this thread (which also counts as a heartbeat
+    against the timeout). Returns False once cancellation has been requested."""
+    job = getattr(_current, "job", None)
+    if job is None:
+        return True
+    queue, job_id = job
+    queue._update(job_id, progress=json.dumps(progress))
+    row = get_connection(queue.path).execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return not (row and row[0])
+
+class JobCancelled(Exception):
+    """Raised at a checkpoint once the running job has been cancelled."""
+
+def checkpoint(**progress):
+    """report_progress for pipeline stages: raises JobCancelled instead of returning False, so
+    the remaining provider and vector store calls are skipped. A no-op outside a job."""
+    if not report_progress(**progress):
+        raise JobCancelled()
+
+class JobQueue:
+    """Background worker pool whose job states and results live in SQLite so any web worker can report them."""
+
+    def __init__(self, path: str, max_workers: int, timeout: float):
+        self.path = path
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._futures: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        conn = get_connection(self.path)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, kind TEXT NOT NULL, idempotency_key TEXT, status TEXT NOT NULL, "
+            "result TEXT, error TEXT, cancel_requested INTEGER NOT NULL DEFAULT 0, "
+            "created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_idempotency ON jobs (kind, idempotency_key)")
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+        if "progress" not in columns:
+            conn.execute("ALTER TABLE jobs ADD COLUMN progress TEXT")
+
+    def _update(self, job_id: str, **fields):
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        get_connection(self.path).execute(
+            f"UPDATE jobs SET {assignments} WHERE id = ?", [*fields.values(), job_id]
+        )
+
+    def submit(self, kind: str, idempotency_key: Optional[str], fn: Callable[..., Any], *args) -> Dict:
+        conn = get_connection(self.path)
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            if idempotency_key:
+                row = conn.execute(
+                    "SELECT id FROM jobs WHERE kind = ? AND idempotency_key = ? "
+                    "AND status IN ('queued', 'running', 'succeeded') AND updated_at >= ? "
+                    "ORDER BY created_at DESC LIMIT 1",
+                    (kind, idempotency_key, now - self.timeout),
+                ).fetchone()
+                if row:
+                    return self.status(row[0])
+            conn.execute(
+                "INSERT INTO jobs (id, kind, idempotency_key, status, created_at, updated_at) VALUES (?, ?, ?, 'queued', ?, ?)",
+                (job_id, kind, idempotency_key, now, now),
+            )
+
+        future = self._executor.submit(self._run, job_id, fn, *args)
+        with self._lock:
+            self._futures[job_id] = future
+        future.add_done_callback(lambda _: self._forget(job_id))
+        return self.status(job_id)
+
+    def _forget(self, job_id: str):
+        with self._lock:
+            self._futures.pop(job_id, None)
+
+    def _run(self, job_id: str, fn: Callable[..., Any], *args):
+        row = get_connection(self.path).execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row and row[0]:
+            self._update(job_id, status="cancelled")
+            return
+        self._update(job_id, status="running")
+        _current.job = (self, job_id)
+        try:
+            result = fn(*args)
+        except JobCancelled:
+            print(f"Job {job_id} stopped after cancellation")
+            self._update(job_id, status="cancelled")
+            return
+        except Exception as e:
+            print(f"Job {job_id} failed: {type(e).__name__}: {e}")
+            traceback.print_exc()
+            self._update(job_id, status="failed", error=json.dumps({"error": str(e), "error_type": type(e).__name__}))
+            return
+        finally:
+            _current.job = None
+        row = get_connection(self.path).execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row and row[0]:
+            self._update(job_id, status="cancelled")
+        else:
+            self._update(job_id, status="succeeded", result=json.dumps(result))
+
+    def cancel(self, job_id: str) -> Optional[Dict]:
+        job = self.status(job_id)
+        if job is None or job["status"] not in ACTIVE_STATUSES:
+            return job
+        self._update(job_id, cancel_requested=1)
+        with self._lock:
+            future = self._futures.get(job_id)
+        if future is not None and future.cancel():
+            self._update(job_id, status="cancelled")
+        return self.status(job_id)
+
+    def status(self, job_id: str) -> Optional[Dict]:
+        row = get_connection(self.path).execute(
+            "SELECT id, kind, status, error, cancel_requested, created_at, updated_at, progress FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        job_id, kind, status, error, cancel_requested, created_at, updated_at, progress = row
+        if status in ACTIVE_STATUSES and time.time() - updated_at > self.timeout:
+            # The worker process that owned the job died or the job hung past its deadline.
+            status = "failed"
+            error = json.dumps({"error": "Job timed out or its worker exited", "error_type": "JobTimeout"})
+            self._update(job_id, status=status, error=error)
+        job = {
+            "job_id": job_id,
+            "kind": kind,
+            "status": status,
+            "cancel_requested": bool(cancel_requested),
+            "created_at": created_at,
+            "updated_at": updated_at,
+        }
+        if progress:
+            job["progress"] = json.loads(progress)
+        if error:
+            job.update(json.loads(error))
+        return job
+
+    def result(self, job_id: str) -> Any:
+        row = get_connection(self.path).execute("SELECT result FROM jobs WHERE id = ? AND status = 'succeeded'", (job_id,)).fetchone()
+        return json.loads(row[0]) if row and row[0] is not None else None
+
+_queue: Optional[JobQueue] = None
+_queue_lock = threading.Lock()
+
+def get_job_queue() -> JobQueue:
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = JobQueue(
+                    path=os.getenv("JOB_DB_PATH", "/tmp/pa_jobs.db"),
+                    max_workers=int(os.getenv("JOB_WORKERS", "2")),
+                    timeout=float(os.getenv("JOB_TIMEOUT", "900")),
+                )
+    return _queue
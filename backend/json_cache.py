@@ -0,0 +1,92 @@
+import os
+import json
+import time
+import threading
+from typing import Any, Dict, Optional
+
+from db import get_connection
+
+class JSONCache:
+    """Bounded SQLite cache of JSON values with TTL expiry and LRU eviction, safe to share between worker processes."""
+
+    def __init__(self, path: str, table: str, max_entries: int, ttl: float):
+        self.path = path
+        self.table = table
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._last_prune = 0.0
+        self.hits = 0
+        self.misses = 0
+        get_connection(self.path).execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table} ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        get_connection(self.path).execute(
+            f"CREATE INDEX IF NOT EXISTS idx_{self.table}_last_used ON {self.table} (last_used)"
+        )
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        conn = get_connection(self.path)
+        row = conn.execute(
+            f"SELECT value FROM {self.table} WHERE key = ? AND created_at >= ?", (key, now - self.ttl)
+        ).fetchone()
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        conn.execute(f"UPDATE {self.table} SET last_used = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any):
+        now = time.time()
+        get_connection(self.path).execute(
+            f"INSERT OR REPLACE INTO {self.table} (key, value, created_at, last_used) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(value), now, now),
+        )
+        if now - self._last_prune > 60:
+            self._last_prune = now
+            self.prune()
+
+    def delete(self, key: str):
+        get_connection(self.path).execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def prune(self):
+        conn = get_connection(self.path)
+        conn.execute(f"DELETE FROM {self.table} WHERE created_at < ?", (time.time() - self.ttl,))
+        (count,) = conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()
+        if count > self.max_entries:
+            conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN (SELECT key FROM {self.table} ORDER BY last_used ASC LIMIT ?)",
+                (count - self.max_entries,),
+            )
+
+    def stats(self) -> Dict:
+        (count,) = get_connection(self.path).execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": count,
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+_caches: Dict[str, JSONCache] = {}
+_caches_lock = threading.Lock()
+
+def get_json_cache(name: str, max_entries: int = 1000, ttl: float = 7 * 24 * 3600) -> JSONCache:
+    """Returns the process-wide cache `name`, sized by <NAME>_CACHE_MAX_ENTRIES / <NAME>_CACHE_TTL when set."""
+    with _caches_lock:
+        if name not in _caches:
+            prefix = name.upper()
+            _caches[name] = JSONCache(
+                path=os.getenv("JSON_CACHE_PATH", "/tmp/pa_cache.db"),
+                table=f"{name}_cache",
+                max_entries=int(os.getenv(f"{prefix}_CACHE_MAX_ENTRIES", str(max_entries))),
+                ttl=float(os.getenv(f"{prefix}_CACHE_TTL", str(ttl))),
+            )
+        return _caches[name]
@@ -0,0 +1,124 @@
+import re
+import math
+import threading
+from collections import Counter, OrderedDict, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from vector_store import matches_where
+
+_TOKEN = re.compile(r"[a-z0-9][a-z0-9+#]*(?:\.[a-z0-9]+)*")
+
+STOPWORDS = frozenset("""
+a an and are as at be been but by can could did do does for from had has have he her his how i if in into is
+it its know knows me my of on or our she should so tell than that the their them then there these they this
+to was we were what when where which who whom why will with would you your about any experience worked work
+""".split())
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(text.lower())
+
+def content_terms(text: str) -> List[str]:
+    return [t for t in dict.fromkeys(tokenize(text)) if t not in STOPWORDS]
+
+class BM25Index:
+    """Incrementally maintained Okapi BM25 inverted index over one collection's chunks."""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self.lengths: Dict[str, int] = {}
+        self.documents: Dict[str, str] = {}
+        self.metadatas: Dict[str, Optional[Dict]] = {}
+        self.total_length = 0
+        self._lock = threading.Lock()
+
+    def add(self, ids: List[str], documents: List[str], metadatas: Optional[List[Optional[Dict]]] = None):
+        metadatas = metadatas or [None] * len(ids)
+        with self._lock:
+            for id_, document, metadata in zip(ids, documents, metadatas):
+                self._remove(id_)
+                terms = Counter(tokenize(document or ""))
+                for term, freq in terms.items():
+                    self.postings[term][id_] = freq
+                length = sum(terms.values())
+                self.lengths[id_] = length
+                self.total_length += length
+                self.documents[id_] = document
+                self.metadatas[id_] = metadata
+
+    def remove(self, ids: List[str]):
+        with self._lock:
+            for id_ in ids:
+                self._remove(id_)
+
+    def _remove(self, id_: str):
+        if id_ not in self.lengths:
+            return
+        for term in set(tokenize(self.documents[id_] or "")):
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(id_, None)
+                if not postings:
+                    del self.postings[term]
+        self.total_length -= self.lengths.pop(id_)
+        self.documents.pop(id_, None)
+        self.metadatas.pop(id_, None)
+
+    def search(self, query: str, k: int, where: Optional[Dict] = None) -> List[Tuple[str, float, int]]:
+        """Returns up to k (id, score, matched content terms) tuples, best first."""
+        terms = content_terms(query)
+        with self._lock:
+            n_docs = len(self.lengths)
+            if not n_docs or not terms:
+                return []
+            avg_length = self.total_length / n_docs
+            scores: Dict[str, float] = defaultdict(float)
+            matched: Dict[str, int] = defaultdict(int)
+            for term in terms:
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for id_, freq in postings.items():
+                    if where and not matches_where(self.metadatas.get(id_), where):
+                        continue
+                    norm = freq + self.k1 * (1 - self.b + self.b * self.lengths[id_] / avg_length)
+                    scores[id_] += idf * freq * (self.k1 + 1) / norm
+                    matched[id_] += 1
+            ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+            return [(id_, score, matched[id_]) for id_, score in ranked]
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+_indexes: "OrderedDict[str, Tuple[BM25Index, float]]" = OrderedDict()
+_indexes_lock = threading.Lock()
+MAX_INDEXES = 512
+
+def get_lexical_index(collection, version: float) -> BM25Index:
+    """Returns the collection's BM25 index, rebuilding it when `version` shows another worker changed the collection."""
+    with _indexes_lock:
+        entry = _indexes.get(collection.name)
+        if entry is not None and entry[1] == version:
+            _indexes.move_to_end(collection.name)
+            return entry[0]
+
+    index = BM25Index()
+    data = collection.get(include=["documents", "metadatas"])
+    if data and data['ids']:
+        index.add(data['ids'], data['documents'], data['metadatas'])
+    set_lexical_index(collection.name, index, version)
+    return index
+
+def set_lexical_index(collection_name: str, index: BM25Index, version: float):
+    with _indexes_lock:
+        _indexes[collection_name] = (index, version)
+        _indexes.move_to_end(collection_name)
+        while len(_indexes) > MAX_INDEXES:
+            _indexes.popitem(last=False)
+
+def cached_lexical_index(collection_name: str) -> Optional[Tuple[BM25Index, float]]:
+    """Returns the (index, version) currently held for a collection, if any."""
+    with _indexes_lock:
+        return _indexes.get(collection_name)
@@ -1,111 +1,551 @@
 from abc import ABC, abstractmethod
-from typing import List
+from typing import AsyncIterator, Dict, Iterator, List, Optional
 import os
+import re
+import json
+import base64
+import asyncio
+import time
+import hashlib
+import datetime
+import importlib
+import threading
+import numpy as np
 from dotenv import load_dotenv
 
-try:
-    import google.generativeai as genai
-except ImportError:
-    genai = None
+from metrics import instrument_provider_method
 
-try:
-    from openai import OpenAI
-except ImportError:
-    OpenAI = None
+load_dotenv()
 
-try:
-    from groq import Groq
-except ImportError:
-    Groq = None
+def _import_sdk(module: str, package: str):
+    # Provider SDKs are imported when a provider is first constructed, so a worker only pays
+    # the (large) import cost of the providers it actually serves.
+    try:
+        return importlib.import_module(module)
+    except ImportError:
+        raise ImportError(f"{package} is not installed. Please run 'pip install {package}'") from None
 
-load_dotenv()
+_INSTRUMENTED_METHODS = ("generate_content", "stream_content", "generate_json", "embed_content",
+                         "agenerate_content", "astream_content", "aembed_content")
+
+def parse_json_response(text: str) -> Dict:
+    """Decodes a model's JSON answer, tolerating markdown fences or prose around the object."""
+    text = (text or "").strip()
+    try:
+        value = json.loads(text)
+    except json.JSONDecodeError:
+        start, end = text.find("{"), text.rfind("}")
+        if start == -1 or end <= start:
+            raise ValueError(f"No JSON object in the model response: {text[:200]!r}")
+        value = json.loads(text[start:end + 1])
+    if not isinstance(value, dict):
+        raise ValueError(f"Expected a JSON object, got {type(value).__name__}")
+    return value
+
+def _json_prompt(prompt: str, schema: Dict) -> str:
+    return f"{prompt}\n\nRespond with only a JSON object matching this JSON schema:\n{json.dumps(schema)}"
+
+def _strict_schema(schema: Dict) -> Dict:
+    # OpenAI's strict mode wants every property listed as required, no additional properties,
+    # and nullability spelled as a type union.
+    strict = {key: value for key, value in schema.items() if key != "nullable"}
+    if schema.get("nullable"):
+        strict["type"] = [schema["type"], "null"]
+    if "properties" in schema:
+        strict["properties"] = {name: _strict_schema(value) for name, value in schema["properties"].items()}
+        strict["required"] = list(schema["properties"])
+        strict["additionalProperties"] = False
+    if "items" in schema:
+        strict["items"] = _strict_schema(schema["items"])
+    return strict
 
 class LLMProvider(ABC):
+    # Local embedders batch internally and skip the remote rate limits in embedding_scheduler.
+    embeds_locally = False
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # Each provider's own implementations are timed into pa_provider_seconds and the request trace.
+        for method in _INSTRUMENTED_METHODS:
+            if method in cls.__dict__:
+                setattr(cls, method, instrument_provider_method(method, cls.__dict__[method]))
+
     def __init__(self, api_key: str):
         if not api_key:
             raise ValueError("API key is required for the LLM provider.")
         self.api_key = api_key
 
     @abstractmethod
-    def generate_content(self, prompt: str) -> str:
-        """Generates a text response from a given prompt."""
+    def generate_content(self, prompt: str, system_prompt: Optional[str] = None) -> str:
+        """Generates a text response from a given prompt, with an optional static system prompt."""
         pass
 
+    def stream_content(self, prompt: str, system_prompt: Optional[str] = None) -> Iterator[str]:
+        """Yields the response to a prompt piece by piece as the model produces it."""
+        yield self.generate_content(prompt, system_prompt=system_prompt)
+
+    def generate_json(self, prompt: str, schema: Dict, system_prompt: Optional[str] = None) -> Dict:
+        """Generates a JSON object matching `schema`, written in the OpenAPI subset of JSON Schema that
+        Gemini accepts (`nullable` instead of type unions). The default puts the schema in the prompt;
+        providers with a native structured-output mode use that instead."""
+        return parse_json_response(self.generate_content(_json_prompt(prompt, schema), system_prompt=system_prompt))
+
+    def count_tokens(self, text: str) -> int:
+        """Counts prompt tokens locally; the default is a ~4 characters per token estimate."""
+        return len(text) // 4 + 1
+
+    @property
+    def generation_model(self) -> str:
+        """The model that writes answers; part of the response cache scope."""
+        return getattr(self, "llm_model_name", None) or str(getattr(self, "llm_model", type(self).__name__))
+
+    def embedding_providers(self) -> List["LLMProvider"]:
+        """Providers able to embed on this one's behalf, preferred first; Rag picks the one whose
+        embedding model matches a collection's vectors."""
+        return [self]
+
     @abstractmethod
-    def embed_content(self, chunks: List[str], task_type: str) -> List[List[float]]:
-        """Creates embeddings for a list of text chunks."""
+    def embed_content(self, chunks: List[str], task_type: str, dimensions: Optional[int] = None) -> np.ndarray:
+        """Creates embeddings for a list of text chunks as a float32 (len(chunks), dim) array.
+
+        With `dimensions`, models that support shortened (Matryoshka) embeddings return only that
+        many; the caller truncates and re-normalizes whatever comes back longer.
+        """
         pass
 
+    # Async variants for the ASGI app. The defaults run the blocking call in a worker
+    # thread; providers with an async SDK client override them.
+    async def agenerate_content(self, prompt: str, system_prompt: Optional[str] = None) -> str:
+        return await asyncio.to_thread(self.generate_content, prompt, system_prompt)
+
+    async def astream_content(self, prompt: str, system_prompt: Optional[str] = None) -> AsyncIterator[str]:
+        yield await self.agenerate_content(prompt, system_prompt=system_prompt)
+
+    async def aembed_content(self, chunks: List[str], task_type: str, dimensions: Optional[int] = None) -> np.ndarray:
+        return await asyncio.to_thread(self.embed_content, chunks, task_type, dimensions)
+
 class GoogleProvider(LLMProvider):
     def __init__(self, api_key: str):
         super().__init__(api_key)
-        if not genai:
-            raise ImportError("google-generativeai is not installed. Please run 'pip install google-generativeai'")
-        genai.configure(api_key=self.api_key)
-        self.llm_model = genai.GenerativeModel("models/gemini-2.0-flash-lite")
+        self.genai = _import_sdk("google.generativeai", "google-generativeai")
+        # genai.configure() sets one key for the whole process, and the pool keeps providers for
+        # several keys alive at once, so each provider talks through clients of its own key.
+        self.glm = _import_sdk("google.ai.generativelanguage", "google-generativeai")
+        self._client_options = {"api_key": self.api_key}
+        self._client = self.glm.GenerativeServiceClient(client_options=self._client_options)
+        self._async_client = None
+        self.llm_model_name = "models/gemini-2.0-flash-lite"
+        self.llm_model = self._model(self.llm_model_name)
+        self.json_model_name = os.getenv("GEMINI_JSON_MODEL", "models/gemini-2.0-flash")
+        self._system_models: Dict[str, tuple] = {}
         self.embedding_model = "gemini-embedding-001"
 
-    def generate_content(self, prompt: str) -> str:
-        response = self.llm_model.generate_content(prompt)
+    def _get_async_client(self):
+        # Created on first async use, inside the event loop its channel belongs to.
+        if self._async_client is None:
+            self._async_client = self.glm.GenerativeServiceAsyncClient(client_options=self._client_options)
+        return self._async_client
+
+    def _model(self, model_name: str, **kwargs):
+        model = self.genai.GenerativeModel(model_name, **kwargs)
+        # GenerativeModel only falls back to the process-wide default client when this is unset.
+        model._client = self._client
+        return model
+
+    def _async_model_for(self, system_prompt: Optional[str]):
+        model = self._model_for(system_prompt)
+        model._async_client = self._get_async_client()
+        return model
+
+    def _model_for(self, system_prompt: Optional[str]):
+        if not system_prompt:
+            return self.llm_model
+        entry = self._system_models.get(system_prompt)
+        if entry is None or entry[1] <= time.time():
+            cache_ttl = int(os.getenv("GEMINI_CACHE_TTL", "3600"))
+            model = self._cached_model(system_prompt, cache_ttl)
+            if model is not None:
+                entry = (model, time.time() + cache_ttl - 60)
+            else:
+                entry = (self._model(self.llm_model_name, system_instruction=system_prompt), float("inf"))
+            self._system_models[system_prompt] = entry
+        return entry[0]
+
+    def _cached_model(self, system_prompt: str, ttl: int):
+        # Explicit context caching has a per-model minimum size and isn't offered for every
+        # model, so it is opt-in and quietly falls back to a plain system instruction.
+        if os.getenv("GEMINI_CONTEXT_CACHE", "false").lower() != "true":
+            return None
+        try:
+            # CachedContent.create() only uses the default client, so the request goes through a
+            # cache client of this provider's key instead.
+            protos = self.genai.protos
+            cached = self.glm.CacheServiceClient(client_options=self._client_options).create_cached_content(
+                protos.CreateCachedContentRequest(cached_content=protos.CachedContent(
+                    model=os.getenv("GEMINI_CACHE_MODEL", self.llm_model_name),
+                    system_instruction=protos.Content(parts=[protos.Part(text=system_prompt)]),
+                    ttl=datetime.timedelta(seconds=ttl),
+                ))
+            )
+            model = self._model(cached.model)
+            model._cached_content = cached.name
+            return model
+        except Exception as e:
+            print(f"Gemini context cache unavailable, using system instruction: {e}")
+            return None
+
+    def generate_content(self, prompt: str, system_prompt: Optional[str] = None) -> str:
+        response = self._model_for(system_prompt).generate_content(prompt)
         return response.text
 
-    def embed_content(self, chunks: List[str], task_type: str) -> List[List[float]]:
-        response = genai.embed_content(
+    def stream_content(self, prompt: str, system_prompt: Optional[str] = None) -> Iterator[str]:
+        for chunk in self._model_for(system_prompt).generate_content(prompt, stream=True):
+            if chunk.parts:
+                yield chunk.text
+
+    def generate_json(self, prompt: str, schema: Dict, system_prompt: Optional[str] = None) -> Dict:
+        model = self._model(self.json_model_name, system_instruction=system_prompt)
+        response = model.generate_content(
+            prompt,
+            generation_config={"response_mime_type": "application/json", "response_schema": schema}
+        )
+        return parse_json_response(response.text)
+
+    def embed_content(self, chunks: List[str], task_type: str, dimensions: Optional[int] = None) -> np.ndarray:
+        response = self.genai.embed_content(
             model=self.embedding_model,
             content=chunks,
-            task_type=task_type
+            task_type=task_type,
+            output_dimensionality=dimensions,
+            client=self._client
         )
-        return response['embedding']
+        return np.asarray(response['embedding'], dtype=np.float32)
+
+    async def agenerate_content(self, prompt: str, system_prompt: Optional[str] = None) -> str:
+        response = await self._async_model_for(system_prompt).generate_content_async(prompt)
+        return response.text
+
+    async def astream_content(self, prompt: str, system_prompt: Optional[str] = None) -> AsyncIterator[str]:
+        async for chunk in await self._async_model_for(system_prompt).generate_content_async(prompt, stream=True):
+            if chunk.parts:
+                yield chunk.text
+
+    async def aembed_content(self, chunks: List[str], task_type: str, dimensions: Optional[int] = None) -> np.ndarray:
+        response = await self.genai.embed_content_async(
+            model=self.embedding_model,
+            content=chunks,
+            task_type=task_type,
+            output_dimensionality=dimensions,
+            client=self._get_async_client()
+        )
+        return np.asarray(response['embedding'], dtype=np.float32)
 
 class OpenAIProvider(LLMProvider):
     def __init__(self, api_key: str):
         super().__init__(api_key)
-        if not OpenAI:
-            raise ImportError("openai is not installed. Please run 'pip install openai'")
-        self.client = OpenAI(api_key=self.api_key)
+        self.sdk = _import_sdk("openai", "openai")
+        self.client = self.sdk.OpenAI(api_key=self.api_key)
+        self._async_client = None
         self.llm_model = "gpt-4o"
         self.embedding_model = "text-embedding-3-small"
+        self._encoding = None
+
+    def count_tokens(self, text: str) -> int:
+        if self._encoding is None:
+            # tiktoken is optional and loads its BPE tables on first use; False marks "unavailable".
+            try:
+                self._encoding = importlib.import_module("tiktoken").encoding_for_model(self.llm_model)
+            except Exception:
+                self._encoding = False
+        if not self._encoding:
+            return super().count_tokens(text)
+        return len(self._encoding.encode(text, disallowed_special=()))
 
-    def generate_content(self, prompt: str) -> str:
+    def generate_content(self, prompt: str, system_prompt: Optional[str] = None) -> str:
         response = self.client.chat.completions.create(
             model=self.llm_model,
-            messages=[{"role": "user", "content": prompt}]
+            messages=_chat_messages(prompt, system_prompt)
         )
         return response.choices[0].message.content or ""
 
-    def embed_content(self, chunks: List[str], task_type: str) -> List[List[float]]:
+    def stream_content(self, prompt: str, system_prompt: Optional[str] = None) -> Iterator[str]:
+        stream = self.client.chat.completions.create(
+            model=self.llm_model,
+            messages=_chat_messages(prompt, system_prompt),
+            stream=True
+        )
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    def generate_json(self, prompt: str, schema: Dict, system_prompt: Optional[str] = None) -> Dict:
+        response = self.client.chat.completions.create(
+            model=self.llm_model,
+            messages=_chat_messages(prompt, system_prompt),
+            response_format={"type": "json_schema", "json_schema": {"name": "response", "strict": True, "schema": _strict_schema(schema)}}
+        )
+        return parse_json_response(response.choices[0].message.content)
+
+    def _embedding_options(self, dimensions: Optional[int]) -> Dict:
+        # Only the text-embedding-3 models accept `dimensions`. Vectors come back as base64 float32,
+        # which is a quarter of the JSON float text and decodes straight into an array.
+        options = {"encoding_format": "base64"}
+        if dimensions and self.embedding_model.startswith("text-embedding-3"):
+            options["dimensions"] = dimensions
+        return options
+
+    @staticmethod
+    def _embedding_matrix(response) -> np.ndarray:
+        rows = [np.frombuffer(base64.b64decode(item.embedding), dtype=np.float32) if isinstance(item.embedding, str)
+                else np.asarray(item.embedding, dtype=np.float32) for item in response.data]
+        return np.vstack(rows) if rows else np.zeros((0, 0), dtype=np.float32)
+
+    def embed_content(self, chunks: List[str], task_type: str, dimensions: Optional[int] = None) -> np.ndarray:
         response = self.client.embeddings.create(
             model=self.embedding_model,
-            input=chunks
+            input=chunks,
+            **self._embedding_options(dimensions)
         )
-        return [embedding.embedding for embedding in response.data]
+        return self._embedding_matrix(response)
+
+    @property
+    def async_client(self):
+        # Created on first async use so sync-only workers never open an async connection pool.
+        if self._async_client is None:
+            self._async_client = self.sdk.AsyncOpenAI(api_key=self.api_key)
+        return self._async_client
+
+    async def agenerate_content(self, prompt: str, system_prompt: Optional[str] = None) -> str:
+        response = await self.async_client.chat.completions.create(
+            model=self.llm_model,
+            messages=_chat_messages(prompt, system_prompt)
+        )
+        return response.choices[0].message.content or ""
+
+    async def astream_content(self, prompt: str, system_prompt: Optional[str] = None) -> AsyncIterator[str]:
+        stream = await self.async_client.chat.completions.create(
+            model=self.llm_model,
+            messages=_chat_messages(prompt, system_prompt),
+            stream=True
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    async def aembed_content(self, chunks: List[str], task_type: str, dimensions: Optional[int] = None) -> np.ndarray:
+        response = await self.async_client.embeddings.create(
+            model=self.embedding_model,
+            input=chunks,
+            **self._embedding_options(dimensions)
+        )
+        return self._embedding_matrix(response)
 
 class GroqProvider(LLMProvider):
     def __init__(self, api_key: str):
         super().__init__(api_key)
-        if not Groq:
-            raise ImportError("groq is not installed. Please run 'pip install groq'")
-        self.client = Groq(api_key=self.api_key)
+        self.sdk = _import_sdk("groq", "groq")
+        self.client = self.sdk.Groq(api_key=self.api_key)
+        self._async_client = None
         self.llm_model = "llama3-8b-8192"
-        # Groq doesn't have an embedding model. We fall back to OpenAI's.
-        # This requires an OpenAI API key to be available in the environment.
-        if not OpenAI:
-            raise ImportError("openai is not installed (required for Groq embedding fallback). Please run 'pip install openai'")
-        self.embedding_fallback = OpenAIProvider(api_key=os.getenv("OPENAI_API_KEY", ""))
+        # Groq doesn't have an embedding model. We fall back to OpenAI's, which requires an
+        # OpenAI API key in the environment, or to local embeddings with GROQ_EMBEDDINGS=local.
+        if os.getenv("GROQ_EMBEDDINGS", "openai").lower() == "local":
+            self.embedding_fallback = LocalEmbeddingProvider()
+        else:
+            self.embedding_fallback = OpenAIProvider(api_key=os.getenv("OPENAI_API_KEY", ""))
+
+    @property
+    def embedding_model(self) -> str:
+        return self.embedding_fallback.embedding_model
+
+    @property
+    def embeds_locally(self) -> bool:
+        return self.embedding_fallback.embeds_locally
+
+    def generate_content(self, prompt: str, system_prompt: Optional[str] = None) -> str:
+        response = self.client.chat.completions.create(
+            model=self.llm_model,
+            messages=_chat_messages(prompt, system_prompt)
+        )
+        return response.choices[0].message.content or ""
+
+    def stream_content(self, prompt: str, system_prompt: Optional[str] = None) -> Iterator[str]:
+        stream = self.client.chat.completions.create(
+            model=self.llm_model,
+            messages=_chat_messages(prompt, system_prompt),
+            stream=True
+        )
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
 
-    def generate_content(self, prompt: str) -> str:
+    def generate_json(self, prompt: str, schema: Dict, system_prompt: Optional[str] = None) -> Dict:
+        # Groq's JSON mode guarantees well-formed JSON but not the schema, so the schema also goes in the prompt.
         response = self.client.chat.completions.create(
             model=self.llm_model,
-            messages=[{"role": "user", "content": prompt}]
+            messages=_chat_messages(_json_prompt(prompt, schema), system_prompt),
+            response_format={"type": "json_object"}
+        )
+        return parse_json_response(response.choices[0].message.content)
+
+    def embed_content(self, chunks: List[str], task_type: str, dimensions: Optional[int] = None) -> np.ndarray:
+        print(f"Note: Groq does not have an embedding model. Using {self.embedding_model} as a fallback.")
+        return self.embedding_fallback.embed_content(chunks, task_type, dimensions)
+
+    @property
+    def async_client(self):
+        if self._async_client is None:
+            self._async_client = self.sdk.AsyncGroq(api_key=self.api_key)
+        return self._async_client
+
+    async def agenerate_content(self, prompt: str, system_prompt: Optional[str] = None) -> str:
+        response = await self.async_client.chat.completions.create(
+            model=self.llm_model,
+            messages=_chat_messages(prompt, system_prompt)
         )
         return response.choices[0].message.content or ""
 
-    def embed_content(self, chunks: List[str], task_type: str) -> List[List[float]]:
-        print("Note: Groq does not have an embedding model. Using OpenAI's as a fallback.")
-        return self.embedding_fallback.embed_content(chunks, task_type)
+    async def astream_content(self, prompt: str, system_prompt: Optional[str] = None) -> AsyncIterator[str]:
+        stream = await self.async_client.chat.completions.create(
+            model=self.llm_model,
+            messages=_chat_messages(prompt, system_prompt),
+            stream=True
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    async def aembed_content(self, chunks: List[str], task_type: str, dimensions: Optional[int] = None) -> np.ndarray:
+        return await self.embedding_fallback.aembed_content(chunks, task_type, dimensions)
+
+class LocalEmbeddingProvider(LLMProvider):
+    """Computes embeddings in-process on CPU; text generation is delegated to `generator`, if any.
+
+    Uses a sentence-transformers model when the package is installed, otherwise a deterministic
+    hashing vectorizer. LOCAL_EMBEDDING_BACKEND=sentence-transformers|hashing pins one of them.
+    """
+
+    embeds_locally = True
+    _TOKEN = re.compile(r"[a-z0-9]+")
+
+    def __init__(self, api_key: str = "", generator: Optional[LLMProvider] = None):
+        self.api_key = api_key
+        self.generator = generator
+        self.backend = os.getenv("LOCAL_EMBEDDING_BACKEND", "auto").lower()
+        self.model_name = os.getenv("LOCAL_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+        self.batch_size = int(os.getenv("LOCAL_EMBEDDING_BATCH_SIZE", "64"))
+        self.hashing_dim = int(os.getenv("LOCAL_EMBEDDING_DIM", "512"))
+        self._model = None
+        self._loaded = False
+        self._load_lock = threading.Lock()
+        self._token_slots: Dict[str, tuple] = {}
+
+    def _load(self):
+        # Importing sentence-transformers pulls in torch, so it waits until the first embedding.
+        if self._loaded:
+            return
+        with self._load_lock:
+            if self._loaded:
+                return
+            if self.backend in ("auto", "sentence-transformers"):
+                try:
+                    from sentence_transformers import SentenceTransformer
+                    self._model = SentenceTransformer(self.model_name, device="cpu")
+                except ImportError:
+                    if self.backend != "auto":
+                        raise ImportError("sentence-transformers is not installed. Please run 'pip install sentence-transformers'")
+                    print("sentence-transformers is not installed; using hashing embeddings")
+            self._loaded = True
+
+    @property
+    def generation_model(self) -> str:
+        return self.generator.generation_model if self.generator else "none"
+
+    @property
+    def embedding_model(self) -> str:
+        self._load()
+        if self._model is not None:
+            return f"local:{self.model_name}"
+        return f"local:hashing-{self.hashing_dim}"
+
+    def _slot(self, token: str) -> tuple:
+        # Python's hash() is salted per process, so buckets come from a stable digest instead.
+        slot = self._token_slots.get(token)
+        if slot is None:
+            value = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+            slot = (value % self.hashing_dim, 1.0 if value >> 63 else -1.0)
+            if len(self._token_slots) > 200000:
+                self._token_slots.clear()
+            self._token_slots[token] = slot
+        return slot
+
+    def _hash_embed(self, chunks: List[str]) -> np.ndarray:
+        rows, cols, signs = [], [], []
+        for row, chunk in enumerate(chunks):
+            words = self._TOKEN.findall(chunk.lower())
+            for token in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+                col, sign = self._slot(token)
+                rows.append(row)
+                cols.append(col)
+                signs.append(sign)
+        matrix = np.zeros((len(chunks), self.hashing_dim), dtype=np.float32)
+        np.add.at(matrix, (np.asarray(rows, dtype=np.intp), np.asarray(cols, dtype=np.intp)), np.asarray(signs, dtype=np.float32))
+        matrix = np.sign(matrix) * np.log1p(np.abs(matrix))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms == 0, 1.0, norms)
+
+    def embed_content(self, chunks: List[str], task_type: str, dimensions: Optional[int] = None) -> np.ndarray:
+        self._load()
+        if not chunks:
+            return np.zeros((0, 0), dtype=np.float32)
+        if self._model is not None:
+            vectors = self._model.encode(chunks, batch_size=self.batch_size, normalize_embeddings=True, convert_to_numpy=True)
+        else:
+            vectors = self._hash_embed(chunks)
+        return vectors.astype(np.float32)
+
+    def _require_generator(self) -> LLMProvider:
+        if self.generator is None:
+            raise ValueError("The local provider only computes embeddings; use 'local:<provider>' to generate answers.")
+        return self.generator
+
+    def generate_content(self, prompt: str, system_prompt: Optional[str] = None) -> str:
+        return self._require_generator().generate_content(prompt, system_prompt=system_prompt)
+
+    def stream_content(self, prompt: str, system_prompt: Optional[str] = None) -> Iterator[str]:
+        return self._require_generator().stream_content(prompt, system_prompt=system_prompt)
+
+    def generate_json(self, prompt: str, schema: Dict, system_prompt: Optional[str] = None) -> Dict:
+        return self._require_generator().generate_json(prompt, schema, system_prompt=system_prompt)
+
+    async def agenerate_content(self, prompt: str, system_prompt: Optional[str] = None) -> str:
+        return await self._require_generator().agenerate_content(prompt, system_prompt=system_prompt)
+
+    async def astream_content(self, prompt: str, system_prompt: Optional[str] = None) -> AsyncIterator[str]:
+        async for piece in self._require_generator().astream_content(prompt, system_prompt=system_prompt):
+            yield piece
+
+    def count_tokens(self, text: str) -> int:
+        if self.generator is None:
+            return super().count_tokens(text)
+        return self.generator.count_tokens(text)
+
+def _chat_messages(prompt: str, system_prompt: Optional[str]) -> List[Dict[str, str]]:
+    # Keeping the static system prompt as the first message gives the provider an
+    # identical prefix across requests, which is what OpenAI prompt caching keys on.
+    messages = [{"role": "system", "content": system_prompt}] if system_prompt else []
+    return messages + [{"role": "user", "content": prompt}]
 
 def get_provider(provider_name: str, api_key: str) -> LLMProvider:
     provider_name = provider_name.lower()
+    if provider_name == "failover" or provider_name.startswith("failover:"):
+        # "failover:google,openai,groq" generates with the first healthy provider, embeds with the first.
+        from failover import FailoverProvider, failover_provider_names
+        return FailoverProvider(api_key=api_key, provider_names=failover_provider_names(provider_name))
+    if provider_name == "local" or provider_name.startswith("local:"):
+        # "local" embeds only; "local:<provider>" embeds locally and generates with <provider>.
+        generator_name = provider_name.partition(":")[2]
+        return LocalEmbeddingProvider(api_key=api_key, generator=get_provider(generator_name, api_key) if generator_name else None)
     if provider_name == "google":
         return GoogleProvider(api_key=api_key)
     elif provider_name == "openai":
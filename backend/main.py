@@ -1,38 +1,73 @@
 import os
+import time
 import uuid
 import json
+import math
 import hashlib
 import traceback
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
 from dotenv import load_dotenv
-import google.generativeai as genai
 
-from preprocessor import load_parse_pdf, chunkify_text
+from preprocessor import chunkify_text
 from rag import Rag
+from pool import pool_stats
+from embedding_cache import get_embedding_cache
+from pipeline import get_parse_cache, parse_cache_key, parse_resume_content, build_bot as build_bot_collection
+from jobs import get_job_queue
+from bulk_ingest import batch_key, bulk_ingest, collect_items, new_spool, remove_spool
+from response_cache import get_response_cache
+from warmup import warm_up, warmup_status
+from failover import provider_health
+from embedding_codec import EmbeddingCompression
+from collection_registry import owner_of, start_sweeper, sweep, sweeper_status
+import metrics
 
 load_dotenv()
 app = Flask(__name__)
+# Caps every request body (bulk uploads are the large ones); larger requests get a 413.
+app.config['MAX_CONTENT_LENGTH'] = int(os.getenv("MAX_REQUEST_BYTES", str(512 * 1024 * 1024)))
+
+CORS_ORIGINS = [
+    "http://localhost:3000",
+    "https://portfolio-assistant-one.vercel.app",
+    "https://*.vercel.app"
+]
 
 CORS(app, resources={
     r"/*": {
-        "origins": [
-            "http://localhost:3000",
-            "https://portfolio-assistant-one.vercel.app",
-            "https://*.vercel.app"
-        ]
+        "origins": CORS_ORIGINS
     }
 })
 
-try:
-    api_key = os.getenv("GOOGLE_API_KEY")
-    if not api_key:
-        raise ValueError("GOOGLE_API_KEY environment variable not set")
-    genai.configure(api_key=api_key)
-except Exception as e:
-    print(f"CRITICAL: Failed to configure Google AI. Error: {e}")
+metrics.register_gauges("pool", pool_stats)
+metrics.register_gauges("embedding_cache", lambda: get_embedding_cache().stats())
+metrics.register_gauges("parse_cache", lambda: get_parse_cache().stats())
+metrics.register_gauges("response_cache", lambda: get_response_cache().stats())
+metrics.register_gauges("providers", provider_health)
+metrics.register_gauges("collection_sweeper", sweeper_status)
+
+@app.before_request
+def start_request_trace():
+    g.request_started = time.perf_counter()
+    metrics.start_trace()
+
+@app.before_request
+def reject_oversized_request():
+    # Checked up front: inside a route the 413 would be caught by its generic error handling.
+    limit = app.config['MAX_CONTENT_LENGTH']
+    if request.content_length is not None and request.content_length > limit:
+        return jsonify({"error": f"Request body is larger than the {limit}-byte limit"}), 413
 
-parse_cache = {}
+@app.after_request
+def record_request(response):
+    elapsed = time.perf_counter() - g.get('request_started', time.perf_counter())
+    trace = metrics.finish_trace() or []
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    metrics.HTTP_SECONDS.observe(elapsed, route=route, method=request.method, status=response.status_code)
+    if metrics.trace_requested(request.headers.get(metrics.TRACE_HEADER)):
+        response.headers["Server-Timing"] = metrics.server_timing(trace, elapsed)
+    return response
 
 @app.route('/')
 def home():
@@ -44,18 +79,68 @@ def home():
             "/api/parse-resume",
             "/api/build-bot",
             "/api/chat",
+            "/api/chat/stream",
             "/api/collections/finalize",
-            "/api/add-to-bot"
+            "/api/collections/sweep",
+            "/api/add-to-bot",
+            "/api/jobs/parse-resume",
+            "/api/jobs/build-bot",
+            "/api/jobs/bulk-ingest",
+            "/api/jobs/<job_id>",
+            "/api/jobs/<job_id>/result",
+            "/api/jobs/<job_id>/cancel",
+            "/metrics",
+            "/debug/profiler"
         ]
     })
 
 @app.route('/health')
 def health():
-    return jsonify({"status": "healthy", "timestamp": str(uuid.uuid4())})
+    return jsonify({
+        "status": "healthy",
+        "timestamp": str(uuid.uuid4()),
+        "pool": pool_stats(),
+        "embedding_cache": get_embedding_cache().stats(),
+        "parse_cache": get_parse_cache().stats(),
+        "response_cache": get_response_cache().stats(),
+        "warmup": warmup_status(),
+        "providers": provider_health(),
+        "collection_sweeper": sweeper_status()
+    })
+
+@app.route('/metrics')
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+def _profiler_allowed() -> bool:
+    # The profiler endpoints only exist when PROFILER_TOKEN is configured, and require it.
+    token = os.getenv("PROFILER_TOKEN")
+    return bool(token) and request.headers.get("X-Profiler-Token") == token
+
+@app.route('/debug/profiler', methods=['GET', 'POST', 'DELETE'])
+def sampling_profiler():
+    if not _profiler_allowed():
+        return jsonify({"error": "Not found"}), 404
+
+    profiler = metrics.get_profiler()
+    if request.method == 'POST':
+        try:
+            interval = float(request.args.get('interval', 0.01))
+            duration = float(request.args['duration']) if request.args.get('duration') else None
+        except ValueError:
+            return jsonify({"error": "interval and duration must be numbers"}), 400
+        if not math.isfinite(interval) or (duration is not None and not math.isfinite(duration)):
+            return jsonify({"error": "interval and duration must be finite"}), 400
+        started = profiler.start(interval=interval, duration=duration)
+        return jsonify({**profiler.status(), "started": started})
+    if request.method == 'DELETE':
+        return Response(profiler.stop(), mimetype="text/plain")
+    if request.args.get('format') == 'collapsed':
+        return Response(profiler.collapsed(), mimetype="text/plain")
+    return jsonify(profiler.status())
 
 @app.route('/api/parse-resume', methods=['POST'])
 def parse_resume():
-    temp_path = None
     try:
         if 'resume' not in request.files:
             print("No resume file in request")
@@ -67,86 +152,7 @@ def parse_resume():
             return jsonify({"error": "Invalid file"}), 400
         
         file_content = file.read()
-        file_size = len(file_content)
-        file_hash = hashlib.md5(file_content).hexdigest()
-        
-        if file_hash in parse_cache:
-            return jsonify(parse_cache[file_hash])
-        
-        temp_path = f"/tmp/temp_{uuid.uuid4()}.pdf"
-        
-        with open(temp_path, 'wb') as f:
-            f.write(file_content)
-        
-        if not os.path.exists(temp_path):
-            raise FileNotFoundError(f"Failed to create temp file at {temp_path}")
-        
-        raw_text = load_parse_pdf(temp_path)
-        
-        if not raw_text or len(raw_text.strip()) == 0:
-            raise ValueError("No text could be extracted from the PDF")
-        
-        os.remove(temp_path)
-        temp_path = None
-        model = genai.GenerativeModel("models/gemini-2.0-flash-exp")
-        
-        prompt = f"""You are a highly sophisticated AI resume parser. Extract key information and return ONLY a valid JSON object.
-
-        **JSON Output Schema:**
-        {{
-        "personal_details": {{
-            "name": "string | null",
-            "email": "string | null",
-            "phone": "string | null",
-            "links": [{{"type": "linkedin | github | portfolio | other", "url": "string"}}]
-        }},
-        "summary": "string | null",
-        "EDUCATION": [{{"title": "string", "subtitle": "string | null", "date": "string | null", "description": "string | null"}}],
-        "EXPERIENCE": [{{"title": "string", "subtitle": "string | null", "date": "string | null", "description": "string"}}],
-        "PROJECTS": [{{"title": "string", "subtitle": "string | null", "date": "string | null", "description": "string"}}],
-        "SKILLS": [{{"title": "string", "description": "string | null"}}],
-        "CERTIFICATIONS": [{{"title": "string", "subtitle": "string | null", "date": "string | null"}}]
-        }}
-
-        **CRITICAL RULES:**
-        1. Output ONLY valid JSON, no markdown, no backticks, no explanations
-        2. Extract personal details from the top of the resume
-        3. Map sections intelligently (Work History → EXPERIENCE, Technical Skills → SKILLS)
-        4. Merge bullet points into description fields with \\n separator
-        5. Omit missing sections entirely
-
-        --- RESUME TEXT START ---
-        {raw_text}
-        --- RESUME TEXT END ---"""
-        
-        response = model.generate_content(prompt)
-        
-        if not response or not response.text:
-            raise ValueError("Gemini returned empty response")
-        
-        json_response_string = response.text.strip()
-        
-        if json_response_string.startswith("```json"):
-            json_response_string = json_response_string[7:]
-        elif json_response_string.startswith("```"):
-            json_response_string = json_response_string[3:]
-        if json_response_string.endswith("```"):
-            json_response_string = json_response_string[:-3]
-
-        
-        json_response_string = json_response_string.strip()
-        
-        if not json_response_string:
-            raise ValueError("JSON string empty after cleaning")
-        
-        parsed_json = json.loads(json_response_string)
-        
-        if not isinstance(parsed_json, dict):
-            raise ValueError(f"Expected dict, got {type(parsed_json)}")
-        
-        print(f"Parsed JSON successfully. Keys: {list(parsed_json.keys())}")
-        
-        parse_cache[file_hash] = parsed_json
+        parsed_json = parse_resume_content(file_content)
         
         return jsonify(parsed_json)
         
@@ -156,9 +162,6 @@ def parse_resume():
         print(f"Problematic string: {e.doc[:500] if hasattr(e, 'doc') else 'N/A'}")
         traceback.print_exc()
         
-        if temp_path and os.path.exists(temp_path):
-            os.remove(temp_path)
-        
         return jsonify({
             "error": f"Failed to parse AI response as JSON: {str(e)}",
             "details": {
@@ -176,89 +179,35 @@ def parse_resume():
     except ValueError as e:
         print(f"VALUE ERROR: {e}")
         traceback.print_exc()
-        
-        if temp_path and os.path.exists(temp_path):
-            os.remove(temp_path)
-        
         return jsonify({"error": str(e)}), 500
         
     except Exception as e:
         print(f"UNEXPECTED ERROR: {type(e).__name__}: {e}")
         traceback.print_exc()
         
-        if temp_path and os.path.exists(temp_path):
-            os.remove(temp_path)
-        
         return jsonify({
             "error": f"Failed to parse resume: {str(e)}",
             "error_type": type(e).__name__
         }), 500
 
+def _requested_compression():
+    # Optional per-collection embedding settings; EMBEDDING_DIMENSIONS/EMBEDDING_QUANTIZATION otherwise.
+    return EmbeddingCompression.parse(request.form.get('embedding_dimensions'), request.form.get('embedding_quantization'))
+
 @app.route('/api/build-bot', methods=['POST'])
 def build_bot():
     try:
         provider_name = request.form.get('provider_name', 'google')
         api_key = request.form.get('api_key') or os.getenv("GOOGLE_API_KEY")
-        temp_collection_name = f"temp-{uuid.uuid4()}"
         enrichments = json.loads(request.form.get('enrichments', '{}'))
         parsed_data = json.loads(request.form.get('parsedData', '{}'))
+        try:
+            compression = _requested_compression()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
-
-        full_text_content = ""
-        
-        if 'personal_details' in parsed_data and isinstance(parsed_data['personal_details'], dict):
-            pd = parsed_data['personal_details']
-            full_text_content += "PERSONAL DETAILS:\n"
-            if pd.get('name'):
-                full_text_content += f"Name: {pd['name']}\n"
-            if pd.get('email'):
-                full_text_content += f"Email: {pd['email']}\n"
-            if pd.get('phone'):
-                full_text_content += f"Phone: {pd['phone']}\n"
-            if pd.get('links') and isinstance(pd['links'], list):
-                for link in pd['links']:
-                    if isinstance(link, dict):
-                        full_text_content += f"{link.get('type', 'Link').title()}: {link.get('url', '')}\n"
-        
-        if 'summary' in parsed_data and isinstance(parsed_data['summary'], str):
-            full_text_content += f"\n\n=== PROFESSIONAL SUMMARY ===\n{parsed_data['summary']}\n"
-
-        for section, items in parsed_data.items():
-            if section.lower() in ['personal_details', 'summary'] or not isinstance(items, list) or not items:
-                continue
-                
-            full_text_content += f"\n\n=== {section.upper()} ===\n"
-            
-            for i, item in enumerate(items):
-                item_key = f"{section}-{i}"
-                full_text_content += f"\n--- Entry {i+1} ---\n"
-
-                if isinstance(item, dict):
-                    full_text_content += f"Title: {item.get('title', 'N/A')}\n"
-                    if item.get('subtitle'):
-                        full_text_content += f"Organization/Institution: {item.get('subtitle')}\n"
-                    if item.get('date'):
-                        full_text_content += f"Duration: {item.get('date')}\n"
-                    if item.get('description'):
-                        full_text_content += f"Description: {item.get('description')}\n"
-                elif isinstance(item, str):
-                    full_text_content += f"Skill/Item: {item}\n"
-                
-                if enrichments.get(item_key):
-                    full_text_content += f"Additional Context: {enrichments[item_key]}\n"
-        
-        print(f"Generated {len(full_text_content)} chars of content")
-        
-        all_chunks = chunkify_text(full_text_content)
+        temp_collection_name = build_bot_collection(parsed_data, enrichments, provider_name, api_key, compression)
         
-        rag_system = Rag(
-            collection_name=temp_collection_name, 
-            provider_name=provider_name, 
-            api_key=api_key
-        )
-        rag_system.set_doc_pipeline(chunks=all_chunks)
-        
-        print(f"Bot built successfully: {temp_collection_name}")
         return jsonify({
             "message": "Temporary bot built successfully", 
             "collection_name": temp_collection_name
@@ -285,8 +234,10 @@ def finalize_collection():
             return jsonify({"error": "Missing source or target collection name"}), 400
         
         
+        copy = data.get('mode', os.getenv("FINALIZE_MODE", "alias")) == "copy"
+
         rag_system = Rag(collection_name=source_name, provider_name=provider_name, api_key=api_key)
-        rag_system.rename_collection(new_name=target_name)
+        rag_system.rename_collection(new_name=target_name, copy=copy)
         
         print(f"Collection finalized successfully")
         return jsonify({"message": "Collection finalized", "new_collection_name": target_name})
@@ -299,6 +250,26 @@ def finalize_collection():
             "error_type": type(e).__name__
         }), 500
 
+def _admin_allowed() -> bool:
+    token = os.getenv("COLLECTION_ADMIN_TOKEN")
+    return bool(token) and request.headers.get("X-Admin-Token") == token
+
+@app.route('/api/collections/sweep', methods=['GET', 'POST'])
+def sweep_collections():
+    # GET reports what a sweep would delete; POST deletes it.
+    if not _admin_allowed():
+        return jsonify({"error": "Not found"}), 404
+    try:
+        ttl = float(request.args['ttl']) if request.args.get('ttl') else None
+        return jsonify(sweep(dry_run=request.method == 'GET', ttl=ttl))
+    except Exception as e:
+        print(f"Error sweeping collections: {type(e).__name__}: {e}")
+        traceback.print_exc()
+        return jsonify({
+            "error": str(e),
+            "error_type": type(e).__name__
+        }), 500
+
 @app.route('/api/add-to-bot', methods=['POST'])
 def add_to_bot():
     try:
@@ -312,8 +283,12 @@ def add_to_bot():
             return jsonify({"error": "Missing collection_name or text"}), 400
         
         
+        source = data.get('source')
+        if source is not None and not isinstance(source, str):
+            return jsonify({"error": "source must be a string"}), 400
+
         rag_system = Rag(collection_name=collection_name, provider_name=provider_name, api_key=api_key)
-        num_added = rag_system.add_documents(chunks=chunkify_text(new_text))
+        num_added = rag_system.add_documents(chunks=chunkify_text(new_text), source=source)
         
         print(f"Added {num_added} documents")
         return jsonify({"message": f"Successfully added {num_added} new documents."})
@@ -338,14 +313,16 @@ def chat():
         if not collection_name or not query:
             return jsonify({"error": "Missing collection_name or query"}), 400
         
+        session_id = data.get('session_id') or uuid.uuid4().hex
+
         print(f"Chat query for: {collection_name}")
         
-        rag_system = Rag(collection_name=collection_name, provider_name=provider_name, api_key=api_key)
-        answer = rag_system.answer_query(query)
+        rag_system = Rag(collection_name=collection_name, provider_name=provider_name, api_key=api_key, session_id=session_id)
+        answer = rag_system.answer_query(query, section=data.get('section'))
         memory_info = rag_system.get_memory_summary()
         
         print(f"Query answered")
-        return jsonify({"answer": answer, "memory": memory_info})
+        return jsonify({"answer": answer, "memory": memory_info, "session_id": session_id, "cache": rag_system.last_answer_meta})
         
     except Exception as e:
         print(f"Chat error: {type(e).__name__}: {e}")
@@ -355,8 +332,167 @@ def chat():
             "error_type": type(e).__name__
         }), 500
 
+@app.route('/api/jobs/parse-resume', methods=['POST'])
+def submit_parse_resume_job():
+    try:
+        file = request.files.get('resume')
+        if not file or file.filename == '':
+            return jsonify({"error": "No resume file provided"}), 400
+
+        file_content = file.read()
+        job = get_job_queue().submit("parse-resume", parse_cache_key(file_content), parse_resume_content, file_content)
+        return jsonify(job), 202
+
+    except Exception as e:
+        print(f"Error submitting parse job: {type(e).__name__}: {e}")
+        traceback.print_exc()
+        return jsonify({
+            "error": str(e),
+            "error_type": type(e).__name__
+        }), 500
+
+@app.route('/api/jobs/build-bot', methods=['POST'])
+def submit_build_bot_job():
+    try:
+        provider_name = request.form.get('provider_name', 'google')
+        api_key = request.form.get('api_key') or os.getenv("GOOGLE_API_KEY")
+        enrichments = json.loads(request.form.get('enrichments', '{}'))
+        parsed_data = json.loads(request.form.get('parsedData', '{}'))
+        try:
+            compression = _requested_compression()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        # Keyed by caller too, so another client's identical submission never gets this job's collection.
+        content = json.dumps([owner_of(api_key), provider_name, parsed_data, enrichments, repr(compression)], sort_keys=True)
+        idempotency_key = request.headers.get('Idempotency-Key') or hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+        def run():
+            return {"collection_name": build_bot_collection(parsed_data, enrichments, provider_name, api_key, compression)}
+
+        job = get_job_queue().submit("build-bot", idempotency_key, run)
+        return jsonify(job), 202
+
+    except Exception as e:
+        print(f"Error submitting build job: {type(e).__name__}: {e}")
+        traceback.print_exc()
+        return jsonify({
+            "error": str(e),
+            "error_type": type(e).__name__
+        }), 500
+
+@app.route('/api/jobs/bulk-ingest', methods=['POST'])
+def submit_bulk_ingest_job():
+    try:
+        provider_name = request.form.get('provider_name', 'google')
+        api_key = request.form.get('api_key') or os.getenv("GOOGLE_API_KEY")
+        uploads = request.files.getlist('resumes') + request.files.getlist('archive')
+        if not uploads:
+            return jsonify({"error": "No resumes or archive provided"}), 400
+
+        received = time.time()
+        spool = new_spool()
+        try:
+            items = collect_items([(file.filename, file.stream) for file in uploads], spool)
+        except Exception:
+            remove_spool(spool)
+            raise
+        idempotency_key = request.headers.get('Idempotency-Key') or batch_key(items, provider_name, api_key)
+
+        def run():
+            try:
+                return bulk_ingest(items, provider_name, api_key)
+            finally:
+                remove_spool(spool)
+
+        job = get_job_queue().submit("bulk-ingest", idempotency_key, run)
+        if job["created_at"] < received:
+            # An identical batch is already queued or done; this copy of the files is never read.
+            remove_spool(spool)
+        return jsonify({**job, "total_items": len(items)}), 202
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    except Exception as e:
+        print(f"Error submitting bulk ingest job: {type(e).__name__}: {e}")
+        traceback.print_exc()
+        return jsonify({
+            "error": str(e),
+            "error_type": type(e).__name__
+        }), 500
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = get_job_queue().status(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+@app.route('/api/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    queue = get_job_queue()
+    job = queue.status(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    if job["status"] != "succeeded":
+        return jsonify(job), 409
+    return jsonify(queue.result(job_id))
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    job = get_job_queue().cancel(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+def _sse(event: str, payload: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    try:
+        data = request.get_json()
+        collection_name = data.get('collection_name')
+        query = data.get('query')
+        provider_name = data.get('provider_name', 'google')
+        api_key = data.get('api_key') or os.getenv("GOOGLE_API_KEY")
+        session_id = data.get('session_id') or uuid.uuid4().hex
+
+        if not collection_name or not query:
+            return jsonify({"error": "Missing collection_name or query"}), 400
+
+        print(f"Streaming chat query for: {collection_name}")
+
+        rag_system = Rag(collection_name=collection_name, provider_name=provider_name, api_key=api_key, session_id=session_id)
+    except Exception as e:
+        print(f"Chat stream error: {type(e).__name__}: {e}")
+        traceback.print_exc()
+        return jsonify({
+            "error": str(e),
+            "error_type": type(e).__name__
+        }), 500
+
+    def generate():
+        try:
+            for piece in rag_system.answer_query_stream(query, section=data.get('section')):
+                yield _sse("token", {"text": piece})
+            yield _sse("done", {"memory": rag_system.get_memory_summary(), "session_id": session_id, "cache": rag_system.last_answer_meta})
+        except Exception as e:
+            print(f"Chat stream error: {type(e).__name__}: {e}")
+            traceback.print_exc()
+            yield _sse("error", {"error": str(e), "error_type": type(e).__name__})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 8080))
     debug = os.environ.get('DEBUG', 'False').lower() == 'true'
     print(f"🚀 Starting Flask app on port {port} (debug={debug})")
+    warm_up()
+    start_sweeper()
     app.run(host='0.0.0.0', port=port, debug=debug)
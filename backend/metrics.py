@@ -0,0 +1,320 @@
+import os
+import sys
+import time
+import inspect
+import threading
+import functools
+from collections import Counter as _Tally
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Metrics live in process memory; with several gunicorn workers each one exposes its own.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS = (50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000)
+COUNT_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+
+TRACE_ALL_REQUESTS = os.getenv("TRACE_REQUESTS", "false").lower() == "true"
+TRACE_HEADER = "X-Trace"
+
+def _label_key(labels: Dict[str, str]) -> Tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(key: Tuple, extra: Optional[Tuple] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: Tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append(f"{self.name}_bucket{_format_labels(key, ('le', bound))} {bucket_count}")
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', '+Inf'))} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, value: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+_registry: Dict[str, object] = {}
+_gauge_sources: Dict[str, Callable[[], Dict]] = {}
+_registry_lock = threading.Lock()
+
+def histogram(name: str, help: str, buckets: Tuple = LATENCY_BUCKETS) -> Histogram:
+    with _registry_lock:
+        if name not in _registry:
+            _registry[name] = Histogram(name, help, buckets)
+        return _registry[name]
+
+def counter(name: str, help: str) -> Counter:
+    with _registry_lock:
+        if name not in _registry:
+            _registry[name] = Counter(name, help)
+        return _registry[name]
+
+def register_gauges(prefix: str, source: Callable[[], Dict]):
+    """Exposes the numeric values of `source()` (e.g. a cache's stats()) as pa_<prefix>_<key> gauges."""
+    with _registry_lock:
+        _gauge_sources[prefix] = source
+
+def _flatten(prefix: str, values: Dict) -> List[Tuple[str, float]]:
+    flat = []
+    for key, value in values.items():
+        name = f"{prefix}_{key}"
+        if isinstance(value, dict):
+            flat.extend(_flatten(name, value))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat.append((name, value))
+    return flat
+
+def render() -> str:
+    """Renders every metric in the Prometheus text exposition format."""
+    with _registry_lock:
+        metrics = list(_registry.values())
+        sources = list(_gauge_sources.items())
+    lines: List[str] = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    for prefix, source in sources:
+        try:
+            values = source()
+        except Exception as e:
+            print(f"Metrics source {prefix} failed: {e}")
+            continue
+        for name, value in _flatten(f"pa_{prefix}", values):
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+STAGE_SECONDS = histogram("pa_stage_seconds", "Latency of RAG pipeline stages.")
+PROVIDER_SECONDS = histogram("pa_provider_seconds", "Latency of LLM provider calls.")
+PROVIDER_ERRORS = counter("pa_provider_errors_total", "LLM provider calls that raised.")
+HTTP_SECONDS = histogram("pa_http_request_seconds", "Latency of HTTP requests until the response starts.")
+
+# Per-request trace: a list of (stage, seconds) shared by everything running in the request's
+# context (asyncio.to_thread copies the context, so worker-thread stages land here too).
+_trace: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("pa_trace", default=None)
+
+def start_trace() -> List[Tuple[str, float]]:
+    trace: List[Tuple[str, float]] = []
+    _trace.set(trace)
+    return trace
+
+def finish_trace() -> Optional[List[Tuple[str, float]]]:
+    trace = _trace.get()
+    _trace.set(None)
+    return trace
+
+def trace_requested(header_value: Optional[str]) -> bool:
+    return TRACE_ALL_REQUESTS or (header_value or "").lower() in ("1", "true")
+
+def server_timing(trace: List[Tuple[str, float]], total: float) -> str:
+    entries = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in trace]
+    return ", ".join(entries + [f"total;dur={total * 1000:.1f}"])
+
+def _record(metric: Histogram, trace_name: str, seconds: float, labels: Dict):
+    metric.observe(seconds, **labels)
+    trace = _trace.get()
+    if trace is not None:
+        trace.append((trace_name, seconds))
+
+@contextmanager
+def timed(stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record(STAGE_SECONDS, stage, time.perf_counter() - started, {"stage": stage})
+
+def timed_function(stage: str):
+    """Decorator form of timed() for plain and async functions."""
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with timed(stage):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timed(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def instrument_provider_method(method: str, fn):
+    """Wraps an LLMProvider method so calls are timed per provider class; streams also record time to first piece."""
+    def observe(self, started: float, name: str = method, failed: bool = False):
+        provider = type(self).__name__
+        if failed:
+            PROVIDER_ERRORS.inc(provider=provider, method=name)
+        _record(PROVIDER_SECONDS, f"{provider}.{name}", time.perf_counter() - started, {"provider": provider, "method": name})
+
+    if inspect.isasyncgenfunction(fn):
+        @functools.wraps(fn)
+        async def async_gen_wrapper(self, *args, **kwargs):
+            started = time.perf_counter()
+            first = True
+            try:
+                async for piece in fn(self, *args, **kwargs):
+                    if first:
+                        observe(self, started, f"{method}_first")
+                        first = False
+                    yield piece
+            except Exception:
+                observe(self, started, failed=True)
+                raise
+            observe(self, started)
+        return async_gen_wrapper
+
+    if inspect.isgeneratorfunction(fn):
+        @functools.wraps(fn)
+        def gen_wrapper(self, *args, **kwargs):
+            started = time.perf_counter()
+            first = True
+            try:
+                for piece in fn(self, *args, **kwargs):
+                    if first:
+                        observe(self, started, f"{method}_first")
+                        first = False
+                    yield piece
+            except Exception:
+                observe(self, started, failed=True)
+                raise
+            observe(self, started)
+        return gen_wrapper
+
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def async_wrapper(self, *args, **kwargs):
+            started = time.perf_counter()
+            try:
+                result = await fn(self, *args, **kwargs)
+            except Exception:
+                observe(self, started, failed=True)
+                raise
+            observe(self, started)
+            return result
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            result = fn(self, *args, **kwargs)
+        except Exception:
+            observe(self, started, failed=True)
+            raise
+        observe(self, started)
+        return result
+    return wrapper
+
+class SamplingProfiler:
+    """Samples every thread's Python stack on an interval; output is in collapsed-stack (flamegraph) format."""
+
+    def __init__(self):
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._stacks: _Tally = _Tally()
+        self._lock = threading.Lock()
+        self.interval = 0.01
+        self.started_at: Optional[float] = None
+        self.samples = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval: float = 0.01, duration: Optional[float] = None) -> bool:
+        with self._lock:
+            if self.running:
+                return False
+            self.interval = max(0.001, interval)
+            self._stacks = _Tally()
+            self.samples = 0
+            self.started_at = time.time()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, args=(duration,), name="sampling-profiler", daemon=True)
+            self._thread.start()
+            return True
+
+    def _run(self, duration: Optional[float]):
+        own_id = threading.get_ident()
+        deadline = time.monotonic() + duration if duration else None
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                self._stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+            if deadline and time.monotonic() >= deadline:
+                break
+
+    def stop(self) -> str:
+        with self._lock:
+            self._stop.set()
+            if self._thread is not None:
+                self._thread.join()
+                self._thread = None
+        return self.collapsed()
+
+    def collapsed(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self._stacks.most_common()) + "\n"
+
+    def status(self) -> Dict:
+        return {"running": self.running, "interval": self.interval, "samples": self.samples, "started_at": self.started_at}
+
+_profiler = SamplingProfiler()
+
+def get_profiler() -> SamplingProfiler:
+    return _profiler
@@ -0,0 +1,84 @@
+import os
+import hashlib
+from typing import Dict, Optional
+
+from llm_provider import LLMProvider
+from pool import forget_collection, get_pooled_provider, get_vector_client
+from preprocessor import load_parse_pdf, chunkify_resume
+from resume_parser import parse_resume_text
+from rag import Rag
+from embedding_codec import EmbeddingCompression, default_compression
+from collection_registry import claim_temp_collection, content_hash, mark_ready, owner_of, register
+from json_cache import get_json_cache
+from jobs import JobCancelled, checkpoint
+
+PARSE_PROVIDER = os.getenv("PARSE_PROVIDER", "google")
+# Bump whenever the parse prompts or JSON schema change so cached results are not reused.
+PARSE_PROMPT_VERSION = "2"
+
+def get_parse_provider() -> LLMProvider:
+    # The server's own key for the parse provider ("failover:google,openai" and "local:google" use the first name's).
+    base = PARSE_PROVIDER.rpartition(":")[2].split(",")[0]
+    return get_pooled_provider(PARSE_PROVIDER, os.getenv(f"{base.upper()}_API_KEY", ""))
+
+def get_parse_cache():
+    return get_json_cache("parse", max_entries=2000)
+
+def parse_cache_key(file_content: bytes) -> str:
+    return f"{PARSE_PROVIDER}:{PARSE_PROMPT_VERSION}:{hashlib.sha256(file_content).hexdigest()}"
+
+def parse_resume_content(file_content: bytes) -> Dict:
+    cache_key = parse_cache_key(file_content)
+    parse_cache = get_parse_cache()
+
+    cached = parse_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    raw_text = load_parse_pdf(file_content)
+
+    if not raw_text or len(raw_text.strip()) == 0:
+        raise ValueError("No text could be extracted from the PDF")
+    checkpoint(stage="extracted", characters=len(raw_text))
+
+    parsed_json = parse_resume_text(get_parse_provider(), raw_text)
+    print(f"Parsed resume successfully. Keys: {list(parsed_json.keys())}")
+
+    # Cached even if the job was cancelled meanwhile: the model calls are already paid for.
+    parse_cache.set(cache_key, parsed_json)
+    checkpoint(stage="parsed")
+    return parsed_json
+
+def build_bot(parsed_data: Dict, enrichments: Dict, provider_name: str, api_key: str,
+              compression: Optional[EmbeddingCompression] = None) -> str:
+    owner = owner_of(api_key)
+    digest = content_hash(owner, provider_name, parsed_data, enrichments, compression or default_compression())
+    temp_collection_name, built = claim_temp_collection(digest)
+    if built:
+        print(f"Reusing {temp_collection_name}, already built from the same content")
+        return temp_collection_name
+
+    all_chunks, metadatas = chunkify_resume(parsed_data, enrichments)
+
+    print(f"Generated {len(all_chunks)} chunks ({sum(map(len, all_chunks))} chars)")
+    checkpoint(stage="chunked", chunks=len(all_chunks))
+
+    rag_system = Rag(
+        collection_name=temp_collection_name,
+        provider_name=provider_name,
+        api_key=api_key,
+        compression=compression
+    )
+    register(rag_system.collection, owner, digest)
+    try:
+        rag_system.set_doc_pipeline(chunks=all_chunks, metadatas=metadatas)
+    except JobCancelled:
+        # Half-built and never handed out, so nothing refers to it.
+        print(f"Build cancelled, deleting {temp_collection_name}")
+        get_vector_client().delete_collection(name=temp_collection_name)
+        forget_collection(temp_collection_name)
+        raise
+    mark_ready(rag_system.collection)
+
+    print(f"Bot built successfully: {temp_collection_name}")
+    return temp_collection_name
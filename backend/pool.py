@@ -0,0 +1,140 @@
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from dotenv import load_dotenv
+
+from llm_provider import get_provider, LLMProvider
+
+load_dotenv()
+
+class TTLCache:
+    """Thread-safe LRU map whose entries also expire after `ttl` seconds."""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_create(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and time.monotonic() - entry[1] < self.ttl:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._data[key]
+                self.evictions += 1
+            self.misses += 1
+
+        # Build outside the lock so a slow handshake doesn't serialize every request.
+        value = factory()
+
+        with self._lock:
+            existing = self._data.get(key)
+            if existing is not None and time.monotonic() - existing[1] < self.ttl:
+                self._data.move_to_end(key)
+                return existing[0]
+            self._data[key] = (value, time.monotonic())
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+            return value
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+_providers = TTLCache(
+    max_size=int(os.getenv("POOL_MAX_PROVIDERS", "64")),
+    ttl=float(os.getenv("POOL_PROVIDER_TTL", "1800")),
+)
+_collections = TTLCache(
+    max_size=int(os.getenv("POOL_MAX_COLLECTIONS", "256")),
+    ttl=float(os.getenv("POOL_COLLECTION_TTL", "600")),
+)
+# A permanent bot name can be an empty pointer collection whose metadata names the
+# collection that actually holds its vectors (see Rag.rename_collection).
+ALIAS_KEY = "alias_of"
+MAX_ALIAS_HOPS = 4
+
+_client_lock = threading.Lock()
+_vector_client: Optional[Any] = None
+
+def _key_fingerprint(api_key: str) -> str:
+    return hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()
+
+def get_pooled_provider(provider_name: str, api_key: str) -> LLMProvider:
+    key = (provider_name.lower(), _key_fingerprint(api_key))
+    return _providers.get_or_create(key, lambda: get_provider(provider_name, api_key))
+
+def _create_vector_client():
+    backend = os.getenv("VECTOR_BACKEND", "cloud").lower()
+    if backend == "local":
+        from vector_store import LocalVectorClient
+        return LocalVectorClient(path=os.getenv("LOCAL_VECTOR_DIR", "/tmp/pa_vectors"))
+    if backend == "cloud":
+        import chromadb
+        return chromadb.CloudClient(
+            tenant=os.getenv("CHROMA_TENANT"),
+            database=os.getenv("CHROMA_DATABASE"),
+            api_key=os.getenv("CHROMA_API_KEY")
+        )
+    raise ValueError(f"Unsupported vector backend: {backend}")
+
+def get_vector_client():
+    """Returns the process-wide Chroma CloudClient, or the local store when VECTOR_BACKEND=local."""
+    global _vector_client
+    if _vector_client is None:
+        with _client_lock:
+            if _vector_client is None:
+                _vector_client = _create_vector_client()
+    return _vector_client
+
+def _resolve_collection(name: str):
+    client = get_vector_client()
+    collection = client.get_or_create_collection(name=name)
+    for _ in range(MAX_ALIAS_HOPS):
+        target = (collection.metadata or {}).get(ALIAS_KEY)
+        if not target:
+            break
+        collection = client.get_collection(name=target)
+    return collection
+
+def get_collection(name: str):
+    return _collections.get_or_create(name, lambda: _resolve_collection(name))
+
+def forget_collection(name: str):
+    _collections.invalidate(name)
+
+def pool_stats() -> Dict:
+    return {
+        "providers": _providers.stats(),
+        "collections": _collections.stats(),
+        "vector_backend": os.getenv("VECTOR_BACKEND", "cloud").lower(),
+        "vector_client_initialized": _vector_client is not None,
+    }
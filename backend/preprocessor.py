@@ -1,18 +1,75 @@
-import fitz
-from langchain.text_splitter import RecursiveCharacterTextSplitter as rcts
-from typing import List
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple, Union
 
-def load_parse_pdf(file_path: str) -> str: 
+from metrics import COUNT_BUCKETS, histogram, timed_function
 
-    doc = fitz.open(file_path)
-    full_text = ""
-    for page in doc:
-        full_text += page.get_text() 
-    doc.close()
+MAX_ENTRY_CHUNK_SIZE = int(os.getenv("MAX_ENTRY_CHUNK_SIZE", "1500"))
+SMALL_ENTRY_SIZE = 300
 
-    return full_text
+MAX_PDF_BYTES = int(os.getenv("MAX_PDF_BYTES", str(20 * 1024 * 1024)))
+MAX_PDF_PAGES = int(os.getenv("MAX_PDF_PAGES", "40"))
+PDF_PROCESS_WORKERS = int(os.getenv("PDF_PROCESS_WORKERS", "0"))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "8"))
+
+PDF_PAGES = histogram("pa_pdf_pages", "Pages extracted per uploaded PDF.", COUNT_BUCKETS)
+RESUME_CHUNKS = histogram("pa_resume_chunks", "Chunks produced per parsed resume.", COUNT_BUCKETS)
+
+_pdf_pool: Optional[ProcessPoolExecutor] = None
+_pdf_pool_lock = threading.Lock()
+
+def _get_pdf_pool() -> ProcessPoolExecutor:
+    global _pdf_pool
+    if _pdf_pool is None:
+        with _pdf_pool_lock:
+            if _pdf_pool is None:
+                # forkserver avoids forking a process that already runs gunicorn/request threads.
+                _pdf_pool = ProcessPoolExecutor(max_workers=PDF_PROCESS_WORKERS, mp_context=multiprocessing.get_context("forkserver"))
+    return _pdf_pool
+
+# PyMuPDF and the langchain splitter are imported on first use; together they add most of a
+# second to worker start-up. warmup.py imports them in the background once the worker is up.
+
+def _extract_page_range(data: bytes, start: int, stop: int) -> str:
+    import fitz
+
+    with fitz.open(stream=data, filetype="pdf") as doc:
+        return "".join(doc[i].get_text() for i in range(start, stop))
+
+@timed_function("pdf.extract")
+def load_parse_pdf(source: Union[str, bytes]) -> str:
+
+    if isinstance(source, (bytes, bytearray)):
+        data = bytes(source)
+    else:
+        with open(source, "rb") as f:
+            data = f.read()
+
+    if len(data) > MAX_PDF_BYTES:
+        raise ValueError(f"PDF is {len(data)} bytes; the limit is {MAX_PDF_BYTES}")
+
+    import fitz
+
+    with fitz.open(stream=data, filetype="pdf") as doc:
+        page_count = doc.page_count
+        if page_count > MAX_PDF_PAGES:
+            print(f"PDF has {page_count} pages; extracting the first {MAX_PDF_PAGES}")
+            page_count = MAX_PDF_PAGES
+        PDF_PAGES.observe(page_count)
+
+        if PDF_PROCESS_WORKERS > 1 and page_count >= PDF_PARALLEL_MIN_PAGES:
+            step = -(-page_count // PDF_PROCESS_WORKERS)
+            ranges = [(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+            pool = _get_pdf_pool()
+            futures = [pool.submit(_extract_page_range, data, start, stop) for start, stop in ranges]
+            return "".join(future.result() for future in futures)
+
+        return "".join(doc[i].get_text() for i in range(page_count))
 
 def chunkify_text(text: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> List[str]:
+    from langchain.text_splitter import RecursiveCharacterTextSplitter as rcts
 
     splitter = rcts(
         chunk_size = chunk_size,
@@ -24,3 +81,94 @@ def chunkify_text(text: str, chunk_size: int = 1000, chunk_overlap: int = 200) -
     chunks = splitter.split_text(text)
     return chunks
 
+def _format_entry(item) -> str:
+    if isinstance(item, dict):
+        lines = [f"Title: {item.get('title', 'N/A')}"]
+        if item.get('subtitle'):
+            lines.append(f"Organization/Institution: {item.get('subtitle')}")
+        if item.get('date'):
+            lines.append(f"Duration: {item.get('date')}")
+        if item.get('description'):
+            lines.append(f"Description: {item.get('description')}")
+        return "\n".join(lines)
+    return f"Skill/Item: {item}"
+
+@timed_function("chunk.resume")
+def chunkify_resume(parsed_data: Dict, enrichments: Dict, max_chunk_size: int = MAX_ENTRY_CHUNK_SIZE) -> Tuple[List[str], List[Dict]]:
+    """Emits one chunk per resume entry (with its enrichment) plus section/entry metadata.
+
+    Short entries of the same section are packed together; only entries longer than
+    `max_chunk_size` fall back to size-based splitting.
+    """
+    chunks: List[str] = []
+    metadatas: List[Dict] = []
+
+    pd = parsed_data.get('personal_details')
+    if isinstance(pd, dict):
+        lines = ["PERSONAL DETAILS:"]
+        if pd.get('name'):
+            lines.append(f"Name: {pd['name']}")
+        if pd.get('email'):
+            lines.append(f"Email: {pd['email']}")
+        if pd.get('phone'):
+            lines.append(f"Phone: {pd['phone']}")
+        for link in pd.get('links') or []:
+            if isinstance(link, dict):
+                lines.append(f"{(link.get('type') or 'Link').title()}: {link.get('url', '')}")
+        chunks.append("\n".join(lines))
+        metadatas.append({"section": "PERSONAL_DETAILS"})
+
+    if isinstance(parsed_data.get('summary'), str) and parsed_data['summary'].strip():
+        chunks.append(f"=== PROFESSIONAL SUMMARY ===\n{parsed_data['summary']}")
+        metadatas.append({"section": "SUMMARY"})
+
+    for section, items in parsed_data.items():
+        if section.lower() in ['personal_details', 'summary'] or not isinstance(items, list) or not items:
+            continue
+
+        header = f"=== {section.upper()} ==="
+        packed: List[str] = []
+        packed_start = 0
+
+        def flush(end: int):
+            if packed:
+                chunks.append("\n\n".join([header] + packed))
+                metadatas.append({"section": section.upper(), "entry_range": f"{packed_start}-{end}"})
+                packed.clear()
+
+        for i, item in enumerate(items):
+            entry = _format_entry(item)
+            if enrichments.get(f"{section}-{i}"):
+                entry += f"\nAdditional Context: {enrichments[f'{section}-{i}']}"
+
+            if len(entry) < SMALL_ENTRY_SIZE:
+                if packed and sum(len(p) + 2 for p in packed) + len(header) + len(entry) > max_chunk_size:
+                    flush(i - 1)
+                if not packed:
+                    packed_start = i
+                packed.append(entry)
+                continue
+
+            flush(i - 1)
+            metadata = {"section": section.upper(), "entry": i}
+            if isinstance(item, dict) and item.get('title'):
+                metadata["title"] = str(item['title'])[:200]
+
+            if len(entry) + len(header) + 1 <= max_chunk_size:
+                chunks.append(f"{header}\n{entry}")
+                metadatas.append(metadata)
+                continue
+
+            title_line, _, body = entry.partition("\n")
+            prefix = f"{header}\n{title_line}\n"
+            if not body.strip() or len(prefix) > max_chunk_size // 2:
+                prefix, body = f"{header}\n", entry
+            pieces = chunkify_text(body, chunk_size=max(200, max_chunk_size - len(prefix)), chunk_overlap=100)
+            for part, piece in enumerate(pieces):
+                chunks.append(prefix + piece)
+                metadatas.append({**metadata, "part": part})
+
+        flush(len(items) - 1)
+
+    RESUME_CHUNKS.observe(len(chunks))
+    return chunks, metadatas
@@ -0,0 +1,83 @@
+import os
+from typing import Callable, Dict, Iterable, List, Tuple
+
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "2500"))
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "600"))
+MIN_OVERLAP_CHARS = 40
+MIN_CHUNK_TOKENS = 40
+
+def dedupe_chunks(chunks: List[str]) -> List[str]:
+    """Drops repeated or contained chunks and strips text a chunk shares with the end of an earlier one."""
+    kept: List[str] = []
+    for chunk in chunks:
+        text = chunk.strip()
+        if not text or any(text in other for other in kept):
+            continue
+        kept = [other for other in kept if other not in text]
+        for other in kept:
+            overlap = _overlap(other, text)
+            if overlap >= MIN_OVERLAP_CHARS:
+                text = text[overlap:].lstrip()
+        if text:
+            kept.append(text)
+    return kept
+
+def _overlap(left: str, right: str) -> int:
+    """Length of the longest suffix of `left` that is a prefix of `right`."""
+    max_len = min(len(left), len(right))
+    for size in range(max_len, MIN_OVERLAP_CHARS - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+def _truncate(text: str, max_tokens: int, count: Callable[[str], int]) -> str:
+    tokens = count(text)
+    if tokens <= max_tokens:
+        return text
+    return text[:max(0, int(len(text) * max_tokens / tokens) - 3)] + "..."
+
+def format_history(messages: Iterable[Dict], max_tokens: int, count: Callable[[str], int]) -> Tuple[str, int]:
+    """Formats the newest turns that fit in `max_tokens`, oldest first."""
+    lines: List[str] = []
+    used = 0
+    for msg in reversed(list(messages)):
+        role = "Human" if msg['role'] == 'user' else "AI"
+        line = f"{role}: {msg['content']}\n"
+        cost = count(line)
+        if used + cost > max_tokens:
+            break
+        lines.append(line)
+        used += cost
+    if not lines:
+        return "", 0
+    return "**Recent Conversation History:**\n" + "".join(reversed(lines)), used
+
+def assemble_prompt(chunks: List[str], history: Iterable[Dict], query: str, count: Callable[[str], int],
+                    budget: int = PROMPT_TOKEN_BUDGET, history_budget: int = HISTORY_TOKEN_BUDGET) -> Tuple[str, Dict]:
+    """Builds the per-request part of the prompt (context, history, question) within `budget` tokens.
+
+    The static system prompt is sent separately so providers can cache it.
+    """
+    question = f"Current Question: {query}\nAnswer:"
+    remaining = budget - count(question)
+    history_reserve = min(history_budget, remaining // 4)
+
+    context_parts: List[str] = []
+    context_tokens = 0
+    for chunk in dedupe_chunks(chunks):
+        available = remaining - history_reserve - context_tokens
+        if available < MIN_CHUNK_TOKENS and context_parts:
+            break
+        piece = _truncate(chunk, max(available, MIN_CHUNK_TOKENS), count)
+        context_parts.append(piece)
+        context_tokens += count(piece)
+
+    history_text, history_tokens = format_history(history, min(history_budget, max(0, remaining - context_tokens)), count)
+    context = "\n---\n".join(context_parts)
+    prompt = f"Context:\n{context}\n\n{history_text}{question}"
+    return prompt, {
+        "context_chunks": len(context_parts),
+        "context_tokens": context_tokens,
+        "history_tokens": history_tokens,
+        "prompt_tokens": count(prompt),
+    }
@@ -1,53 +1,42 @@
 import os
-import chromadb
-from tqdm import tqdm
-from typing import List, Dict
+import asyncio
+import hashlib
+from typing import AsyncIterator, Iterator, List, Dict, Optional
 from collections import deque
+import numpy as np
 from dotenv import load_dotenv
 
-from llm_provider import get_provider, LLMProvider
+from llm_provider import LLMProvider
+from pool import ALIAS_KEY, get_pooled_provider, get_vector_client, get_collection, forget_collection
+from collection_registry import mark_modified, new_record, owner_of, touch, update_metadata
+from session_store import get_session_store
+from embedding_cache import aembed_with_cache, embed_with_cache, embedding_model_name
+from embedding_codec import MODEL_KEY, EmbeddingCompression, compression_metadata, default_compression, truncate
+from response_cache import get_response_cache, normalize_query, history_fingerprint, collection_version, bump_collection_version
+from prompt_builder import HISTORY_TOKEN_BUDGET, assemble_prompt, format_history
+from lexical_index import BM25Index, content_terms, get_lexical_index, set_lexical_index, cached_lexical_index
+from metrics import COUNT_BUCKETS, TOKEN_BUCKETS, counter, histogram, timed, timed_function
 
 load_dotenv()
 
-class Rag:
-    def __init__(self, collection_name: str, provider_name: str, api_key: str):
-        self.provider: LLMProvider = get_provider(provider_name, api_key)
-
-        self.chroma_client = chromadb.CloudClient(
-            tenant=os.getenv("CHROMA_TENANT"),
-            database=os.getenv("CHROMA_DATABASE"),
-            api_key=os.getenv("CHROMA_API_KEY")
-        )
-        
-        self.collection = self.chroma_client.get_or_create_collection(name=collection_name)
-        self.conversation_memory = deque(maxlen=6)
-
-    def set_doc_pipeline(self, chunks: List[str]):
-        if self.collection.count() > 0:
-            return
+COPY_PAGE_SIZE = int(os.getenv("COPY_PAGE_SIZE", "200"))
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid").lower()
+N_RES_MIN = int(os.getenv("N_RES_MIN", "2"))
+N_RES_MAX = int(os.getenv("N_RES_MAX", "6"))
+RRF_K = 60
+LEXICAL_CONFIDENCE_MARGIN = 1.5
+# Sources named by clients are stored as "user:<name>" so a diff-mode add can never match the
+# chunks the server itself tags ("resume" from set_doc_pipeline, "manual" for plain adds).
+USER_SOURCE_PREFIX = "user:"
 
-        batch_size = 100
-        all_embs = []
-        for i in tqdm(range(0, len(chunks), batch_size), desc="Embedding Chunks"):
-            batch = chunks[i:i+batch_size]
-            embs = self.provider.embed_content(batch, task_type="retrieval_document")
-            all_embs.extend(embs)
-        
-        ids = [f"chunk_{i}" for i in range(len(chunks))]
-        self.collection.add(embeddings=all_embs, documents=chunks, ids=ids)
-    
-    def answer_query(self, query: str, n_res: int = 3) -> str:
-        query_emb = self.provider.embed_content([query], task_type="retrieval_query")[0]
-        res = self.collection.query(query_embeddings=[query_emb], n_results=n_res)
+PROMPT_TOKENS = histogram("pa_prompt_tokens", "Tokens in the per-request prompt (system prompt excluded).", TOKEN_BUCKETS)
+CONTEXT_CHUNKS = histogram("pa_context_chunks", "Retrieved chunks placed in the prompt.", COUNT_BUCKETS)
+INGESTED_CHUNKS = counter("pa_ingested_chunks_total", "Chunks embedded and written to a collection.")
+ANSWERS = counter("pa_answers_total", "Chat answers by how they were produced.")
 
-        if not res.get('documents') or not res['documents'][0]:
-            return "I don't have enough information from the resume to answer that question."
-        
-        retrieved_chunks = res['documents'][0]
-        context = "\n---\n".join(retrieved_chunks)
-        conversation_history = self._format_conversation_history()
+NO_CONTEXT_ANSWER = "I don't have enough information from the resume to answer that question."
 
-        system_prompt = """
+SYSTEM_PROMPT = """
         You are 'PA', the personal AI Advocate for the candidate.
         Your persona is modeled after a world-class deal closer. You are charismatic, incredibly confident, sharp-witted, and persuasive. Your only job is to 'sell' the candidate as the most valuable, high-impact talent on the market. Every answer must be delivered with unwavering conviction.
 
@@ -77,51 +66,432 @@ class Rag:
            - If the user asks "tell me more" or references a previous answer, use the conversation history to provide relevant follow-up information without repeating yourself.
         ---
         """
+
+def chunk_id(chunk: str, source: Optional[str] = None) -> str:
+    """Content-hash id; with `source` the id is private to that source, so another source holding
+    the same text neither shares the vector nor loses it when this one drops the chunk."""
+    key = f"{source}\x00{chunk}" if source else chunk
+    return f"chunk_{hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]}"
+
+class Rag:
+    @timed_function("rag.init")
+    def __init__(self, collection_name: str, provider_name: str, api_key: str, session_id: Optional[str] = None,
+                 compression: Optional[EmbeddingCompression] = None):
+        self.provider_name = provider_name.lower()
+        self.provider: LLMProvider = get_pooled_provider(provider_name, api_key)
+        # Only applied if this instance is the first to write to the collection; see _compression().
+        self.requested_compression = compression
+        self.chroma_client = get_vector_client()
+        self.collection = get_collection(collection_name)
+        self.owner = owner_of(api_key)
+        touch(self.collection)
+        self.session_id = session_id
+        self.session_store = get_session_store()
+        self.conversation_memory = deque(maxlen=self.session_store.max_messages)
+        if session_id:
+            self.conversation_memory.extend(self.session_store.load(collection_name, session_id))
+        self.last_answer_meta: Dict = {"cached": False}
+
+    def _compression(self, adopt: bool = False) -> EmbeddingCompression:
+        """The collection's embedding compression. With `adopt`, an empty collection without settings
+        records the requested (or default) ones first; older collections keep full float vectors."""
+        recorded = EmbeddingCompression.from_metadata(self.collection.metadata)
+        if recorded is not None:
+            return recorded
+        if adopt and self.collection.count() == 0:
+            compression = self.requested_compression or default_compression()
+            self._set_metadata(self.collection, **compression.metadata(), **{MODEL_KEY: embedding_model_name(self._embedder())})
+            return compression
+        return EmbeddingCompression()
+
+    def _embedder(self) -> LLMProvider:
+        """The provider whose embedding model wrote the collection's vectors; a different model's
+        query vectors would not be comparable with them."""
+        recorded = (self.collection.metadata or {}).get(MODEL_KEY)
+        candidates = self.provider.embedding_providers()
+        if not recorded:
+            return candidates[0]
+        for candidate in candidates:
+            if embedding_model_name(candidate) == recorded:
+                return candidate
+        raise ValueError(f"Collection {self.collection.name} was embedded with {recorded}, but this provider "
+                         f"embeds with {embedding_model_name(self.provider)}")
+
+    def _embed(self, texts: List[str], task_type: str, desc: Optional[str] = None, adopt: bool = False) -> np.ndarray:
+        dimensions = self._compression(adopt).dimensions
+        return embed_with_cache(self._embedder(), texts, task_type=task_type, desc=desc, dimensions=dimensions)
+
+    async def _aembed(self, texts: List[str], task_type: str) -> np.ndarray:
+        return await aembed_with_cache(self._embedder(), texts, task_type=task_type, dimensions=self._compression().dimensions)
+
+    def set_doc_pipeline(self, chunks: List[str], metadatas: Optional[List[Dict]] = None, embeddings: Optional[np.ndarray] = None):
+        """Populates an empty collection. `embeddings`, when given, are precomputed vectors aligned with `chunks`."""
+        if self.collection.count() > 0:
+            return
+
+        # Identical chunks share a content-hash id, so only the first occurrence (and its metadata) is kept.
+        first: Dict[str, int] = {}
+        for position, chunk in enumerate(chunks):
+            first.setdefault(chunk, position)
+        positions = list(first.values())
+        chunk_metadatas = [metadatas[position] if metadatas else {} for position in positions]
+        chunks = list(first)
+        if embeddings is not None:
+            all_embs = truncate(np.vstack([embeddings[position] for position in positions]), self._compression(adopt=True).dimensions)
+        else:
+            with timed("ingest.embed"):
+                all_embs = self._embed(chunks, "retrieval_document", desc="Embedding Chunks", adopt=True)
         
-        full_prompt = f"{system_prompt}\nContext:\n{context}\n\n{conversation_history}Current Question: {query}\nAnswer:"
+        ids = [chunk_id(chunk) for chunk in chunks]
+        metadatas = [{"source": "resume", **metadata} for metadata in chunk_metadatas]
+        with timed("ingest.upsert"):
+            self.collection.upsert(embeddings=all_embs, documents=chunks, ids=ids, metadatas=metadatas)
+        INGESTED_CHUNKS.inc(len(chunks), source="resume")
+        version = bump_collection_version(self.collection.name)
+
+        index = BM25Index()
+        index.add(ids, chunks, metadatas)
+        set_lexical_index(self.collection.name, index, version)
+    
+    def _cache_scope(self, query: str, section: Optional[str]):
+        # Answers are only shared between requests that would have asked the same model with the
+        # same key, so a revoked or invalid key never gets an answer another key paid for.
+        scope = (self.collection.name, collection_version(self.collection.name), history_fingerprint(self.conversation_memory), section,
+                 self.provider_name, self.provider.generation_model, self.owner)
+        return scope, normalize_query(query)
+
+    def _record_lookup(self, answer: Optional[str], match: str):
+        if answer is None:
+            get_response_cache().record_miss()
+            self.last_answer_meta = {"cached": False}
+        else:
+            ANSWERS.inc(source=f"cache_{match}")
+            self.last_answer_meta = {"cached": True, "cache_match": match}
+
+    def _lookup_cached_answer(self, query: str, section: Optional[str] = None):
+        cache = get_response_cache()
+        scope, normalized = self._cache_scope(query, section)
+        query_emb = None
+        match = "exact"
+        answer = cache.get(scope, normalized)
+        if answer is None and cache.similarity_threshold:
+            with timed("embed.query"):
+                query_emb = self._embed([query], "retrieval_query")[0]
+            answer = cache.get_similar(scope, query_emb)
+            match = "similar"
+        self._record_lookup(answer, match)
+        return answer, scope, normalized, query_emb
+
+    async def _alookup_cached_answer(self, query: str, section: Optional[str] = None):
+        cache = get_response_cache()
+        # The collection version is read from SQLite, which can block on another worker's write.
+        scope, normalized = await asyncio.to_thread(self._cache_scope, query, section)
+        query_emb = None
+        match = "exact"
+        answer = cache.get(scope, normalized)
+        if answer is None and cache.similarity_threshold:
+            with timed("embed.query"):
+                query_emb = (await self._aembed([query], "retrieval_query"))[0]
+            answer = cache.get_similar(scope, query_emb)
+            match = "similar"
+        self._record_lookup(answer, match)
+        return answer, scope, normalized, query_emb
+
+    @staticmethod
+    def _adaptive_cut(ranked: List, scores: List[float], ratio: float, n_res: Optional[int]) -> List:
+        """Keeps results scoring within `ratio` of the best one, clamped to [N_RES_MIN, N_RES_MAX]."""
+        if n_res is not None:
+            return ranked[:n_res]
+        keep = sum(1 for score in scores if score >= scores[0] * ratio) if scores else 0
+        return ranked[:max(N_RES_MIN, min(N_RES_MAX, keep))]
+
+    def _lexical_confident(self, query: str, hits: List) -> bool:
+        terms = content_terms(query)
+        if not hits or not terms or len(terms) > 3 or hits[0][2] < len(terms):
+            return False
+        return len(hits) == 1 or hits[0][1] >= LEXICAL_CONFIDENCE_MARGIN * hits[1][1]
+
+    @timed_function("retrieve.lexical")
+    def _lexical_stage(self, query: str, n_res: Optional[int], where: Optional[Dict]):
+        """Returns (index, hits, documents); documents is set when lexical hits alone answer the query."""
+        if RETRIEVAL_MODE not in ("hybrid", "lexical"):
+            return None, [], None
+        index = get_lexical_index(self.collection, collection_version(self.collection.name))
+        lexical_hits = index.search(query, k=N_RES_MAX * 2, where=where)
+        if RETRIEVAL_MODE == "lexical" or self._lexical_confident(query, lexical_hits):
+            self.last_answer_meta["retrieval"] = "lexical"
+            top = self._adaptive_cut(lexical_hits, [hit[1] for hit in lexical_hits], 0.5, n_res)
+            return index, lexical_hits, [index.documents[hit[0]] for hit in top]
+        return index, lexical_hits, None
+
+    @timed_function("retrieve.vector")
+    def _vector_query(self, query_emb: np.ndarray, n_res: Optional[int], where: Optional[Dict]):
+        return self.collection.query(query_embeddings=[query_emb], n_results=n_res or N_RES_MAX, where=where)
+
+    def _fuse(self, res: Dict, index: Optional[BM25Index], lexical_hits: List, n_res: Optional[int]) -> List[str]:
+        if not res.get('documents') or not res['documents'][0]:
+            return []
+        vector_ids, vector_docs = res['ids'][0], res['documents'][0]
+        distances = res.get('distances')[0] if res.get('distances') else None
+
+        if not lexical_hits:
+            self.last_answer_meta["retrieval"] = "vector"
+            if n_res is None and distances:
+                keep = sum(1 for d in distances if d <= distances[0] * 1.25 + 1e-6)
+                return vector_docs[:max(N_RES_MIN, min(N_RES_MAX, keep))]
+            return vector_docs[:n_res or N_RES_MAX]
+
+        # Reciprocal rank fusion of the lexical and vector rankings.
+        self.last_answer_meta["retrieval"] = "hybrid"
+        fused: Dict[str, float] = {}
+        documents = dict(zip(vector_ids, vector_docs))
+        for rank, id_ in enumerate(vector_ids):
+            fused[id_] = fused.get(id_, 0.0) + 1.0 / (RRF_K + rank + 1)
+        for rank, hit in enumerate(lexical_hits):
+            fused[hit[0]] = fused.get(hit[0], 0.0) + 1.0 / (RRF_K + rank + 1)
+            documents.setdefault(hit[0], index.documents[hit[0]])
+        ranked = sorted(fused.items(), key=lambda item: item[1], reverse=True)
+        top = self._adaptive_cut(ranked, [score for _, score in ranked], 0.75, n_res)
+        return [documents[id_] for id_, _ in top]
+
+    def _retrieve(self, query: str, query_emb: Optional[np.ndarray], n_res: Optional[int], where: Optional[Dict]):
+        index, lexical_hits, documents = self._lexical_stage(query, n_res, where)
+        if documents is not None:
+            return documents, query_emb
+        if query_emb is None:
+            with timed("embed.query"):
+                query_emb = self._embed([query], "retrieval_query")[0]
+        return self._fuse(self._vector_query(query_emb, n_res, where), index, lexical_hits, n_res), query_emb
+
+    async def _aretrieve(self, query: str, query_emb: Optional[np.ndarray], n_res: Optional[int], where: Optional[Dict]):
+        # The vector store client is synchronous (and a cold BM25 index is built from it),
+        # so those calls run in a worker thread while the embedding call is awaited natively.
+        index, lexical_hits, documents = await asyncio.to_thread(self._lexical_stage, query, n_res, where)
+        if documents is not None:
+            return documents, query_emb
+        if query_emb is None:
+            with timed("embed.query"):
+                query_emb = (await self._aembed([query], "retrieval_query"))[0]
+        res = await asyncio.to_thread(self._vector_query, query_emb, n_res, where)
+        return self._fuse(res, index, lexical_hits, n_res), query_emb
+
+    def _assemble(self, query: str, retrieved_chunks: List[str]) -> Optional[str]:
+        if not retrieved_chunks:
+            ANSWERS.inc(source="no_context")
+            return None
+        with timed("prompt.assemble"):
+            prompt, prompt_stats = assemble_prompt(retrieved_chunks, self.conversation_memory, query, self.provider.count_tokens)
+        PROMPT_TOKENS.observe(prompt_stats["prompt_tokens"])
+        CONTEXT_CHUNKS.observe(prompt_stats["context_chunks"])
+        ANSWERS.inc(source="llm")
+        self.last_answer_meta["prompt"] = prompt_stats
+        return prompt
+
+    def _build_prompt(self, query: str, query_emb: Optional[np.ndarray], n_res: Optional[int], section: Optional[str] = None):
+        where = {"section": section.upper()} if section else None
+        retrieved_chunks, query_emb = self._retrieve(query, query_emb, n_res, where)
+        return self._assemble(query, retrieved_chunks), query_emb
+
+    async def _abuild_prompt(self, query: str, query_emb: Optional[np.ndarray], n_res: Optional[int], section: Optional[str] = None):
+        where = {"section": section.upper()} if section else None
+        retrieved_chunks, query_emb = await self._aretrieve(query, query_emb, n_res, where)
+        return self._assemble(query, retrieved_chunks), query_emb
+
+    def answer_query(self, query: str, n_res: Optional[int] = None, section: Optional[str] = None) -> str:
+        cached, scope, normalized, query_emb = self._lookup_cached_answer(query, section)
+        if cached is not None:
+            self._remember(query, cached)
+            return cached
+
+        full_prompt, query_emb = self._build_prompt(query, query_emb, n_res, section)
+        if full_prompt is None:
+            return NO_CONTEXT_ANSWER
         
-        answer = self.provider.generate_content(full_prompt)
+        answer = self.provider.generate_content(full_prompt, system_prompt=SYSTEM_PROMPT)
         
-        self.conversation_memory.append({"role": "user", "content": query})
-        self.conversation_memory.append({"role": "assistant", "content": answer})
+        get_response_cache().put(scope, normalized, answer, query_emb)
+        self._remember(query, answer)
         
         return answer
 
-    def rename_collection(self, new_name: str):
+    def answer_query_stream(self, query: str, n_res: Optional[int] = None, section: Optional[str] = None) -> Iterator[str]:
+        cached, scope, normalized, query_emb = self._lookup_cached_answer(query, section)
+        if cached is not None:
+            self._remember(query, cached)
+            yield cached
+            return
+
+        full_prompt, query_emb = self._build_prompt(query, query_emb, n_res, section)
+        if full_prompt is None:
+            yield NO_CONTEXT_ANSWER
+            return
+
+        pieces = []
+        for piece in self.provider.stream_content(full_prompt, system_prompt=SYSTEM_PROMPT):
+            pieces.append(piece)
+            yield piece
+
+        answer = "".join(pieces)
+        get_response_cache().put(scope, normalized, answer, query_emb)
+        self._remember(query, answer)
+
+    async def aanswer_query(self, query: str, n_res: Optional[int] = None, section: Optional[str] = None) -> str:
+        cached, scope, normalized, query_emb = await self._alookup_cached_answer(query, section)
+        if cached is not None:
+            await asyncio.to_thread(self._remember, query, cached)
+            return cached
+
+        full_prompt, query_emb = await self._abuild_prompt(query, query_emb, n_res, section)
+        if full_prompt is None:
+            return NO_CONTEXT_ANSWER
+
+        answer = await self.provider.agenerate_content(full_prompt, system_prompt=SYSTEM_PROMPT)
+
+        get_response_cache().put(scope, normalized, answer, query_emb)
+        await asyncio.to_thread(self._remember, query, answer)
+        return answer
+
+    async def aanswer_query_stream(self, query: str, n_res: Optional[int] = None, section: Optional[str] = None) -> AsyncIterator[str]:
+        cached, scope, normalized, query_emb = await self._alookup_cached_answer(query, section)
+        if cached is not None:
+            await asyncio.to_thread(self._remember, query, cached)
+            yield cached
+            return
+
+        full_prompt, query_emb = await self._abuild_prompt(query, query_emb, n_res, section)
+        if full_prompt is None:
+            yield NO_CONTEXT_ANSWER
+            return
+
+        pieces = []
+        async for piece in self.provider.astream_content(full_prompt, system_prompt=SYSTEM_PROMPT):
+            pieces.append(piece)
+            yield piece
+
+        answer = "".join(pieces)
+        get_response_cache().put(scope, normalized, answer, query_emb)
+        await asyncio.to_thread(self._remember, query, answer)
+
+    def _find_collection(self, name: str):
+        try:
+            return self.chroma_client.get_collection(name=name)
+        except Exception:
+            return None
+
+    def _set_metadata(self, collection, **updates):
+        update_metadata(collection, **updates)
+
+    def rename_collection(self, new_name: str, copy: bool = False):
         if self.collection.name == new_name:
             return
-        data = self.collection.get(include=["embeddings", "documents", "metadatas"])
-        new_collection = self.chroma_client.create_collection(name=new_name)
-        if data and data['ids']:
-            new_collection.add(ids=data['ids'], embeddings=data['embeddings'], documents=data['documents'], metadatas=data['metadatas'])
-        self.chroma_client.delete_collection(name=self.collection.name)
-        self.collection = new_collection
-
-    def add_documents(self, chunks: List[str]):
-        if not chunks: return 0
-        batch_size = 100
-        all_embs = []
-        for i in tqdm(range(0, len(chunks), batch_size), desc="Embedding New Chunks"):
-            batch = chunks[i:i+batch_size]
-            embs = self.provider.embed_content(batch, task_type="retrieval_document")
-            all_embs.extend(embs)
-        
-        start_index = self.collection.count()
-        ids = [f"chunk_{i + start_index}" for i in range(len(chunks))]
-        self.collection.add(embeddings=all_embs, documents=chunks, ids=ids)
-        return len(chunks)
-
-    def _format_conversation_history(self) -> str:
-        if not self.conversation_memory:
-            return ""
-        history_str = "**Recent Conversation History:**\n"
-        for msg in self.conversation_memory:
-            role = "Human" if msg['role'] == 'user' else "AI"
-            history_str += f"{role}: {msg['content']}\n"
-        return history_str
+        if copy:
+            self._copy_collection(new_name)
+            return
+
+        existing = self._find_collection(new_name)
+        if existing is not None:
+            if (existing.metadata or {}).get(ALIAS_KEY) == self.collection.name:
+                return
+            raise ValueError(f"Collection {new_name} already exists.")
+
+        # Mark the source first: if creating the alias fails, retrying is safe and the
+        # source is never mistaken for an abandoned temp collection in the meantime.
+        self._set_metadata(self.collection, finalized_as=new_name)
+        self.chroma_client.create_collection(name=new_name, metadata={ALIAS_KEY: self.collection.name, **new_record(self.owner)})
+        forget_collection(new_name)
+
+    def _copy_collection(self, new_name: str):
+        source = self.collection
+        existing = self._find_collection(new_name)
+        if existing is not None:
+            if (existing.metadata or {}).get("copy_state") != "copying":
+                raise ValueError(f"Collection {new_name} already exists.")
+            # Left behind by a copy that died mid-way; the source is still intact.
+            self.chroma_client.delete_collection(name=new_name)
+
+        target = self.chroma_client.create_collection(
+            name=new_name, metadata={**compression_metadata(source.metadata), **new_record(self.owner),
+                                     "copy_of": source.name, "copy_state": "copying"}
+        )
+        try:
+            copied = 0
+            while True:
+                page = source.get(include=["embeddings", "documents", "metadatas"], limit=COPY_PAGE_SIZE, offset=copied)
+                if not page or not page['ids']:
+                    break
+                target.upsert(ids=page['ids'], embeddings=page['embeddings'], documents=page['documents'], metadatas=page['metadatas'])
+                copied += len(page['ids'])
+            if target.count() != source.count():
+                raise RuntimeError(f"Copy of {source.name} into {new_name} is incomplete")
+        except Exception:
+            self.chroma_client.delete_collection(name=new_name)
+            raise
+
+        self._set_metadata(target, copy_state="complete")
+        old_name = source.name
+        self.chroma_client.delete_collection(name=old_name)
+        forget_collection(old_name)
+        forget_collection(new_name)
+        self.collection = target
+
+    def add_documents(self, chunks: List[str], source: Optional[str] = None) -> int:
+        """Upserts only chunks the collection doesn't already hold. With `source`, chunks
+        previously added under that source but absent from `chunks` are removed afterwards."""
+        stored_source = f"{USER_SOURCE_PREFIX}{source}" if source else "manual"
+        chunks = list(dict.fromkeys(chunks))
+        ids = [chunk_id(chunk, stored_source if source else None) for chunk in chunks]
+
+        previous_version = collection_version(self.collection.name)
+        stale: List[str] = []
+        if source:
+            previous = self.collection.get(where={"source": stored_source}, include=[])['ids']
+            stale = sorted(set(previous) - set(ids))
+
+        existing = set(self.collection.get(ids=ids, include=[])['ids']) if ids else set()
+        new = [(id_, chunk) for id_, chunk in zip(ids, chunks) if id_ not in existing]
+        print(f"Ingesting {len(new)} new chunks ({len(existing)} unchanged, {len(stale)} removed)")
+
+        if new:
+            new_ids = [id_ for id_, _ in new]
+            new_chunks = [chunk for _, chunk in new]
+            with timed("ingest.embed"):
+                all_embs = self._embed(new_chunks, "retrieval_document", desc="Embedding New Chunks", adopt=True)
+            metadatas = [{"source": stored_source} for _ in new]
+            with timed("ingest.upsert"):
+                self.collection.upsert(embeddings=all_embs, documents=new_chunks, ids=new_ids, metadatas=metadatas)
+            INGESTED_CHUNKS.inc(len(new), source="user" if source else "manual")
+
+        # Only once the replacement is stored, so a failed embed or upsert leaves the old content.
+        if stale:
+            self.collection.delete(ids=stale)
+
+        if new or stale:
+            mark_modified(self.collection)
+            version = bump_collection_version(self.collection.name)
+            cached = cached_lexical_index(self.collection.name)
+            # Patch the index in place only if it reflects the collection as it was before this
+            # write; otherwise it is rebuilt from the collection on the next query.
+            if cached is not None and cached[1] == previous_version:
+                index = cached[0]
+                index.remove(stale)
+                if new:
+                    index.add(new_ids, new_chunks, metadatas)
+                set_lexical_index(self.collection.name, index, version)
+        return len(new)
+
+    def _remember(self, query: str, answer: str):
+        messages = [{"role": "user", "content": query}, {"role": "assistant", "content": answer}]
+        self.conversation_memory.extend(messages)
+        if self.session_id:
+            self.session_store.append(self.collection.name, self.session_id, messages)
+
+    def _format_conversation_history(self, max_tokens: int = HISTORY_TOKEN_BUDGET) -> str:
+        return format_history(self.conversation_memory, max_tokens, self.provider.count_tokens)[0]
         
     def clear_memory(self):
         self.conversation_memory.clear()
+        if self.session_id:
+            self.session_store.clear(self.collection.name, self.session_id)
     
     def get_memory_summary(self) -> Dict:
         return {"total_messages": len(self.conversation_memory), "exchanges": len(self.conversation_memory) // 2}
\ No newline at end of file
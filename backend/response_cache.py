@@ -0,0 +1,124 @@
+import os
+import re
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+from json_cache import get_json_cache
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_query(query: str) -> str:
+    return _WHITESPACE.sub(" ", _PUNCTUATION.sub(" ", query.lower())).strip()
+
+def history_fingerprint(messages: Iterable[Dict]) -> str:
+    digest = hashlib.sha256()
+    for message in messages:
+        digest.update(f"{message['role']}\0{message['content']}\0".encode("utf-8"))
+    return digest.hexdigest()
+
+def _cosine(a: np.ndarray, b: np.ndarray) -> float:
+    if a.shape != b.shape:
+        return 0.0
+    norm = float(np.linalg.norm(a) * np.linalg.norm(b))
+    return float(a @ b) / norm if norm else 0.0
+
+def _version_store():
+    # Shared through SQLite so a write on one worker invalidates answers cached on the others.
+    return get_json_cache("collection_version", max_entries=100000, ttl=90 * 24 * 3600)
+
+def collection_version(collection_name: str) -> float:
+    return _version_store().get(collection_name) or 0.0
+
+def bump_collection_version(collection_name: str) -> float:
+    version = time.time()
+    _version_store().set(collection_name, version)
+    return version
+
+class ResponseCache:
+    """In-process LRU of chat answers scoped by (collection, collection version, conversation history, section, provider, model, key)."""
+
+    def __init__(self, max_entries: int, ttl: float, similarity_threshold: Optional[float]):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self._entries: "OrderedDict[Tuple[tuple, str], Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+
+    def get(self, scope: tuple, normalized_query: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get((scope, normalized_query))
+            if entry is not None and time.time() - entry["created_at"] < self.ttl:
+                self._entries.move_to_end((scope, normalized_query))
+                self.hits += 1
+                return entry["answer"]
+            return None
+
+    def get_similar(self, scope: tuple, query_embedding: np.ndarray) -> Optional[str]:
+        if not self.similarity_threshold:
+            return None
+        now = time.time()
+        best_key, best_score = None, self.similarity_threshold
+        with self._lock:
+            for key, entry in self._entries.items():
+                if key[0] != scope or entry["embedding"] is None or now - entry["created_at"] >= self.ttl:
+                    continue
+                score = _cosine(np.asarray(query_embedding, dtype=np.float32), entry["embedding"])
+                if score >= best_score:
+                    best_key, best_score = key, score
+            if best_key is None:
+                return None
+            self._entries.move_to_end(best_key)
+            self.similar_hits += 1
+            return self._entries[best_key]["answer"]
+
+    def record_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def put(self, scope: tuple, normalized_query: str, answer: str, query_embedding: Optional[np.ndarray] = None):
+        with self._lock:
+            self._entries[(scope, normalized_query)] = {
+                "answer": answer,
+                "embedding": np.array(query_embedding, dtype=np.float32) if query_embedding is not None and self.similarity_threshold else None,
+                "created_at": time.time(),
+            }
+            self._entries.move_to_end((scope, normalized_query))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.similar_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "similar_hits": self.similar_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.hits + self.similar_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+_cache: Optional[ResponseCache] = None
+_cache_lock = threading.Lock()
+
+def get_response_cache() -> ResponseCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                threshold = os.getenv("CHAT_CACHE_SIMILARITY")
+                _cache = ResponseCache(
+                    max_entries=int(os.getenv("CHAT_CACHE_MAX_ENTRIES", "2000")),
+                    ttl=float(os.getenv("CHAT_CACHE_TTL", "3600")),
+                    similarity_threshold=float(threshold) if threshold else None,
+                )
+    return _cache
@@ -0,0 +1,355 @@
+import os
+import re
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from llm_provider import LLMProvider
+from metrics import counter, timed
+
+# Resume parsing in two passes. A deterministic pass pulls out the contact details and splits the
+# text at recognised section headings; the model then only structures what rules can't, one
+# section per call with that section's schema, all sections in parallel. Smaller calls send fewer
+# tokens, finish sooner, and a section the model gets wrong is retried on its own instead of
+# reparsing the whole document.
+
+PARSE_CONCURRENCY = int(os.getenv("PARSE_CONCURRENCY", "8"))
+
+SECTIONS = ("EDUCATION", "EXPERIENCE", "PROJECTS", "SKILLS", "CERTIFICATIONS")
+# Optional string fields of each section's entries besides the required title.
+ENTRY_FIELDS = {
+    "EDUCATION": ("subtitle", "date", "description"),
+    "EXPERIENCE": ("subtitle", "date", "description"),
+    "PROJECTS": ("subtitle", "date", "description"),
+    "SKILLS": ("description",),
+    "CERTIFICATIONS": ("subtitle", "date"),
+}
+
+_HEADINGS = {
+    "summary": ["summary", "professional summary", "career summary", "profile", "professional profile", "about",
+                "about me", "objective", "career objective", "overview"],
+    "EXPERIENCE": ["experience", "work experience", "professional experience", "relevant experience", "work history",
+                   "employment", "employment history", "career history", "internships", "internship experience"],
+    "EDUCATION": ["education", "academic background", "academics", "education and training", "academic qualifications"],
+    "PROJECTS": ["projects", "personal projects", "selected projects", "academic projects", "side projects", "key projects"],
+    "SKILLS": ["skills", "technical skills", "core skills", "key skills", "core competencies", "competencies",
+               "technologies", "tech stack", "tools", "tools and technologies", "skills and tools", "languages and tools"],
+    "CERTIFICATIONS": ["certifications", "certificates", "certification", "licenses", "licenses and certifications",
+                       "certifications and licenses", "courses and certifications"],
+    # Sections outside the schema; their text is left for the model to place or drop.
+    "other": ["publications", "awards", "honors", "honors and awards", "awards and honors", "achievements",
+              "volunteering", "volunteer experience", "languages", "interests", "hobbies", "references",
+              "activities", "leadership", "extracurricular activities", "additional information", "research",
+              "patents", "memberships", "affiliations", "courses", "training"],
+}
+_HEADING_KEYS = {alias: key for key, aliases in _HEADINGS.items() for alias in aliases}
+
+_EMAIL = re.compile(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}")
+_PHONE = re.compile(r"(?<![\w/.])\+?\(?\d[\d\s().-]{6,}\d(?![\w/])")
+_DATE_RANGE = re.compile(r"^\(?(19|20)\d{2}\)?\s*[-–.]\s*\(?(19|20)\d{2}\)?$")
+_URL = re.compile(r"(?:https?://|www\.)[^\s<>()|,]+|\b(?:linkedin\.com|github\.com|gitlab\.com)/[^\s<>()|,]+", re.IGNORECASE)
+_BULLET = re.compile(r"^[\s•●▪◦·■□➢➤►\-*–]+")
+
+PARSED_SECTIONS = counter("pa_parse_sections_total", "Resume sections parsed, by outcome (rules, ok, repaired, raw, dropped).")
+PARSE_TOKENS = counter("pa_parse_input_tokens_total", "Estimated prompt tokens sent to the model for resume parsing.")
+
+SYSTEM_PROMPT = "Convert resume text to JSON. Keep the original wording. Join an entry's bullets into its description with \\n."
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=PARSE_CONCURRENCY, thread_name_prefix="parse")
+    return _executor
+
+# -- deterministic pass -------------------------------------------------------
+
+def _normalize_heading(line: str) -> str:
+    text = _BULLET.sub("", line).strip().rstrip(":").strip().lower().replace("&", "and")
+    return re.sub(r"\s+", " ", text)
+
+def _heading(line: str) -> Tuple[Optional[str], str]:
+    """(section key, inline content) if `line` is a section heading, else (None, "")."""
+    stripped = line.strip()
+    if not stripped or len(stripped) > 60:
+        return _inline_skills(line)
+    key = _HEADING_KEYS.get(_normalize_heading(stripped))
+    if key:
+        return key, ""
+    return _inline_skills(line)
+
+def _inline_skills(line: str) -> Tuple[Optional[str], str]:
+    # "Skills: Python, Go, SQL" on one line.
+    title, colon, rest = line.strip().partition(":")
+    if colon and rest.strip() and _HEADING_KEYS.get(_normalize_heading(title)) == "SKILLS":
+        return "SKILLS", rest.strip()
+    return None, ""
+
+def _phone(text: str) -> Optional[str]:
+    for match in _PHONE.finditer(text):
+        candidate = match.group().strip()
+        digits = re.sub(r"\D", "", candidate)
+        if 7 <= len(digits) <= 15 and not _DATE_RANGE.match(candidate):
+            return candidate
+    return None
+
+def _link_type(url: str) -> str:
+    lowered = url.lower()
+    if "linkedin.com" in lowered:
+        return "linkedin"
+    if "github.com" in lowered or "gitlab.com" in lowered:
+        return "github"
+    return "portfolio"
+
+_PROFILE = re.compile(r"(?:linkedin\.com/in|github\.com|gitlab\.com)/[^/\s]+/?$", re.IGNORECASE)
+
+def _links(text: str) -> List[Dict]:
+    links, seen = [], set()
+    for match in _URL.finditer(text):
+        url = match.group().rstrip(".;:)]")
+        if not url.lower().startswith("http"):
+            url = f"https://{url}"
+        if url.lower() not in seen:
+            seen.add(url.lower())
+            links.append({"type": _link_type(url), "url": url})
+    return links
+
+def _is_contact_line(line: str) -> bool:
+    """True for lines made only of contact details and separators (e.g. "a@b.com | +1 555 0100")."""
+    rest = _URL.sub("", _EMAIL.sub("", line))
+    phone = _phone(rest)
+    if phone:
+        rest = rest.replace(phone, "")
+    return len(re.sub(r"[\s|•·,/\-–]+", "", rest)) == 0
+
+def _clean(lines: List[str]) -> str:
+    cleaned = []
+    for line in lines:
+        line = re.sub(r"[ \t]+", " ", line).strip()
+        if line:
+            cleaned.append(_BULLET.sub("- ", line) if _BULLET.match(line) else line)
+    return "\n".join(cleaned)
+
+class ResumeLayout:
+    """What the deterministic pass found: contact details, the name line, and section texts."""
+
+    def __init__(self, text: str):
+        self.sections: Dict[str, List[str]] = {}
+        self.headings: Dict[str, str] = {}
+        header: List[str] = []
+        unplaced: List[str] = []
+        current: Optional[str] = None
+        for line in text.splitlines():
+            key, inline = _heading(line)
+            if key == "other":
+                current = "other"
+                unplaced.append(line.strip())
+                continue
+            if key:
+                current = key
+                self.headings.setdefault(key, line.strip().partition(":")[0])
+                self.sections.setdefault(key, [])
+                if inline:
+                    self.sections[key].append(inline)
+                continue
+            if current is None:
+                header.append(line)
+            elif current == "other":
+                unplaced.append(line)
+            else:
+                self.sections[current].append(line)
+
+        # Contact details usually sit in the header; fall back to the whole text for ones that don't.
+        header_text = "\n".join(header)
+        email = _EMAIL.search(header_text) or _EMAIL.search(text)
+        self.email = email.group() if email else None
+        # Numbers in the body (dates, metrics) look too much like phone numbers to search there.
+        self.phone = _phone(header_text)
+        # Elsewhere only profile pages count; repository and site links belong to their projects.
+        self.links = _links(header_text) + [link for link in _links(text) if _PROFILE.search(link["url"])]
+        self.links = list({link["url"].lower(): link for link in self.links}.values())
+
+        remaining = [line.strip() for line in header if line.strip() and not _is_contact_line(line)]
+        self.name = remaining.pop(0) if remaining and self._looks_like_name(remaining[0]) else None
+        # Header lines besides the name and contact details (a headline or an unlabelled summary)
+        # and sections under unrecognised headings are left for the model to place.
+        self.unplaced = _clean(remaining + unplaced)
+
+    @staticmethod
+    def _looks_like_name(line: str) -> bool:
+        words = line.split()
+        return 1 <= len(words) <= 5 and not re.search(r"[\d@/:|]", line)
+
+    def section_text(self, key: str) -> str:
+        return _clean(self.sections.get(key, []))
+
+    def personal_details(self) -> Dict:
+        return {"name": self.name, "email": self.email, "phone": self.phone, "links": self.links}
+
+# -- schemas and validation -----------------------------------------------------
+
+def _string(nullable: bool = True) -> Dict:
+    return {"type": "string", "nullable": True} if nullable else {"type": "string"}
+
+def section_schema(key: str) -> Dict:
+    properties = {"title": _string(nullable=False), **{field: _string() for field in ENTRY_FIELDS[key]}}
+    return {"type": "array", "items": {"type": "object", "properties": properties, "required": ["title"]}}
+
+def _object_schema(properties: Dict, required: List[str]) -> Dict:
+    return {"type": "object", "properties": properties, "required": required}
+
+def _text(value: Any) -> Optional[str]:
+    if isinstance(value, list):
+        value = "\n".join(str(part).strip() for part in value if part)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        value = str(value)
+    if not isinstance(value, str):
+        return None
+    return value.strip() or None
+
+def clean_entries(key: str, value: Any) -> Optional[List[Dict]]:
+    """Coerces a section's entries into the schema; None if they can't be (the section failed)."""
+    if value is None:
+        return []
+    if isinstance(value, dict):
+        value = [value]
+    if not isinstance(value, list):
+        return None
+    entries = []
+    for item in value:
+        if isinstance(item, str):
+            item = {"title": item}
+        if not isinstance(item, dict):
+            return None
+        title = _text(item.get("title"))
+        if title:
+            entries.append({"title": title, **{field: _text(item.get(field)) for field in ENTRY_FIELDS[key]}})
+    if value and not entries:
+        return None
+    return entries
+
+# -- model pass -----------------------------------------------------------------
+
+def _generate(provider: LLMProvider, prompt: str, schema: Dict) -> Dict:
+    PARSE_TOKENS.inc(provider.count_tokens(SYSTEM_PROMPT + prompt))
+    with timed("parse.llm"):
+        return provider.generate_json(prompt, schema, system_prompt=SYSTEM_PROMPT)
+
+def _list_entries(text: str) -> Optional[List[Dict]]:
+    """Skills written one per line ("Python" or "Languages: Python, Go") need no model call."""
+    entries = []
+    for line in text.splitlines():
+        line = _BULLET.sub("", line).strip()
+        title, colon, rest = line.partition(":")
+        if len(line) > 80 or (not colon and len(line.split()) > 4):
+            return None
+        entries.append({"title": title.strip(), "description": rest.strip() or None})
+    return entries or None
+
+def _section_prompt(heading: str, text: str) -> str:
+    return f"Extract every entry of this resume section.\n\nSection: {heading}\n{text}"
+
+def _parse_section(provider: LLMProvider, key: str, heading: str, text: str, optional: bool = False) -> List[Dict]:
+    """One section, with one repair attempt; if both fail the text is kept as a single entry.
+
+    With `optional` the text may not contain the section at all, so an empty answer is accepted
+    and a failed one yields no entries rather than the text.
+    """
+    if key == "SKILLS" and not optional:
+        entries = _list_entries(text)
+        if entries:
+            PARSED_SECTIONS.inc(outcome="rules")
+            return entries
+    schema = _object_schema({key: section_schema(key)}, [key])
+    prompt = _section_prompt(heading, text)
+    problem = ""
+    for attempt in range(2):
+        try:
+            entries = clean_entries(key, _generate(provider, prompt, schema).get(key))
+            if entries is None:
+                problem = f"{key} did not match the schema"
+            elif not entries and not optional and len(text) > 40:
+                problem = f"{key} came back empty"
+            else:
+                PARSED_SECTIONS.inc(outcome="repaired" if attempt else "ok")
+                return entries
+        except Exception as e:
+            problem = f"{type(e).__name__}: {e}"
+        print(f"Parse of {key} failed ({problem}){', repairing' if not attempt else ''}")
+        prompt = (f"{_section_prompt(heading, text)}\n\nA previous answer was rejected: {problem[:300]}. "
+                  f"Return every entry under {key}, each with at least a title.")
+    if optional:
+        PARSED_SECTIONS.inc(outcome="dropped")
+        return []
+    # Keep the text rather than lose the section: as one entry's description, or one entry per line.
+    PARSED_SECTIONS.inc(outcome="raw")
+    empty = {field: None for field in ENTRY_FIELDS[key]}
+    if "description" in empty:
+        return [{"title": heading, **empty, "description": text}]
+    return [{"title": line, **empty} for line in text.splitlines()]
+
+def _parse_unplaced(provider: LLMProvider, text: str, with_name: bool) -> Dict:
+    """Text outside the recognised sections; the model maps what it finds (e.g. "Work History" -> EXPERIENCE)."""
+    properties = {"summary": _string(), **{key: section_schema(key) for key in SECTIONS}}
+    if with_name:
+        properties = {"name": _string(), **properties}
+    prompt = ("This is the part of a resume not under a recognised heading. Put the candidate's name (if asked), "
+              "their summary or headline, and any sections it contains under the matching keys; omit the rest.\n\n" + text)
+    data: Optional[Dict] = None
+    for attempt in range(2):
+        try:
+            data = _generate(provider, prompt, _object_schema(properties, []))
+            break
+        except Exception as e:
+            print(f"Parse of unplaced text failed ({type(e).__name__}: {e}){', retrying' if not attempt else ''}")
+    # Whatever this text holds (a headline, awards, an unknown section) need not belong anywhere,
+    # so a failed parse contributes nothing instead of dumping the text into a field.
+    if data is None:
+        PARSED_SECTIONS.inc(outcome="dropped")
+        return {"name": None, "summary": None, **{key: [] for key in SECTIONS}}
+    result = {"name": _text(data.get("name")), "summary": _text(data.get("summary"))}
+    for key in SECTIONS:
+        entries = clean_entries(key, data.get(key))
+        if entries is None:
+            # Only the section that came back malformed is asked for again.
+            entries = _parse_section(provider, key, key.title(), text, optional=True)
+        result[key] = entries
+    return result
+
+def parse_resume_text(provider: LLMProvider, text: str) -> Dict:
+    """Parses resume text into personal_details, summary and the SECTIONS lists (empty ones omitted)."""
+    with timed("parse.layout"):
+        layout = ResumeLayout(text)
+    executor = _get_executor()
+    futures = {
+        key: executor.submit(contextvars.copy_context().run, _parse_section, provider, key, layout.headings[key], layout.section_text(key))
+        for key in SECTIONS if layout.section_text(key)
+    }
+    unplaced = None
+    if layout.unplaced:
+        unplaced = executor.submit(contextvars.copy_context().run, _parse_unplaced, provider, layout.unplaced, layout.name is None)
+
+    personal = layout.personal_details()
+    summary = " ".join(layout.section_text("summary").splitlines()) or None
+    sections = {key: future.result() for key, future in futures.items()}
+    if unplaced is not None:
+        extra = unplaced.result()
+        personal["name"] = personal["name"] or extra["name"]
+        summary = summary or extra["summary"]
+        for key in SECTIONS:
+            # The model may repeat entries of a recognised section it saw mentioned elsewhere.
+            seen = {entry["title"].lower() for entry in sections.get(key, [])}
+            sections[key] = sections.get(key, []) + [entry for entry in extra[key] if entry["title"].lower() not in seen]
+
+    parsed: Dict = {"personal_details": personal}
+    if summary:
+        parsed["summary"] = summary
+    for key in SECTIONS:
+        if sections.get(key):
+            parsed[key] = sections[key]
+    return parsed
@@ -0,0 +1,150 @@
+import os
+import time
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from db import get_connection
+
+class SessionStore(ABC):
+    def __init__(self, max_messages: int, max_message_chars: int, idle_ttl: float):
+        self.max_messages = max_messages
+        self.max_message_chars = max_message_chars
+        self.idle_ttl = idle_ttl
+
+    @abstractmethod
+    def load(self, collection_name: str, session_id: str) -> List[Dict]:
+        """Returns the stored messages of a session, oldest first."""
+        pass
+
+    @abstractmethod
+    def append(self, collection_name: str, session_id: str, messages: List[Dict]):
+        """Appends messages to a session, keeping only the newest `max_messages`."""
+        pass
+
+    @abstractmethod
+    def clear(self, collection_name: str, session_id: str):
+        """Drops all messages of a session."""
+        pass
+
+    def _bounded(self, message: Dict) -> Dict:
+        return {"role": message["role"], "content": (message.get("content") or "")[:self.max_message_chars]}
+
+class InMemorySessionStore(SessionStore):
+    def __init__(self, max_sessions: int, **kwargs):
+        super().__init__(**kwargs)
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[tuple, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict_idle(self, now: float):
+        while self._sessions:
+            key, session = next(iter(self._sessions.items()))
+            if now - session["last_active"] < self.idle_ttl and len(self._sessions) <= self.max_sessions:
+                break
+            del self._sessions[key]
+
+    def load(self, collection_name: str, session_id: str) -> List[Dict]:
+        key = (collection_name, session_id)
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None or time.time() - session["last_active"] >= self.idle_ttl:
+                return []
+            return list(session["messages"])
+
+    def append(self, collection_name: str, session_id: str, messages: List[Dict]):
+        key = (collection_name, session_id)
+        now = time.time()
+        with self._lock:
+            session = self._sessions.pop(key, None) or {"messages": []}
+            session["messages"] = (session["messages"] + [self._bounded(m) for m in messages])[-self.max_messages:]
+            session["last_active"] = now
+            self._sessions[key] = session
+            self._evict_idle(now)
+
+    def clear(self, collection_name: str, session_id: str):
+        with self._lock:
+            self._sessions.pop((collection_name, session_id), None)
+
+class SQLiteSessionStore(SessionStore):
+    """Session store backed by a SQLite file, shareable between gunicorn workers."""
+
+    def __init__(self, path: str, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self._last_sweep = 0.0
+        conn = get_connection(self.path)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS session_messages ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, collection TEXT NOT NULL, session_id TEXT NOT NULL, "
+            "role TEXT NOT NULL, content TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_session_messages ON session_messages (collection, session_id, id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_session_messages_age ON session_messages (created_at)")
+
+    def load(self, collection_name: str, session_id: str) -> List[Dict]:
+        rows = get_connection(self.path).execute(
+            "SELECT role, content, created_at FROM session_messages WHERE collection = ? AND session_id = ? "
+            "ORDER BY id DESC LIMIT ?",
+            (collection_name, session_id, self.max_messages),
+        ).fetchall()
+        # Only the newest message says whether the session went idle; older turns stay with it.
+        if not rows or time.time() - rows[0][2] >= self.idle_ttl:
+            return []
+        return [{"role": role, "content": content} for role, content, _ in reversed(rows)]
+
+    def append(self, collection_name: str, session_id: str, messages: List[Dict]):
+        now = time.time()
+        conn = get_connection(self.path)
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                "INSERT INTO session_messages (collection, session_id, role, content, created_at) VALUES (?, ?, ?, ?, ?)",
+                [(collection_name, session_id, m["role"], m["content"], now) for m in map(self._bounded, messages)],
+            )
+            conn.execute(
+                "DELETE FROM session_messages WHERE collection = ? AND session_id = ? AND id NOT IN ("
+                "SELECT id FROM session_messages WHERE collection = ? AND session_id = ? ORDER BY id DESC LIMIT ?)",
+                (collection_name, session_id, collection_name, session_id, self.max_messages),
+            )
+        if now - self._last_sweep > 60:
+            self._last_sweep = now
+            self._evict_idle(now)
+
+    def _evict_idle(self, now: float):
+        # A session's newest message is its last activity: sessions whose newest message is older
+        # than the TTL are dropped whole, and active ones keep all their turns.
+        get_connection(self.path).execute(
+            "DELETE FROM session_messages WHERE (collection, session_id) IN ("
+            "SELECT collection, session_id FROM session_messages GROUP BY collection, session_id "
+            "HAVING MAX(created_at) < ?)",
+            (now - self.idle_ttl,),
+        )
+
+    def clear(self, collection_name: str, session_id: str):
+        get_connection(self.path).execute(
+            "DELETE FROM session_messages WHERE collection = ? AND session_id = ?", (collection_name, session_id)
+        )
+
+_store: Optional[SessionStore] = None
+_store_lock = threading.Lock()
+
+def get_session_store() -> SessionStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                options = dict(
+                    max_messages=int(os.getenv("SESSION_MAX_MESSAGES", "6")),
+                    max_message_chars=int(os.getenv("SESSION_MAX_MESSAGE_CHARS", "4000")),
+                    idle_ttl=float(os.getenv("SESSION_IDLE_TTL", "3600")),
+                )
+                backend = os.getenv("SESSION_STORE", "memory").lower()
+                if backend == "sqlite":
+                    _store = SQLiteSessionStore(path=os.getenv("SESSION_DB_PATH", "/tmp/pa_sessions.db"), **options)
+                elif backend == "memory":
+                    _store = InMemorySessionStore(max_sessions=int(os.getenv("SESSION_MAX_SESSIONS", "10000")), **options)
+                else:
+                    raise ValueError(f"Unsupported session store: {backend}")
+    return _store
@@ -0,0 +1,426 @@
+import os
+import re
+import json
+import fcntl
+import shutil
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from embedding_codec import (
+    BINARY_RERANK_FACTOR, QUANTIZATION_KEY, binary_scores, dequantize_int8, int8_scores, normalize,
+    pack_binary, quantize_int8,
+)
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+HNSW_THRESHOLD = int(os.getenv("LOCAL_HNSW_THRESHOLD", "5000"))
+_NAME_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]{1,510}[A-Za-z0-9]$")
+
+def matches_where(metadata: Optional[Dict], where: Optional[Dict]) -> bool:
+    if not where:
+        return True
+    metadata = metadata or {}
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_where(metadata, c) for c in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_where(metadata, c) for c in condition):
+                return False
+        elif isinstance(condition, dict):
+            for op, value in condition.items():
+                actual = metadata.get(key)
+                if op == "$eq" and actual != value:
+                    return False
+                if op == "$ne" and actual == value:
+                    return False
+                if op == "$in" and actual not in value:
+                    return False
+                if op == "$nin" and actual in value:
+                    return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+class LocalCollection:
+    """Chroma-compatible collection holding unit-normalized embeddings in one memory-mapped matrix.
+
+    The matrix is float32, or int8 codes with per-vector scales when the collection's metadata asks
+    for int8/binary quantization (binary adds packed sign bits used to pre-filter queries).
+    """
+
+    def __init__(self, client: "LocalVectorClient", name: str):
+        self._client = client
+        self.name = name
+        self.path = os.path.join(client.path, name)
+        self._lock = threading.RLock()
+        self._loaded_version = -1
+        self._loaded_stamp = None
+        self._index = None
+        self.metadata: Optional[Dict] = None
+        self._ids: List[str] = []
+        self._documents: List[Optional[str]] = []
+        self._metadatas: List[Optional[Dict]] = []
+        self._positions: Dict[str, int] = {}
+        self._dim = 0
+        self._format = "float32"
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+        self._scales: Optional[np.ndarray] = None
+        self._bits: Optional[np.ndarray] = None
+        self._files: Dict[str, Optional[str]] = {}
+        self._refresh()
+
+    # -- persistence ------------------------------------------------------
+
+    @contextmanager
+    def _exclusive(self):
+        """Serializes writers across threads and across worker processes."""
+        with self._lock:
+            with open(os.path.join(self.path, ".lock"), "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    self._refresh()
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _meta_path(self) -> str:
+        return os.path.join(self.path, "meta.json")
+
+    def _refresh(self):
+        """Reloads from disk when another process has written a newer version."""
+        try:
+            stat = os.stat(self._meta_path())
+            # meta.json is only ever swapped in whole by os.replace, so an unchanged inode, mtime and
+            # size means nothing was published since the last load and the JSON need not be parsed.
+            stamp = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            if stamp == self._loaded_stamp:
+                return
+            with open(self._meta_path()) as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            raise ValueError(f"Collection {self.name} does not exist.")
+        if meta["version"] == self._loaded_version:
+            self._loaded_stamp = stamp
+            return
+        self.metadata = meta.get("metadata")
+        self._ids = meta["ids"]
+        self._documents = meta["documents"]
+        self._metadatas = meta["metadatas"]
+        self._positions = {id_: i for i, id_ in enumerate(self._ids)}
+        dim = self._dim = meta["dim"]
+        self._format = meta.get("format", "float32")
+        previous_vectors = self._files.get("vectors_file")
+        self._files = {key: meta.get(key) for key in ("vectors_file", "scales_file", "bits_file")}
+        self._scales = self._bits = None
+        vectors_path = os.path.join(self.path, meta["vectors_file"]) if meta.get("vectors_file") else None
+        if self._ids and vectors_path:
+            shape = (len(self._ids), dim)
+            if self._format == "float32":
+                self._matrix = np.memmap(vectors_path, dtype=np.float32, mode="r", shape=shape)
+            else:
+                self._matrix = np.memmap(vectors_path, dtype=np.int8, mode="r", shape=shape)
+                self._scales = np.fromfile(os.path.join(self.path, meta["scales_file"]), dtype=np.float32)
+            if self._format == "binary":
+                self._bits = np.memmap(os.path.join(self.path, meta["bits_file"]), dtype=np.uint8, mode="r",
+                                       shape=(len(self._ids), -(-dim // 8)))
+        else:
+            self._matrix = np.zeros((0, dim), dtype=np.float32)
+            self._format = "float32"
+        self._loaded_version = meta["version"]
+        self._loaded_stamp = stamp
+        # Vector files are named by version, so a metadata-only write keeps the graph index.
+        if self._files.get("vectors_file") != previous_vectors:
+            self._index = None
+
+    def _storage_format(self) -> str:
+        quantization = (self.metadata or {}).get(QUANTIZATION_KEY, "none")
+        return quantization if quantization in ("int8", "binary") else "float32"
+
+    def _persist(self, matrix: np.ndarray, ids: List[str], documents: List, metadatas: List):
+        """Writes the float32 `matrix` in the collection's storage format and publishes a new version."""
+        version = self._loaded_version + 1
+        storage_format = self._storage_format()
+        files: Dict[str, Optional[str]] = {"vectors_file": None, "scales_file": None, "bits_file": None}
+        if len(ids):
+            if storage_format == "float32":
+                files["vectors_file"] = f"vectors-{version}.f32"
+                np.ascontiguousarray(matrix, dtype=np.float32).tofile(os.path.join(self.path, files["vectors_file"]))
+            else:
+                codes, scales = quantize_int8(matrix)
+                files["vectors_file"], files["scales_file"] = f"vectors-{version}.i8", f"scales-{version}.f32"
+                codes.tofile(os.path.join(self.path, files["vectors_file"]))
+                scales.tofile(os.path.join(self.path, files["scales_file"]))
+            if storage_format == "binary":
+                files["bits_file"] = f"bits-{version}.u8"
+                pack_binary(matrix).tofile(os.path.join(self.path, files["bits_file"]))
+        self._publish(version, int(matrix.shape[1]) if matrix.ndim == 2 else 0, storage_format, files, ids, documents, metadatas)
+
+    def _publish(self, version: int, dim: int, storage_format: str, files: Dict[str, Optional[str]],
+                 ids: List[str], documents: List, metadatas: List):
+        meta = {
+            "version": version,
+            "metadata": self.metadata,
+            "dim": dim,
+            "format": storage_format,
+            **files,
+            "ids": ids,
+            "documents": documents,
+            "metadatas": metadatas,
+        }
+        tmp_path = self._meta_path() + f".{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self._meta_path())
+        current = set(files.values())
+        for entry in os.listdir(self.path):
+            if entry.startswith(("vectors-", "scales-", "bits-")) and entry not in current:
+                try:
+                    os.remove(os.path.join(self.path, entry))
+                except OSError:
+                    pass
+        self._refresh()
+
+    # -- writes -----------------------------------------------------------
+
+    def _dense(self, rows=None) -> np.ndarray:
+        """Float32 vectors for `rows` (all rows by default), dequantized when stored as int8."""
+        count = len(self._ids) if rows is None else len(rows)
+        rows = slice(None) if rows is None else rows
+        if self._scales is None:
+            return np.array(self._matrix[rows], dtype=np.float32).reshape(count, self._dim)
+        return dequantize_int8(np.asarray(self._matrix[rows]), self._scales[rows]).reshape(count, self._dim)
+
+    def _scores(self, rows: np.ndarray, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns (rows, scores) of the best `k` of `rows` for `query`, best first."""
+        if self._bits is not None and len(rows) > k * BINARY_RERANK_FACTOR:
+            # The sign bits pick the likely neighbours; they are re-ranked with the int8 vectors below.
+            coarse = binary_scores(self._bits[rows], query)
+            keep = k * BINARY_RERANK_FACTOR
+            rows = rows[np.argpartition(-coarse, keep - 1)[:keep]]
+        if self._scales is None:
+            scores = np.asarray(self._matrix[rows]) @ query
+        else:
+            scores = int8_scores(np.asarray(self._matrix[rows]), self._scales[rows], query)
+        k = min(k, len(rows))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return rows[top], scores[top]
+
+    def _write(self, ids: List[str], embeddings, documents: Optional[List[str]], metadatas: Optional[List[Dict]], replace: bool):
+        if len(set(ids)) != len(ids):
+            raise ValueError("Expected IDs to be unique")
+        vectors = normalize(embeddings)
+        documents = documents if documents is not None else [None] * len(ids)
+        metadatas = metadatas if metadatas is not None else [None] * len(ids)
+        with self._exclusive():
+            if len(self._ids) and vectors.shape[1] != self._dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match collection dimensionality {self._dim}")
+            matrix = self._dense() if len(self._ids) else np.zeros((0, vectors.shape[1]), dtype=np.float32)
+            all_ids, all_docs, all_metas = list(self._ids), list(self._documents), list(self._metadatas)
+            new_rows = []
+            for i, id_ in enumerate(ids):
+                position = self._positions.get(id_)
+                if position is None:
+                    new_rows.append(i)
+                elif replace:
+                    matrix[position] = vectors[i]
+                    all_docs[position] = documents[i]
+                    all_metas[position] = metadatas[i]
+                else:
+                    raise ValueError(f"ID {id_} already exists in collection {self.name}")
+            if new_rows:
+                matrix = np.vstack([matrix, vectors[new_rows]])
+                all_ids += [ids[i] for i in new_rows]
+                all_docs += [documents[i] for i in new_rows]
+                all_metas += [metadatas[i] for i in new_rows]
+            self._persist(matrix, all_ids, all_docs, all_metas)
+
+    def add(self, ids: List[str], embeddings, documents: Optional[List[str]] = None, metadatas: Optional[List[Dict]] = None):
+        self._write(ids, embeddings, documents, metadatas, replace=False)
+
+    def upsert(self, ids: List[str], embeddings, documents: Optional[List[str]] = None, metadatas: Optional[List[Dict]] = None):
+        self._write(ids, embeddings, documents, metadatas, replace=True)
+
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict] = None):
+        with self._exclusive():
+            drop = set(self._select(ids, where))
+            if not drop:
+                return
+            keep = [i for i in range(len(self._ids)) if i not in drop]
+            self._persist(
+                self._dense(np.array(keep, dtype=np.int64)),
+                [self._ids[i] for i in keep],
+                [self._documents[i] for i in keep],
+                [self._metadatas[i] for i in keep],
+            )
+
+    def modify(self, name: Optional[str] = None, metadata: Optional[Dict] = None):
+        with self._exclusive():
+            if metadata is not None:
+                self.metadata = metadata
+            if self._ids and self._storage_format() != self._format:
+                # A changed quantization setting re-encodes the stored vectors.
+                self._persist(self._dense(), list(self._ids), list(self._documents), list(self._metadatas))
+            else:
+                self._publish(self._loaded_version + 1, self._dim, self._format, self._files,
+                              list(self._ids), list(self._documents), list(self._metadatas))
+            if name and name != self.name:
+                self._client._rename(self, name)
+
+    # -- reads ------------------------------------------------------------
+
+    def _select(self, ids: Optional[List[str]], where: Optional[Dict]) -> List[int]:
+        if ids is not None:
+            rows = [self._positions[id_] for id_ in ids if id_ in self._positions]
+        else:
+            rows = list(range(len(self._ids)))
+        if where:
+            rows = [i for i in rows if matches_where(self._metadatas[i], where)]
+        return rows
+
+    def count(self) -> int:
+        with self._lock:
+            self._refresh()
+            return len(self._ids)
+
+    def get(self, ids: Optional[List[str]] = None, where: Optional[Dict] = None, limit: Optional[int] = None,
+            offset: Optional[int] = None, include: Optional[List[str]] = None) -> Dict[str, Any]:
+        include = include if include is not None else ["documents", "metadatas"]
+        with self._lock:
+            self._refresh()
+            rows = self._select(ids, where)
+            rows = rows[offset or 0:]
+            if limit is not None:
+                rows = rows[:limit]
+            result: Dict[str, Any] = {"ids": [self._ids[i] for i in rows]}
+            result["documents"] = [self._documents[i] for i in rows] if "documents" in include else None
+            result["metadatas"] = [self._metadatas[i] for i in rows] if "metadatas" in include else None
+            result["embeddings"] = self._dense(np.array(rows, dtype=np.int64)) if "embeddings" in include else None
+            return result
+
+    def _hnsw_candidates(self, query: np.ndarray, k: int) -> Optional[np.ndarray]:
+        if hnswlib is None or len(self._ids) < HNSW_THRESHOLD:
+            return None
+        if self._index is None:
+            index = hnswlib.Index(space="ip", dim=self._dim)
+            index.init_index(max_elements=len(self._ids), ef_construction=200, M=16)
+            index.add_items(self._dense(), np.arange(len(self._ids)))
+            index.set_ef(max(64, k * 4))
+            self._index = index
+        labels, _ = self._index.knn_query(query, k=min(k, len(self._ids)))
+        return labels
+
+    def query(self, query_embeddings, n_results: int = 10, where: Optional[Dict] = None,
+              include: Optional[List[str]] = None) -> Dict[str, Any]:
+        include = include if include is not None else ["documents", "metadatas", "distances"]
+        queries = normalize(query_embeddings)
+        result: Dict[str, List] = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        with self._lock:
+            self._refresh()
+            allowed = np.array(self._select(None, where), dtype=np.int64) if where else None
+            candidates = None if where else self._hnsw_candidates(queries, n_results)
+            for qi, query in enumerate(queries):
+                if candidates is not None:
+                    rows = candidates[qi].astype(np.int64)
+                elif allowed is not None:
+                    rows = allowed
+                else:
+                    rows = np.arange(len(self._ids))
+                if len(rows) == 0:
+                    top = rows
+                    scores = np.zeros(0, dtype=np.float32)
+                else:
+                    top, scores = self._scores(rows, query, n_results)
+                result["ids"].append([self._ids[i] for i in top])
+                result["documents"].append([self._documents[i] for i in top])
+                result["metadatas"].append([self._metadatas[i] for i in top])
+                result["distances"].append((1.0 - scores).tolist())
+        for key in ("documents", "metadatas", "distances"):
+            if key not in include:
+                result[key] = None
+        return result
+
+class LocalVectorClient:
+    """Offline stand-in for chromadb.CloudClient that keeps each collection in a directory under `path`."""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(self.path, exist_ok=True)
+        self._collections: Dict[str, LocalCollection] = {}
+        self._lock = threading.Lock()
+
+    def _exists(self, name: str) -> bool:
+        return os.path.exists(os.path.join(self.path, name, "meta.json"))
+
+    @staticmethod
+    def _validate_name(name: str):
+        if not isinstance(name, str) or not _NAME_PATTERN.match(name) or ".." in name:
+            raise ValueError(f"Invalid collection name: {name}")
+
+    def _init_collection(self, name: str, metadata: Optional[Dict]):
+        self._validate_name(name)
+        directory = os.path.join(self.path, name)
+        os.makedirs(directory, exist_ok=True)
+        meta = {"version": 0, "metadata": metadata, "dim": 0, "vectors_file": None, "ids": [], "documents": [], "metadatas": []}
+        with open(os.path.join(directory, "meta.json"), "w") as f:
+            json.dump(meta, f)
+
+    def create_collection(self, name: str, metadata: Optional[Dict] = None) -> LocalCollection:
+        with self._lock:
+            if self._exists(name):
+                raise ValueError(f"Collection {name} already exists.")
+            self._init_collection(name, metadata)
+            self._collections[name] = LocalCollection(self, name)
+            return self._collections[name]
+
+    def get_collection(self, name: str) -> LocalCollection:
+        self._validate_name(name)
+        with self._lock:
+            if not self._exists(name):
+                raise ValueError(f"Collection {name} does not exist.")
+            if name not in self._collections:
+                self._collections[name] = LocalCollection(self, name)
+            collection = self._collections[name]
+        # Like a Chroma fetch, a lookup reflects what other processes have written since.
+        with collection._lock:
+            collection._refresh()
+        return collection
+
+    def get_or_create_collection(self, name: str, metadata: Optional[Dict] = None) -> LocalCollection:
+        self._validate_name(name)
+        with self._lock:
+            if not self._exists(name):
+                self._init_collection(name, metadata)
+            if name not in self._collections:
+                self._collections[name] = LocalCollection(self, name)
+            return self._collections[name]
+
+    def delete_collection(self, name: str):
+        self._validate_name(name)
+        with self._lock:
+            if not self._exists(name):
+                raise ValueError(f"Collection {name} does not exist.")
+            self._collections.pop(name, None)
+            shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
+
+    def list_collections(self) -> List[LocalCollection]:
+        names = sorted(entry for entry in os.listdir(self.path) if self._exists(entry))
+        return [self.get_collection(name) for name in names]
+
+    def _rename(self, collection: LocalCollection, new_name: str):
+        self._validate_name(new_name)
+        with self._lock:
+            if self._exists(new_name):
+                raise ValueError(f"Collection {new_name} already exists.")
+            os.rename(collection.path, os.path.join(self.path, new_name))
+            self._collections.pop(collection.name, None)
+            collection.name = new_name
+            collection.path = os.path.join(self.path, new_name)
+            self._collections[new_name] = collection
@@ -0,0 +1,85 @@
+import os
+import time
+import importlib
+import threading
+import traceback
+from typing import Dict, List, Optional
+
+# Heavy dependencies are imported on first use so a worker binds its port quickly. The warm-up
+# pays those imports (and opens the caches and vector client) in a background thread right after
+# start-up, so the first real request usually finds everything loaded.
+
+WARMUP_ENABLED = os.getenv("WARMUP", "true").lower() == "true"
+WARMUP_PROVIDERS = [name.strip().lower() for name in os.getenv("WARMUP_PROVIDERS", "google").split(",") if name.strip()]
+
+_PROVIDER_MODULES = {
+    "google": ["google.generativeai"],
+    "openai": ["openai", "tiktoken"],
+    "groq": ["groq", "openai"],
+    "local": ["numpy"],
+}
+_DOCUMENT_MODULES = ["fitz", "langchain.text_splitter"]
+
+_thread: Optional[threading.Thread] = None
+_lock = threading.Lock()
+_timings: Dict[str, float] = {}
+
+def _step(name: str, fn):
+    started = time.perf_counter()
+    try:
+        fn()
+    except Exception as e:
+        print(f"Warm-up step {name} failed: {type(e).__name__}: {e}")
+    _timings[name] = round(time.perf_counter() - started, 3)
+
+def _modules() -> List[str]:
+    modules: List[str] = []
+    for provider in WARMUP_PROVIDERS:
+        modules.extend(_PROVIDER_MODULES.get(provider.split(":")[0], []))
+    return list(dict.fromkeys(modules + _DOCUMENT_MODULES))
+
+def _run():
+    from embedding_cache import get_embedding_cache
+    from pipeline import get_parse_cache
+    from pool import get_pooled_provider, get_vector_client
+    from response_cache import get_response_cache
+
+    started = time.perf_counter()
+    for module in _modules():
+        _step(f"import:{module}", lambda module=module: importlib.import_module(module))
+    _step("embedding_cache", get_embedding_cache)
+    _step("parse_cache", get_parse_cache)
+    _step("response_cache", get_response_cache)
+    _step("vector_client", get_vector_client)
+    api_key = os.getenv("GOOGLE_API_KEY")
+    if "google" in WARMUP_PROVIDERS and api_key:
+        _step("provider:google", lambda: get_pooled_provider("google", api_key))
+    print(f"Warm-up finished in {time.perf_counter() - started:.2f}s")
+
+def warm_up(block: bool = False) -> bool:
+    """Starts the background warm-up once per process; returns False if it was disabled or already started."""
+    global _thread
+    if not WARMUP_ENABLED:
+        return False
+    with _lock:
+        if _thread is not None:
+            return False
+        _thread = threading.Thread(target=_guarded_run, name="warmup", daemon=True)
+        _thread.start()
+    if block:
+        _thread.join()
+    return True
+
+def _guarded_run():
+    try:
+        _run()
+    except Exception:
+        traceback.print_exc()
+
+def warmup_status() -> Dict:
+    return {
+        "enabled": WARMUP_ENABLED,
+        "started": _thread is not None,
+        "finished": _thread is not None and not _thread.is_alive(),
+        "timings": dict(_timings),
+    }
@@ -56,6 +56,7 @@ export const ChatPreview: FC<ChatPreviewProps> = ({
   } | null>(null);
 
   const messagesEndRef = useRef<null | HTMLDivElement>(null);
+  const sessionIdRef = useRef<string | null>(null);
   const BACKEND_URL =
     process.env.NEXT_PUBLIC_BACKEND_URL ||
     "https://portfolio-assistant-1ush.onrender.com";
@@ -141,6 +142,7 @@ export const ChatPreview: FC<ChatPreviewProps> = ({
           query: currentInput,
           provider_name: chatbotConfig?.provider || "google",
           api_key: chatbotConfig?.apiKey || "",
+          session_id: sessionIdRef.current,
         }),
       });
 
@@ -151,6 +153,10 @@ export const ChatPreview: FC<ChatPreviewProps> = ({
 
       const result = await response.json();
 
+      if (result.session_id) {
+        sessionIdRef.current = result.session_id;
+      }
+
       if (result.memory) {
         setMemoryInfo(result.memory);
         console.log(`Memory: ${result.memory.exchanges} exchanges`);